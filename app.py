@@ -1,19 +1,30 @@
 import os
 import uuid
+import time
+import shutil
+import tempfile
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, List, Dict, Optional
 import json
 import threading
-import timedelta
 
-# Import our RAG components
-from document_processor import CompanyDocumentProcessor
-from pinecone_vector import PineconeVectorStore
-from secured_chatbot import SecureRAGChatbot
+# Import our RAG components. Modules that pull in torch, langchain or the SDKs are
+# imported where they are first used (or by the background preload), so the page
+# and status endpoints are served as soon as the process starts
+from cache import LRUCache
+from clients import upstream_stats
+from ingestion import IngestionCancelled, IngestionPipeline
+from jobs import FINISHED_STATUSES, IngestionScheduler, JobContext, JobQueueFull
+from metrics import METRICS_ENABLED, render as render_metrics, span
+from preload import start_preload, status as preload_status
+from session_store import SESSION_TTL_SECONDS, SessionHistory, create_session_store, new_session_state
+
+if TYPE_CHECKING:
+    from secured_chatbot import SecureRAGChatbot
 
 # Configure logging
 logging.basicConfig(
@@ -25,46 +36,181 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'default_secret_key')
-app.config['UPLOAD_FOLDER'] = 'uploads'
+# Workers rebuild a session's index from its uploaded files, so with several replicas
+# (a redis:// session store) this must be a volume every replica mounts at the same path
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'uploads')
 app.config['ALLOWED_EXTENSIONS'] = {'txt', 'pdf', 'docx', 'doc'}
-app.config['MAX_CONTENT_LENGTH'] = 0.5 * 1024 * 1024  # 0.5MB default limit
+# Upload limits; ingestion streams chunks with bounded memory, so these can be raised per deployment
+app.config['MAX_FILE_SIZE'] = int(float(os.environ.get('MAX_FILE_SIZE_MB', 0.5)) * 1024 * 1024)  # 0.5MB default limit
+app.config['MAX_TOTAL_SIZE'] = int(float(os.environ.get('MAX_TOTAL_SIZE_MB', 2)) * 1024 * 1024)  # 2MB total limit
+app.config['MAX_FILES'] = int(os.environ.get('MAX_FILES', 5))
+# Whole request body limit; one request carries every uploaded file
+app.config['MAX_CONTENT_LENGTH'] = app.config['MAX_TOTAL_SIZE'] + 1024 * 1024
+# Questions accepted by one /api/chat/batch request
+app.config['MAX_BATCH_QUESTIONS'] = int(os.environ.get('MAX_BATCH_QUESTIONS', 100))
 
 CORS(app)
 
 # Create upload folder if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-app_state = {
-    'status': 'idle',  # idle, processing, ready, error
-    'processing_progress': 0,
-    'documents': [],
-    'vector_store': None,
-    'chatbot': None,
-    'message_count': 0,
-    'created_at': datetime.now().isoformat(),
-}
+# Session status, progress and metadata are shared by every worker process
+sessions = create_session_store()
+
+# Chatbots hold models and clients, so each process caches its own and rebuilds them on demand.
+# Conversation history lives in the session store; an entry expires once the session is idle
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 64))
+session_chatbots = LRUCache(max_size=SESSION_CACHE_SIZE, ttl=SESSION_TTL_SECONDS, sliding=True)
+_chatbot_lock = threading.Lock()
+
+# Uploads are indexed by a fixed pool of job workers behind a bounded queue
+jobs = IngestionScheduler(create_session_store(kind='job'))
+
+# How often each process looks for idle sessions to evict
+SESSION_EVICTION_INTERVAL = int(os.environ.get('SESSION_EVICTION_INTERVAL', 60))
+_eviction_lock = threading.Lock()
+_next_eviction = 0.0
 
-original_app_state = app_state.copy()
+# Load models and heavy modules in the background; /readyz reports when they are in
+start_preload()
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+def get_session_id() -> str:
+    """Return the caller's session ID, issuing one on first contact"""
+    sid = session.get('sid')
+    if not sid:
+        sid = uuid.uuid4().hex
+        session['sid'] = sid
+    return sid
+
+def get_session_state(sid: str) -> Dict:
+    state = sessions.get(sid) or new_session_state()
+    if state['status'] == 'processing' and state.get('job_id'):
+        state = recover_stale_job(sid, state)
+    return state
+
+def recover_stale_job(sid: str, state: Dict) -> Dict:
+    """Move a session out of processing when its job's worker process died, so the user can upload again"""
+    if jobs.fail_if_stale(state['job_id']) is None:
+        return state
+    return sessions.update_if(sid, {'status': 'processing', 'job_id': state['job_id']}, status='error') \
+        or get_session_state(sid)
+
+def session_namespace(sid: str) -> str:
+    """Each session indexes its documents in its own vector store namespace"""
+    return f"session-{sid}"
+
+def session_upload_folder(sid: str) -> str:
+    return os.path.join(app.config['UPLOAD_FOLDER'], sid)
+
+def new_chatbot(sid: str, vector_store) -> 'SecureRAGChatbot':
+    """Build a session's chatbot around a vector store, with history shared through the session store"""
+    from secured_chatbot import SecureRAGChatbot
+    return SecureRAGChatbot(vector_store=vector_store, history=SessionHistory(sessions, sid))
+
+def cached_vector_store(sid: str, state: Dict):
+    """This process's vector store for a session, if it is still at the session's corpus version"""
+    chatbot = session_chatbots.get(sid)
+    if chatbot is not None and chatbot.vector_store.corpus_version == state['corpus_version']:
+        return chatbot.vector_store
+    return None
+
+def get_chatbot(sid: str, state: Dict) -> 'SecureRAGChatbot':
+    """Return this process's chatbot for a session, rebuilding it if another worker indexed the documents"""
+    chatbot = session_chatbots.get(sid)
+    if chatbot is not None and chatbot.vector_store.corpus_version == state['corpus_version']:
+        return chatbot
+
+    from document_processor import CompanyDocumentProcessor
+    from vector_store import create_vector_store
+
+    with _chatbot_lock:
+        chatbot = session_chatbots.get(sid)
+        if chatbot is not None and chatbot.vector_store.corpus_version == state['corpus_version']:
+            return chatbot
+
+        missing = [path for path in state['documents'] if not os.path.exists(path)]
+        if missing:
+            # Rebuilding from a partial file set would silently answer from the wrong corpus
+            raise FileNotFoundError(f"Session {sid} files are not available to this worker "
+                                    f"(is UPLOAD_FOLDER shared?): {', '.join(missing)}")
+
+        vector_store = create_vector_store(namespace=session_namespace(sid))
+        processor = CompanyDocumentProcessor()
+        if vector_store.vector_count() < state.get('chunks_total', 0):
+            # In-process backends start empty in every worker, so re-index the session's files
+            logger.info(f"Rebuilding index for session {sid} in this worker")
+            IngestionPipeline(vector_store, processor).run(state['documents'])
+        else:
+            # Vectors are shared, but the BM25 index lives in memory: re-chunk the files (no embedding)
+            processor.chunk_documents(processor.load_documents(state['documents']))
+            vector_store.lexical_index = processor.lexical_index
+        vector_store.corpus_version = state['corpus_version']
+
+        chatbot = new_chatbot(sid, vector_store)
+        session_chatbots.put(sid, chatbot)
+        return chatbot
+
+def discard_session(sid: str, state: Dict):
+    """Delete a session's uploaded files and indexed vectors"""
+    shutil.rmtree(session_upload_folder(sid), ignore_errors=True)
+
+    chatbot = session_chatbots.pop(sid)
+    if chatbot is not None:
+        vector_store = chatbot.vector_store
+    elif state.get('corpus_version'):
+        from vector_store import create_vector_store
+        vector_store = create_vector_store(namespace=session_namespace(sid))
+    else:
+        return
+
+    try:
+        vector_store.drop_namespace()
+    except Exception as e:
+        logger.error(f"Error dropping namespace for session {sid}: {str(e)}")
+
+def evict_idle_sessions():
+    """Discard sessions that have been idle for longer than the session TTL"""
+    try:
+        for sid in sessions.idle_sessions(SESSION_TTL_SECONDS):
+            state = sessions.get(sid)
+            # Deleting claims the session, so exactly one worker cleans it up
+            if state is None or not sessions.delete(sid):
+                continue
+            discard_session(sid, state)
+            logger.info(f"Evicted idle session {sid}")
+
+        for job_id in jobs.store.idle_sessions(SESSION_TTL_SECONDS):
+            job = jobs.store.get(job_id)
+            if job is not None and job['status'] in FINISHED_STATUSES:
+                jobs.store.delete(job_id)
+    except Exception as e:
+        logger.error(f"Error evicting idle sessions: {str(e)}")
+    finally:
+        _eviction_lock.release()
+
+def touch_session(sid: str):
+    """Keep a session alive and periodically evict idle ones in the background"""
+    global _next_eviction
+    sessions.touch(sid)
+
+    now = time.monotonic()
+    if now >= _next_eviction and _eviction_lock.acquire(blocking=False):
+        _next_eviction = now + SESSION_EVICTION_INTERVAL
+        threading.Thread(target=evict_idle_sessions, daemon=True).start()
+
+@app.before_request
+def track_session():
+    if request.endpoint in ('static', 'metrics', 'upstreams', 'healthz', 'readyz'):
+        return
+    touch_session(get_session_id())
+
 @app.route('/')
 def index():
-    global app_state, original_app_state
-    # if the status is not idle and created_at is more than 30 minutes ago, reset the app state
-    if app_state['status'] != 'idle' and app_state['created_at'] < (datetime.now() - timedelta(minutes=30)).isoformat():
-        # Remove uploaded files
-        for doc in app_state['documents']:
-            try:
-                os.remove(doc)
-            except:
-                pass
-        app_state = original_app_state.copy()
-        app_state['created_at'] = datetime.now().isoformat()
-
     return render_template('index.html')
 
 @app.route('/api/upload', methods=['POST'])
@@ -74,28 +220,30 @@ def upload_documents():
     if 'documents' not in request.files:
         return jsonify({'error': 'No documents provided'}), 400
     
+    sid = get_session_id()
+    state = get_session_state(sid)
+    if state['status'] == 'processing':
+        return jsonify({'error': 'Documents are still being processed', 'job_id': state.get('job_id')}), 409
+    
+    # Reject early, before replacing the session's files, when no job slot is free
+    if jobs.queued() >= jobs.max_queued:
+        return ingestion_queue_full()
+    
     files = request.files.getlist('documents')
     uploaded_files = []
 
-    MAX_FILE_SIZE = app.config['MAX_CONTENT_LENGTH']
-    MAX_TOTAL_SIZE = 2 * 1024 * 1024  # 2MB total limit
-    MAX_FILES = 5
+    MAX_FILE_SIZE = app.config['MAX_FILE_SIZE']
+    MAX_TOTAL_SIZE = app.config['MAX_TOTAL_SIZE']
+    MAX_FILES = app.config['MAX_FILES']
 
     # Validate number of files
     if len(files) > MAX_FILES:
         return jsonify({'error': f'Too many files. Maximum {MAX_FILES} files allowed.'}), 400
     
-    # Clean up any existing documents first
-    for old_doc in app_state['documents']:
-        try:
-            if os.path.exists(old_doc):
-                os.remove(old_doc)
-        except:
-            pass
-    app_state['documents'] = []
-    
     total_size = 0
+    accepted = []
 
+    # Validate every file before touching the session's current documents
     for file in files:
         if file and file.filename:
             if not allowed_file(file.filename):
@@ -110,7 +258,7 @@ def upload_documents():
 
             if file_size > MAX_FILE_SIZE:
                 return jsonify({
-                    'error': f'File too large: {file.filename}. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB'
+                    'error': f'File too large: {file.filename}. Maximum size is {MAX_FILE_SIZE / (1024*1024):g}MB'
                 }), 400
             
 
@@ -123,115 +271,179 @@ def upload_documents():
             # Check total size
             if total_size > MAX_TOTAL_SIZE:
                 return jsonify({
-                    'error': f'Total file size exceeds limit of {MAX_TOTAL_SIZE // (1024*1024)}MB'
+                    'error': f'Total file size exceeds limit of {MAX_TOTAL_SIZE / (1024*1024):g}MB'
                 }), 400
             
-            
-            try:
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                uploaded_files.append({
-                    'filename': file.filename,
-                    'filepath': filepath,
-                    'size': file_size
-                })
-                app_state['documents'].append(filepath)
-                logger.info(f"Saved file: {filename} ({file_size} bytes)")
-            except Exception as e:
-                logger.error(f"Error saving file {filename}: {str(e)}")
-                # Clean up any uploaded files on error
-                for uploaded in uploaded_files:
-                    try:
-                        os.remove(uploaded['filepath'])
-                    except:
-                        pass
-                return jsonify({'error': f'Failed to save file: {file.filename}'}), 500
+            accepted.append((file, file_size))
     
-    if not uploaded_files:
+    if not accepted:
         return jsonify({'error': 'No valid files uploaded'}), 400
     
+    # Stage the new files next to the session folder and swap them in only once all are saved,
+    # so a failed upload leaves the previous documents in place
+    upload_folder = session_upload_folder(sid)
+    staging_folder = tempfile.mkdtemp(prefix=f".{sid}-", dir=app.config['UPLOAD_FOLDER'])
+    documents = []
+    
+    for file, file_size in accepted:
+        filename = secure_filename(file.filename)
+        try:
+            file.save(os.path.join(staging_folder, filename))
+        except Exception as e:
+            logger.error(f"Error saving file {filename}: {str(e)}")
+            shutil.rmtree(staging_folder, ignore_errors=True)
+            return jsonify({'error': f'Failed to save file: {file.filename}'}), 500
+        
+        filepath = os.path.join(upload_folder, filename)
+        uploaded_files.append({
+            'filename': file.filename,
+            'filepath': filepath,
+            'size': file_size
+        })
+        documents.append(filepath)
+        logger.info(f"Saved file: {filename} ({file_size} bytes)")
+    
+    # Replace any existing documents
+    shutil.rmtree(upload_folder, ignore_errors=True)
+    os.replace(staging_folder, upload_folder)
+    
     # Start processing in background
     # Update status to processing
-    app_state['status'] = 'processing'
-    app_state['processing_progress'] = 10
+    sessions.update(sid, status='processing', processing_progress=10, chunks_done=0, chunks_total=0,
+                    documents=documents)
     
     try:
-        # Process documents in a separate thread
-        threading.Thread(
-            target=process_documents,
-            daemon=True
-        ).start()
+        # Process documents on the ingestion worker pool
+        job = jobs.submit(sid, process_documents, sid, documents)
+        sessions.update(sid, job_id=job['job_id'])
+    except JobQueueFull:
+        sessions.update(sid, status='error')
+        return ingestion_queue_full()
     except Exception as e:
             logger.error(f"Error processing documents: {str(e)}")
-            app_state['status'] = 'error'
+            sessions.update(sid, status='error')
             return jsonify({'error': 'Failed to process documents'}), 500
     
     return jsonify({
         'success': True,
+        'job_id': job['job_id'],
         'uploaded': uploaded_files,
-        'total_documents': len(app_state['documents']),
+        'total_documents': len(documents),
         'total_size': total_size
     })
 
 
-def process_documents():
-    """Process documents in the background"""
+def ingestion_queue_full():
+    response = jsonify({'error': 'Too many documents are being processed. Please try again shortly.'})
+    response.headers['Retry-After'] = '10'
+    return response, 429
+
+def process_documents(job: JobContext, sid: str, documents: List[str]) -> Dict:
+    """Process documents as an ingestion job"""
+    from document_processor import CompanyDocumentProcessor
+    from vector_store import create_vector_store
 
     try:
-        # Update progress
-        app_state['processing_progress'] = 20
-        
         # Initialize document processor
         processor = CompanyDocumentProcessor()
         
-        # Load and chunk documents
-        documents = processor.load_documents(app_state['documents'])
-        app_state['processing_progress'] =  40
-        
-        chunks = processor.chunk_documents(documents)
-        app_state['processing_progress'] =  60
-        
-        # Initialize Pinecone vector store
-        vector_store = PineconeVectorStore()
+        # Reuse this worker's vector store so unchanged chunks are not re-embedded, but only if no
+        # other worker has re-indexed or reset the session since; in-process vectors would be stale.
+        # Shared backends reload the manifest from the index at the start of every run anyway
+        vector_store = cached_vector_store(sid, get_session_state(sid))
+        if vector_store is None:
+            vector_store = create_vector_store(namespace=session_namespace(sid))
         
-        # Create embeddings and index
-        vector_store.add_documents(chunks)
-        app_state['processing_progress'] = 80
+        # Stream load -> chunk -> embed -> upsert, reporting per-chunk progress
+        pipeline = IngestionPipeline(vector_store, processor, progress_callback=progress_reporter(sid, job),
+                                     cancel_event=job.cancel_event)
+        with span('ingestion', 'job'):
+            stats = pipeline.run(documents)
         
         # Initialize chatbot
-        chatbot = SecureRAGChatbot(vector_store=vector_store)
+        session_chatbots.put(sid, new_chatbot(sid, vector_store))
         
-        # Store in app state
-        app_state['vector_store'] = vector_store
-        app_state['chatbot'] = chatbot
-        
-        # Mark as ready
-        app_state['status'] = 'ready'
-        app_state['processing_progress'] = 100
-        logger.info("Successfully processed documents")
+        # Mark as ready; other workers rebuild their chatbot when they see the new corpus version,
+        # re-indexing only if their store holds fewer than the chunks recorded here
+        sessions.update(sid, status='ready', processing_progress=100, corpus_version=vector_store.corpus_version,
+                        chunks_done=stats['chunks'], chunks_total=stats['chunks'])
+        logger.info(f"Successfully processed documents for session {sid}")
+        return stats
         
+    except IngestionCancelled:
+        logger.info(f"Processing cancelled for session {sid}")
+        sessions.update(sid, status='cancelled')
+        raise
     except Exception as e:
         logger.error(f"Error in process_documents: {str(e)}")
-        app_state['status'] = 'error'
+        sessions.update(sid, status='error')
         raise
 
+def progress_reporter(sid: str, job: JobContext) -> Callable[[Dict], None]:
+    """Progress callback that only writes to the session store when the percentage moves"""
+    last_progress = [None]
+
+    def update_progress(progress: Dict):
+        """Map ingestion progress onto the 10-99% range shown while processing"""
+        job.report(progress)
+        percent = 10 + int(89 * progress['fraction'])
+        if percent == last_progress[0]:
+            return
+        last_progress[0] = percent
+        sessions.update(sid, processing_progress=percent,
+                        chunks_done=progress['chunks_done'], chunks_total=progress['chunks'])
+
+    return update_progress
+
 @app.route('/api/status', methods=['GET'])
 def get_status():
+    state = get_session_state(get_session_id())
     return jsonify({
-        'status': app_state['status'],
-        'progress': app_state['processing_progress'],
-        'document_count': len(app_state['documents']),
-        'message_count': app_state['message_count']
+        'status': state['status'],
+        'progress': state['processing_progress'],
+        'chunks_done': state.get('chunks_done', 0),
+        'chunks_total': state.get('chunks_total', 0),
+        'document_count': len(state['documents']),
+        'message_count': state['message_count'],
+        'job_id': state.get('job_id')
     })
 
+def get_session_job(job_id: str) -> Optional[Dict]:
+    """Return a job if it belongs to the caller's session"""
+    job = jobs.get(job_id)
+    if job is None or job['session_id'] != get_session_id():
+        return None
+    return job
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report an ingestion job's status, per-stage progress and timings"""
+    job = get_session_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running ingestion job"""
+    if get_session_job(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    job = jobs.cancel(job_id)
+    # A queued job never runs, so nothing else will move the session out of processing
+    if job['status'] == 'cancelled':
+        sessions.update(job['session_id'], status='cancelled')
+    return jsonify(job)
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     # Check if chatbot is ready
-    if app_state['status'] != 'ready':
+    sid = get_session_id()
+    state = get_session_state(sid)
+    if state['status'] != 'ready':
         return jsonify({
             'error': 'Chatbot not ready. Please upload documents first.',
-            'status': app_state['status']
+            'status': state['status']
         }), 400
     
     data = request.json
@@ -240,9 +452,11 @@ def chat():
     if not message:
         return jsonify({'error': 'No message provided'}), 400
     
-    # Get chatbot
-    chatbot = app_state['chatbot']
-    if not chatbot:
+    try:
+        # Get chatbot
+        chatbot = get_chatbot(sid, state)
+    except Exception as e:
+        logger.error(f"Error initializing chatbot: {str(e)}")
         return jsonify({'error': 'Chatbot not initialized'}), 500
     
     try:
@@ -250,7 +464,7 @@ def chat():
         response_data = chatbot.get_response(message)
         
         # Update message count
-        app_state['message_count'] += 1
+        sessions.increment(sid, 'message_count')
         
         # Format response
         return jsonify({
@@ -259,34 +473,176 @@ def chat():
             'sources': response_data.get('sources', []),
             'confidence': response_data.get('confidence', 0),
             'query_id': response_data.get('query_id', ''),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'debug': response_data.get('debug', {})
         })
         
     except Exception as e:
         logger.error(f"Error in chat: {str(e)}")
         return jsonify({'error': 'Failed to generate response'}), 500
 
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer many independent questions in one request, returning one result per question in order"""
+    sid = get_session_id()
+    state = get_session_state(sid)
+    if state['status'] != 'ready':
+        return jsonify({
+            'error': 'Chatbot not ready. Please upload documents first.',
+            'status': state['status']
+        }), 400
+    
+    messages = (request.json or {}).get('messages')
+    if not isinstance(messages, list) or not messages:
+        return jsonify({'error': 'Provide a non-empty list of messages'}), 400
+    
+    MAX_BATCH_QUESTIONS = app.config['MAX_BATCH_QUESTIONS']
+    if len(messages) > MAX_BATCH_QUESTIONS:
+        return jsonify({'error': f'Too many messages. Maximum {MAX_BATCH_QUESTIONS} per batch.'}), 400
+    
+    try:
+        # Get chatbot
+        chatbot = get_chatbot(sid, state)
+    except Exception as e:
+        logger.error(f"Error initializing chatbot: {str(e)}")
+        return jsonify({'error': 'Chatbot not initialized'}), 500
+    
+    # Invalid items are reported in place; the valid ones are answered together
+    questions = [message.strip() if isinstance(message, str) else '' for message in messages]
+    valid = [i for i, question in enumerate(questions) if question]
+    try:
+        answers = dict(zip(valid, chatbot.get_responses([questions[i] for i in valid])))
+    except Exception as e:
+        logger.error(f"Error in batch chat: {str(e)}")
+        return jsonify({'error': 'Failed to generate responses'}), 500
+    
+    results = []
+    for i in range(len(questions)):
+        response_data = answers.get(i)
+        if response_data is None:
+            results.append({'success': False, 'error': 'No message provided'})
+        elif 'error' in response_data:
+            results.append({'success': False, 'error': response_data['error'], 'query_id': response_data.get('query_id', '')})
+        else:
+            results.append({
+                'success': True,
+                'response': response_data['response'],
+                'sources': response_data.get('sources', []),
+                'confidence': response_data.get('confidence', 0),
+                'query_id': response_data.get('query_id', ''),
+                'debug': response_data.get('debug', {})
+            })
+    
+    answered = sum(result['success'] for result in results)
+    if answered:
+        sessions.increment(sid, 'message_count', answered)
+    
+    return jsonify({
+        'success': True,
+        'results': results,
+        'answered': answered,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/chat/stream', methods=['GET', 'POST'])
+def chat_stream():
+    """Stream the chatbot response as Server-Sent Events"""
+    # Check if chatbot is ready
+    sid = get_session_id()
+    state = get_session_state(sid)
+    if state['status'] != 'ready':
+        return jsonify({
+            'error': 'Chatbot not ready. Please upload documents first.',
+            'status': state['status']
+        }), 400
+    
+    # EventSource clients can only send GET requests
+    if request.method == 'GET':
+        message = request.args.get('message', '').strip()
+    else:
+        message = (request.json or {}).get('message', '').strip()
+    
+    if not message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    try:
+        # Get chatbot
+        chatbot = get_chatbot(sid, state)
+    except Exception as e:
+        logger.error(f"Error initializing chatbot: {str(e)}")
+        return jsonify({'error': 'Chatbot not initialized'}), 500
+    
+    def generate():
+        try:
+            for event in chatbot.stream_response(message):
+                if event['type'] == 'done':
+                    sessions.increment(sid, 'message_count')
+                    payload = {
+                        'success': True,
+                        'response': event['response'],
+                        'sources': event.get('sources', []),
+                        'confidence': event.get('confidence', 0),
+                        'query_id': event.get('query_id', ''),
+                        'timestamp': datetime.now().isoformat(),
+                        'debug': event.get('debug', {})
+                    }
+                else:
+                    payload = {'content': event['content']}
+                yield f"event: {event['type']}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Failed to generate response'})}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable proxy buffering so tokens arrive immediately
+        }
+    )
+
 @app.route('/api/reset', methods=['POST'])
 def reset_session():
-    """Reset the app state"""
-    if app_state:
-        # Remove uploaded files
-        for doc in app_state['documents']:
-            try:
-                os.remove(doc)
-            except:
-                pass
-        
-    # Reset app state
-    app_state = original_app_state.copy()
-    app_state['created_at'] = datetime.now().isoformat()
+    """Reset the caller's session, removing its files and indexed documents"""
+    sid = get_session_id()
+    state = get_session_state(sid)
+    if state['status'] == 'processing':
+        return jsonify({'error': 'Documents are still being processed'}), 409
+    
+    discard_session(sid, state)
+    sessions.save(sid, new_session_state())
     
     return jsonify({'success': True })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint: stage latency histograms, cache, chunk and token counters"""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: models and heavy modules are loaded (503 until then)"""
+    state = preload_status()
+    return jsonify(state), 200 if state['ready'] else 503
+
+@app.route('/api/upstreams', methods=['GET'])
+def upstreams():
+    """This worker's OpenAI and Pinecone call counts, circuit breaker states and connection pools"""
+    return jsonify(upstream_stats())
+
 # Error handlers
 @app.errorhandler(413)
 def request_entity_too_large(error):
-    return jsonify({'error': 'File too large. Maximum size is 16MB.'}), 413
+    return jsonify({'error': f"File too large. Maximum total size is {app.config['MAX_TOTAL_SIZE'] / (1024*1024):g}MB."}), 413
 
 @app.errorhandler(500)
 def internal_error(error):
@@ -0,0 +1,182 @@
+# asgi.py - ASGI entry point: async /api/chat in front of the Flask app
+#
+#   gunicorn asgi:application --config gunicorn.conf.py -k uvicorn.workers.UvicornWorker
+#
+# /api/chat and /api/chat/stream (the route the UI uses) are answered on the
+# event loop, so a worker holds no thread while waiting for the LLM and can
+# keep hundreds of chats in flight. Every other route is served by the
+# unchanged Flask app through WSGIMiddleware.
+import os
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, request_response
+from starlette.types import ASGIApp
+
+from app import app as flask_app, get_chatbot, get_session_state, sessions, touch_session
+
+logger = logging.getLogger(__name__)
+
+# Threads per worker for the blocking parts of async chats (screening, encoding, retrieval)
+ASYNC_CHAT_THREADS = int(os.environ.get('ASYNC_CHAT_THREADS', 64))
+
+
+def get_session_id(request: Request) -> Optional[str]:
+    """Read the session ID from the Flask session cookie; None if there is no valid one"""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        data = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return data.get('sid')
+
+
+async def chat(request: Request) -> JSONResponse:
+    """Async twin of the Flask /api/chat route, with the same request and response shape"""
+    sid = get_session_id(request)
+    if sid is None:
+        # Sessions are issued by the Flask routes, and a new one has no documents yet
+        return JSONResponse({'error': 'Chatbot not ready. Please upload documents first.', 'status': 'idle'},
+                            status_code=400)
+
+    await run_in_threadpool(touch_session, sid)
+    state = await run_in_threadpool(get_session_state, sid)
+    if state['status'] != 'ready':
+        return JSONResponse({
+            'error': 'Chatbot not ready. Please upload documents first.',
+            'status': state['status']
+        }, status_code=400)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        return JSONResponse({'error': 'Invalid JSON body'}, status_code=400)
+    message = data.get('message', '').strip() if isinstance(data, dict) else ''
+
+    if not message:
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+
+    try:
+        chatbot = await run_in_threadpool(get_chatbot, sid, state)
+    except Exception as e:
+        logger.error(f"Error initializing chatbot: {str(e)}")
+        return JSONResponse({'error': 'Chatbot not initialized'}, status_code=500)
+
+    try:
+        response_data = await chatbot.aget_response(message)
+
+        await run_in_threadpool(sessions.increment, sid, 'message_count')
+
+        return JSONResponse({
+            'success': True,
+            'response': response_data['response'],
+            'sources': response_data.get('sources', []),
+            'confidence': response_data.get('confidence', 0),
+            'query_id': response_data.get('query_id', ''),
+            'timestamp': datetime.now().isoformat(),
+            'debug': response_data.get('debug', {})
+        })
+
+    except Exception as e:
+        logger.error(f"Error in chat: {str(e)}")
+        return JSONResponse({'error': 'Failed to generate response'}, status_code=500)
+
+
+async def chat_stream(request: Request):
+    """Async twin of the Flask /api/chat/stream route: the answer as Server-Sent Events"""
+    sid = get_session_id(request)
+    if sid is None:
+        return JSONResponse({'error': 'Chatbot not ready. Please upload documents first.', 'status': 'idle'},
+                            status_code=400)
+
+    await run_in_threadpool(touch_session, sid)
+    state = await run_in_threadpool(get_session_state, sid)
+    if state['status'] != 'ready':
+        return JSONResponse({
+            'error': 'Chatbot not ready. Please upload documents first.',
+            'status': state['status']
+        }, status_code=400)
+
+    # EventSource clients can only send GET requests
+    if request.method == 'GET':
+        message = request.query_params.get('message', '').strip()
+    else:
+        try:
+            data = await request.json()
+        except ValueError:
+            return JSONResponse({'error': 'Invalid JSON body'}, status_code=400)
+        message = data.get('message', '').strip() if isinstance(data, dict) else ''
+
+    if not message:
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+
+    try:
+        chatbot = await run_in_threadpool(get_chatbot, sid, state)
+    except Exception as e:
+        logger.error(f"Error initializing chatbot: {str(e)}")
+        return JSONResponse({'error': 'Chatbot not initialized'}, status_code=500)
+
+    async def generate():
+        try:
+            async for event in chatbot.astream_response(message):
+                if event['type'] == 'done':
+                    await run_in_threadpool(sessions.increment, sid, 'message_count')
+                    payload = {
+                        'success': True,
+                        'response': event['response'],
+                        'sources': event.get('sources', []),
+                        'confidence': event.get('confidence', 0),
+                        'query_id': event.get('query_id', ''),
+                        'timestamp': datetime.now().isoformat(),
+                        'debug': event.get('debug', {})
+                    }
+                else:
+                    payload = {'content': event['content']}
+                yield f"event: {event['type']}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Failed to generate response'})}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable proxy buffering so tokens arrive immediately
+        }
+    )
+
+
+def with_cors(endpoint) -> ASGIApp:
+    """Allow cross-origin calls to an async route, as Flask-CORS does for the mounted Flask routes"""
+    return CORSMiddleware(request_response(endpoint), allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+
+
+def set_chat_executor():
+    """Size the executor that asyncio.to_thread uses for the blocking parts of chats"""
+    executor = ThreadPoolExecutor(max_workers=ASYNC_CHAT_THREADS, thread_name_prefix='async-chat')
+    asyncio.get_running_loop().set_default_executor(executor)
+
+
+# CORS wraps only the async routes; the Flask app already answers preflights and adds headers for its own
+application = Starlette(
+    routes=[
+        Route('/api/chat', with_cors(chat), methods=['POST', 'OPTIONS']),
+        Route('/api/chat/stream', with_cors(chat_stream), methods=['GET', 'POST', 'OPTIONS']),
+        Mount('/', WSGIMiddleware(flask_app)),
+    ],
+    on_startup=[set_chat_executor],
+)
@@ -0,0 +1,147 @@
+# bench_async_chat.py - Concurrent /api/chat: sync gunicorn workers vs one async worker
+#
+#   python -m benchmarks.bench_async_chat --concurrency 16,64,256 --llm-latency 1.0
+#
+# The sync side models today's deployment: --workers requests served at a
+# time, each holding its worker for the whole LLM call. The async side sends
+# every request to one event loop running asgi.application. Both use the fake
+# Pinecone and OpenAI backends with the same latencies.
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.corpus import generate_mixed_corpus, generate_queries
+from benchmarks.fakes import FakePinecone, install_fakes
+from benchmarks.run_suite import latency_summary, prepare_chat_session, session_client
+
+
+def _level_result(concurrency: int, timings: List[float], errors: int, wall: float) -> Dict:
+    return {
+        'concurrency': concurrency,
+        'errors': errors,
+        'requests_per_second': round(len(timings) / wall, 2),
+        **latency_summary(timings),
+    }
+
+
+def bench_sync(app, sid: str, messages: List[str], concurrency: int, workers: int) -> Dict:
+    """concurrency clients against `workers` sync workers, each busy for a whole request"""
+    worker_slots = threading.BoundedSemaphore(workers)
+    timings, errors = [], [0]
+    lock = threading.Lock()
+    pending = iter(messages)
+
+    def client_loop():
+        client = session_client(app, sid)
+        while True:
+            with lock:
+                message = next(pending, None)
+            if message is None:
+                return
+            start = time.perf_counter()
+            # Queueing for a free worker counts towards latency, as it does behind gunicorn
+            with worker_slots:
+                response = client.post('/api/chat', json={'message': message})
+            elapsed = time.perf_counter() - start
+            with lock:
+                timings.append(elapsed)
+                errors[0] += response.status_code != 200
+
+    threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _level_result(concurrency, timings, errors[0], time.perf_counter() - start)
+
+
+async def bench_async(app, sid: str, messages: List[str], concurrency: int) -> Dict:
+    """concurrency clients against a single async worker"""
+    import httpx
+    from asgi import application, set_chat_executor
+
+    # ASGITransport does not run lifespan events, so size the executor here
+    set_chat_executor()
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'sid': sid})
+    timings, errors = [], 0
+    pending = iter(messages)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url='http://benchmark',
+                                 cookies={app.config['SESSION_COOKIE_NAME']: cookie}, timeout=None) as client:
+        async def client_loop():
+            nonlocal errors
+            for message in pending:
+                start = time.perf_counter()
+                response = await client.post('/api/chat', json={'message': message})
+                timings.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return _level_result(concurrency, timings, errors, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /api/chat throughput, sync workers vs async")
+    parser.add_argument('--files', type=int, default=3)
+    parser.add_argument('--words', type=int, default=2000, help="Words per generated document")
+    parser.add_argument('--concurrency', default='16,64,256')
+    parser.add_argument('--requests', type=int, default=2, help="Requests per client at each level")
+    parser.add_argument('--workers', type=int, default=4, help="Sync gunicorn workers being modelled")
+    parser.add_argument('--pinecone-latency', type=float, default=0.02, help="Seconds per Pinecone call")
+    parser.add_argument('--llm-latency', type=float, default=1.0, help="Seconds per LLM completion")
+    parser.add_argument('--skip-sync', action='store_true', help="Only run the async side")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    levels = sorted({int(level) for level in args.concurrency.split(',')})
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Keep sessions and caches out of the working tree; must be set before the app modules load
+        os.environ['SESSION_STORE_URL'] = f"sqlite:///{os.path.join(workdir, 'sessions.db')}"
+        os.environ['EMBEDDING_CACHE_PATH'] = ''
+        os.environ['VECTOR_BACKEND'] = 'pinecone'
+        install_fakes(pinecone_latency=args.pinecone_latency, llm_latency=args.llm_latency)
+
+        paths = generate_mixed_corpus(os.path.join(workdir, 'corpus'), args.files, args.words)
+        queries = generate_queries(200, seed=args.seed)
+        app, sid, _ = prepare_chat_session(paths, queries, os.path.join(workdir, 'uploads'))
+
+        def level_messages(mode: str, concurrency: int) -> List[str]:
+            # Unique questions so the answer cache does not short-circuit the pipeline
+            return [f"{queries[i % len(queries)]} ({mode} {concurrency} #{i})"
+                    for i in range(concurrency * args.requests)]
+
+        results = {'sync': [], 'async': []}
+        for concurrency in levels:
+            if not args.skip_sync:
+                results['sync'].append(bench_sync(app, sid, level_messages('sync', concurrency),
+                                                  concurrency, args.workers))
+            results['async'].append(asyncio.run(bench_async(app, sid, level_messages('async', concurrency),
+                                                            concurrency)))
+        FakePinecone.reset()
+
+    print(json.dumps({
+        'benchmark': 'async_chat',
+        'config': {
+            'sync_workers': args.workers,
+            'async_workers': 1,
+            'requests_per_client': args.requests,
+            'pinecone_latency': args.pinecone_latency,
+            'llm_latency': args.llm_latency,
+        },
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
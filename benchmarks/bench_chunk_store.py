@@ -0,0 +1,81 @@
+# bench_chunk_store.py - Memory per chunk and lookup latency of ChunkStore versus a dict of Documents
+#
+#   python -m benchmarks.bench_chunk_store --chunks 50000 --chunk-chars 1000
+import argparse
+import gc
+import hashlib
+import json
+import time
+import tracemalloc
+
+from langchain.schema import Document
+
+from benchmarks.corpus import generate_text
+from chunk_store import ChunkStore
+
+
+def make_chunks(count: int, chunk_chars: int, chunks_per_document: int):
+    """(vector ID, Document) pairs with the metadata CompanyDocumentProcessor attaches"""
+    text = generate_text(chunk_chars, seed=1)
+    for i in range(count):
+        source, index = f"policy_{i // chunks_per_document}.pdf", i % chunks_per_document
+        content = f"{i} {text[:chunk_chars]}"
+        yield f"{source}_{index}", Document(page_content=content, metadata={
+            'source': source,
+            'doc_type': 'policy',
+            'last_updated': '2024-01-01T00:00:00',
+            'checksum': hashlib.md5(source.encode()).hexdigest(),
+            'chunk_index': index,
+            'total_chunks': chunks_per_document,
+            'chunk_id': f"{source}_{index}",
+            'content_hash': hashlib.md5(content.encode()).hexdigest(),
+        })
+
+
+def measure(factory, chunks, text_bytes: int):
+    """Bytes allocated to hold every chunk, beyond its text, and mean lookup latency"""
+    gc.collect()
+    tracemalloc.start()
+    store = factory()
+    for doc_id, doc in chunks():
+        store[doc_id] = doc
+    gc.collect()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    ids = list(store)[::97]
+    start = time.perf_counter()
+    for doc_id in ids:
+        store[doc_id].page_content
+    elapsed = time.perf_counter() - start
+    return {
+        'bytes_per_chunk': round(allocated / len(store), 1),
+        'overhead_bytes_per_chunk': round((allocated - text_bytes) / len(store), 1),
+        'memory_mb': round(allocated / 1e6, 2),
+        'us_per_lookup': round(elapsed / len(ids) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per chunk of ChunkStore versus a dict of Documents")
+    parser.add_argument('--chunks', type=int, default=50000)
+    parser.add_argument('--chunk-chars', type=int, default=1000)
+    parser.add_argument('--chunks-per-document', type=int, default=50)
+    args = parser.parse_args()
+
+    # Documents are built during the measurement, as they are when the store is filled from chunking
+    chunks = lambda: ((doc_id, Document(page_content=doc.page_content, metadata=dict(doc.metadata)))
+                      for doc_id, doc in make_chunks(args.chunks, args.chunk_chars, args.chunks_per_document))
+    text_bytes = sum(len(doc.page_content.encode('utf-8')) for _, doc in chunks())
+    results = {'dict': measure(dict, chunks, text_bytes), 'chunk_store': measure(ChunkStore, chunks, text_bytes)}
+
+    print(json.dumps({
+        'benchmark': 'chunk_store',
+        'chunks': args.chunks,
+        'chunk_chars': args.chunk_chars,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# bench_encoders.py - Embedding throughput, memory and parity of the torch, onnx and onnx-int8 backends
+#
+#   python -m benchmarks.bench_encoders --model ./models/all-MiniLM-L6-v2 --sentences 2000
+#
+# Runs offline against a model saved on disk (SentenceTransformer.save). The
+# model is exported to ONNX first, then every backend is measured in a fresh
+# interpreter so resident memory reflects that backend alone. Parity is the
+# cosine similarity of each backend's embeddings with the torch ones.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.corpus import generate_text
+
+
+def rss_mb(field: str = 'VmRSS') -> float:
+    """Resident memory of this process, or its peak with field='VmHWM'"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def chunk_sentences(count: int) -> List[str]:
+    """Chunk-sized texts (short to ~200 words, like ingestion batches) from the synthetic corpus"""
+    return [generate_text(20 + (i * 37) % 180, seed=i) for i in range(count)]
+
+
+def run_worker(args):
+    """Measure one backend in this process (ENCODER_BACKEND is set by the parent)"""
+    import encoders
+    from onnx_encoder import MODEL_FILES, PARITY_SENTENCES, export_dir
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    encoder = encoders.get_encoder(args.model)
+    load_seconds = time.perf_counter() - start
+    backend = encoders._backends[args.model]
+
+    sentences = chunk_sentences(args.sentences)
+    seconds = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        encoder.encode(sentences, batch_size=args.batch_size, normalize_embeddings=True, show_progress_bar=False)
+        seconds.append(time.perf_counter() - start)
+
+    query_start = time.perf_counter()
+    for sentence in PARITY_SENTENCES:
+        encoder.encode([sentence], normalize_embeddings=True, show_progress_bar=False)
+    query_ms = (time.perf_counter() - query_start) * 1000 / len(PARITY_SENTENCES)
+
+    np.save(args.embeddings_out, encoder.encode(PARITY_SENTENCES, normalize_embeddings=True, show_progress_bar=False))
+    model_file = os.path.join(export_dir(args.model), MODEL_FILES.get(backend, ''))
+    print(json.dumps({
+        'backend_loaded': backend,
+        'load_seconds': round(load_seconds, 3),
+        'sentences_per_second': round(len(sentences) / min(seconds), 1),
+        'single_query_ms': round(query_ms, 2),
+        'rss_mb': round(rss_mb(), 1),
+        'rss_growth_mb': round(rss_mb() - baseline, 1),
+        'peak_rss_mb': round(rss_mb('VmHWM'), 1),
+        'model_file_mb': round(os.path.getsize(model_file) / 2**20, 1) if os.path.isfile(model_file) else None,
+    }))
+
+
+def bench_backend(backend: str, args, embeddings_out: str) -> Dict:
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, ENCODER_BACKEND=backend,
+               PYTHONPATH=os.pathsep.join(filter(None, [repo, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_encoders', '--worker', '--model', args.model,
+         '--sentences', str(args.sentences), '--batch-size', str(args.batch_size), '--repeat', str(args.repeat),
+         '--embeddings-out', embeddings_out],
+        capture_output=True, text=True, env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{backend} run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends on a local model")
+    parser.add_argument('--model', required=True, help="Path of a SentenceTransformer model saved on disk")
+    parser.add_argument('--backends', default='torch,onnx,onnx-int8')
+    parser.add_argument('--sentences', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--embeddings-out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ.setdefault('EMBEDDING_CACHE_PATH', '')
+    os.environ.setdefault('METRICS_ENABLED', '0')
+    if args.worker:
+        run_worker(args)
+        return
+
+    from onnx_encoder import cosine_agreement, export_dir, export_onnx_model
+
+    # Export once up front so no backend's load time includes it
+    export_seconds = None
+    if not os.path.exists(os.path.join(export_dir(args.model), 'encoder.json')):
+        start = time.perf_counter()
+        export_onnx_model(args.model)
+        export_seconds = round(time.perf_counter() - start, 2)
+
+    results, embeddings = {}, {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in args.backends.split(','):
+            path = os.path.join(workdir, f'{backend}.npy')
+            results[backend] = bench_backend(backend, args, path)
+            embeddings[backend] = np.load(path)
+
+    if 'torch' in embeddings:
+        for backend, vectors in embeddings.items():
+            results[backend]['parity_vs_torch'] = cosine_agreement(embeddings['torch'], vectors)
+
+    print(json.dumps({
+        'benchmark': 'encoders',
+        'model': args.model,
+        'sentences': args.sentences,
+        'batch_size': args.batch_size,
+        'export_seconds': export_seconds,
+        'backends': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
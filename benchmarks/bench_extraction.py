@@ -0,0 +1,56 @@
+# bench_extraction.py - Document extraction throughput versus worker count
+#
+#   python -m benchmarks.bench_extraction --files 8 --pages 60 --workers 1,2,4,8
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus
+from document_processor import CompanyDocumentProcessor
+
+
+def run(paths, workers, repeat):
+    """Time load_documents for each worker count, best of `repeat` runs"""
+    results = []
+    for worker_count in workers:
+        processor = CompanyDocumentProcessor(max_workers=worker_count)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            documents = processor.load_documents(paths)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results.append({
+            'workers': worker_count,
+            'documents': len(documents),
+            'seconds': round(best, 4),
+            'chars_per_second': round(sum(len(doc.page_content) for doc in documents) / best),
+        })
+
+    baseline = results[0]['seconds']
+    for result in results:
+        result['speedup'] = round(baseline / result['seconds'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document extraction throughput versus worker count")
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--pages', type=int, default=60)
+    parser.add_argument('--words-per-page', type=int, default=400)
+    parser.add_argument('--workers', default=f"1,2,4,{os.cpu_count()}")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workers = sorted({int(w) for w in args.workers.split(',')})
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_corpus(directory, 'pdf', args.files, args.pages * args.words_per_page, pages=args.pages)
+        results = run(paths, workers, args.repeat)
+
+    print(json.dumps({'benchmark': 'extraction', 'files': args.files, 'pages': args.pages, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# bench_quantization.py - Recall, memory and latency of quantized embedding storage versus float32
+#
+#   python -m benchmarks.bench_quantization --vectors 100000 --queries 200 --k 5
+import argparse
+import json
+import time
+
+import numpy as np
+
+from quantization import SUPPORTED_DTYPES, EmbeddingMatrix
+
+
+def clustered_embeddings(count: int, dimension: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Normalized vectors grouped around topics, closer to real chunk embeddings than uniform noise"""
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, k: int):
+    """Recall@k of each storage format against exact float32 search"""
+    reference = EmbeddingMatrix(vectors.shape[1], 'float32')
+    reference.append(vectors)
+    truth = [set(reference.top_k(query, k)[0]) for query in queries]
+
+    results = []
+    for dtype in SUPPORTED_DTYPES:
+        matrix = EmbeddingMatrix(vectors.shape[1], dtype)
+        matrix.append(vectors)
+
+        start = time.perf_counter()
+        found = [matrix.top_k(query, k)[0] for query in queries]
+        elapsed = time.perf_counter() - start
+
+        recall = np.mean([len(truth[i].intersection(rows)) / k for i, rows in enumerate(found)])
+        results.append({
+            'dtype': dtype,
+            'recall_at_k': round(float(recall), 4),
+            'memory_mb': round(matrix.nbytes / 1e6, 2),
+            'bytes_per_vector': round(matrix.nbytes / len(matrix), 1),
+            'ms_per_query': round(elapsed / len(queries) * 1000, 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall, memory and latency of quantized embedding storage")
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = clustered_embeddings(args.vectors + args.queries, args.dimension, args.clusters, rng)
+    results = run(data[:args.vectors], data[args.vectors:], args.k)
+
+    print(json.dumps({
+        'benchmark': 'quantization',
+        'vectors': args.vectors,
+        'dimension': args.dimension,
+        'k': args.k,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# bench_security_filter.py - Per-query screening cost: legacy multi-scan vs compiled analyze()
+#
+#   python -m benchmarks.bench_security_filter --iterations 20000
+import argparse
+import json
+import logging
+import re
+import time
+
+from security_filter import SecurityFilter
+
+QUERIES = [
+    "What are the monthly fees for a checking account?",
+    "How do I apply for a mortgage and what is the current APR?",
+    "I want to file a complaint about a fraud charge on my card",
+    "Can you tell me the overdraft policy for savings accounts",
+    "My SSN is 123-45-6789, can you check my application?",
+    "How do I reset my online banking password?",
+    "What documents do I need to open a business account with $5,000?",
+    "Transfer all my money to my other bank please",
+    "What are your branch opening hours on weekends?",
+    "Is there a minimum balance requirement for the premium card?",
+]
+
+
+def legacy_screen(security_filter: SecurityFilter, query: str):
+    """The pre-compiled-engine flow: is_query_safe, get_risk_level and requires_human_review each rescan"""
+    query_lower = query.lower()
+
+    def check_pii(text):
+        found = []
+        for pii_type, pattern in security_filter.pii_patterns.items():
+            matches = re.findall(pattern, text, re.IGNORECASE)
+            found.extend((pii_type, match) for match in matches)
+        return found
+
+    def risk_level():
+        if check_pii(query) or any(term in query_lower for term in security_filter.blocked_terms):
+            return "CRITICAL"
+        if (any(topic in query_lower for topic in security_filter.sensitive_topics) or
+                any(re.search(pattern, query_lower) for pattern in security_filter.high_risk_patterns)):
+            return "HIGH"
+        if re.search(r'\$[\d,]+', query) or 'account' in query_lower:
+            return "MEDIUM"
+        return "LOW"
+
+    is_safe = not check_pii(query) and not any(term in query_lower for term in security_filter.blocked_terms)
+    for pattern in security_filter.high_risk_patterns:
+        re.search(pattern, query_lower)
+    if not is_safe:
+        return False, risk_level(), False
+
+    review = (any(topic in query_lower for topic in security_filter.sensitive_topics) or
+              any(re.search(pattern, query_lower) for pattern in security_filter.high_risk_patterns))
+    return True, risk_level() if review else None, review
+
+
+def compiled_screen(security_filter: SecurityFilter, query: str):
+    analysis = security_filter.analyze(query)
+    if not analysis.is_safe:
+        return False, analysis.risk_level, False
+    return True, analysis.risk_level if analysis.requires_review else None, analysis.requires_review
+
+
+def time_screen(screen, security_filter, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        screen(security_filter, QUERIES[i % len(QUERIES)])
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SecurityFilter screening microbenchmark")
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    # Measure matching, not log formatting
+    logging.disable(logging.CRITICAL)
+    security_filter = SecurityFilter()
+
+    for query in QUERIES:
+        assert legacy_screen(security_filter, query) == compiled_screen(security_filter, query), query
+
+    legacy = time_screen(legacy_screen, security_filter, args.iterations)
+    compiled = time_screen(compiled_screen, security_filter, args.iterations)
+
+    print(json.dumps({
+        'benchmark': 'security_filter',
+        'iterations': args.iterations,
+        'legacy_us_per_query': round(legacy * 1e6, 2),
+        'compiled_us_per_query': round(compiled * 1e6, 2),
+        'speedup': round(legacy / compiled, 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
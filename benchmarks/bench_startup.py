@@ -0,0 +1,127 @@
+# bench_startup.py - Import cost per module and time from process start to first response
+#
+#   python -m benchmarks.bench_startup --repeat 5
+#
+# Every measurement runs in a fresh interpreter so nothing is already
+# imported. Import costs come from `python -X importtime` (cumulative, so a
+# module's figure includes everything it pulls in). The boot check imports
+# the app, times GET / and /api/status, then waits for /readyz to turn 200.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+APP_MODULES = [
+    'metrics', 'session_store', 'jobs', 'clients', 'app', 'asgi',
+    'encoders', 'vector_store', 'document_processor', 'chatbot', 'secured_chatbot',
+    'pinecone_vector', 'local_vector', 'reranker', 'onnx_encoder',
+]
+THIRD_PARTY_MODULES = [
+    'flask', 'numpy', 'langchain.schema', 'langchain.text_splitter', 'sentence_transformers', 'torch',
+    'openai', 'pinecone', 'tiktoken', 'PyPDF2', 'docx', 'prometheus_client', 'starlette', 'onnxruntime',
+]
+
+BOOT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+client = app.test_client()
+page = client.get('/')
+first_page = time.perf_counter()
+status = client.get('/api/status')
+first_status = time.perf_counter()
+ready = None
+while time.perf_counter() - start < {timeout}:
+    if client.get('/readyz').status_code == 200:
+        ready = time.perf_counter()
+        break
+    time.sleep(0.01)
+print(json.dumps({{
+    'import_app_ms': (imported - start) * 1000,
+    'first_page_ms': (first_page - start) * 1000,
+    'first_status_ms': (first_status - start) * 1000,
+    'page_status': page.status_code,
+    'status_status': status.status_code,
+    'ready_ms': (ready - start) * 1000 if ready else None,
+}}))
+"""
+
+
+def run_fresh(args: List[str]) -> subprocess.CompletedProcess:
+    """Run a new interpreter that can import the app without touching the working tree"""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # Importing app creates uploads/ and session databases in the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ,
+                   PYTHONPATH=os.pathsep.join(filter(None, [repo, os.environ.get('PYTHONPATH')])),
+                   SESSION_STORE_URL=f"sqlite:///{os.path.join(workdir, 'sessions.db')}")
+        return subprocess.run([sys.executable, *args], capture_output=True, text=True, cwd=workdir, env=env)
+
+
+def import_time_ms(module: str) -> Optional[float]:
+    """Cumulative import time of a module in a fresh interpreter, None if it cannot be imported"""
+    result = run_fresh(['-X', 'importtime', '-c', f'import {module}'])
+    if result.returncode != 0:
+        return None
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    return None
+
+
+def bench_imports(modules: List[str], repeat: int) -> Dict:
+    results = {}
+    for module in modules:
+        timings = [import_time_ms(module) for _ in range(repeat)]
+        timings = [ms for ms in timings if ms is not None]
+        results[module] = round(statistics.median(timings), 1) if timings else None
+    return dict(sorted(results.items(), key=lambda item: -(item[1] or 0)))
+
+
+def bench_boot(repeat: int, timeout: float) -> Dict:
+    """Median milliseconds from interpreter start to importing the app, first responses and readiness"""
+    runs = []
+    for _ in range(repeat):
+        result = run_fresh(['-c', BOOT_SCRIPT.format(timeout=timeout)])
+        if result.returncode != 0:
+            raise RuntimeError(f"Boot check failed:\n{result.stderr[-2000:]}")
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    summary = {}
+    for key in ('import_app_ms', 'first_page_ms', 'first_status_ms', 'ready_ms'):
+        values = [run[key] for run in runs if run[key] is not None]
+        summary[key] = round(statistics.median(values), 1) if values else None
+    summary['page_status'] = runs[-1]['page_status']
+    summary['status_status'] = runs[-1]['status_status']
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import cost per module and time to first response")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--ready-timeout', type=float, default=120, help="Seconds to wait for /readyz")
+    parser.add_argument('--skip-third-party', action='store_true')
+    args = parser.parse_args()
+
+    os.environ.setdefault('EMBEDDING_CACHE_PATH', '')
+    os.environ.setdefault('METRICS_ENABLED', '0')
+
+    modules = APP_MODULES + ([] if args.skip_third_party else THIRD_PARTY_MODULES)
+    print(json.dumps({
+        'benchmark': 'startup',
+        'python': sys.version.split()[0],
+        'repeat': args.repeat,
+        'import_ms': bench_imports(modules, args.repeat),
+        'boot': bench_boot(args.repeat, args.ready_timeout),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# corpus.py - Synthetic banking documents for offline benchmarks
+import os
+import random
+from typing import List
+
+WORDS = [
+    "account", "balance", "savings", "checking", "interest", "rate", "apr", "loan",
+    "mortgage", "credit", "debit", "card", "fee", "overdraft", "transfer", "deposit",
+    "withdrawal", "branch", "statement", "customer", "service", "policy", "compliance",
+    "minimum", "monthly", "annual", "term", "payment", "online", "mobile", "banking",
+    "limit", "approval", "application", "document", "identity", "verification", "the",
+    "a", "of", "to", "and", "for", "is", "on", "with", "your", "our", "may", "be",
+]
+
+
+def generate_text(num_words: int, seed: int = 0) -> str:
+    """Generate pseudo-random banking prose with sentences and paragraphs"""
+    rng = random.Random(seed)
+    sentences, paragraphs = [], []
+    words_left = num_words
+    while words_left > 0:
+        length = min(words_left, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        words_left -= length
+        if len(sentences) == 5:
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def write_txt(path: str, text: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def write_docx(path: str, text: str):
+    import docx
+    document = docx.Document()
+    for paragraph in text.split("\n\n"):
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_pdf(path: str, pages: List[str], line_width: int = 90):
+    """Write a minimal valid PDF with one Helvetica text stream per page (no PDF library needed)"""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_ref = len(objects) + 1
+    objects.append(None)  # Pages tree, filled in once the kids are known
+
+    kids = []
+    for text in pages:
+        lines = []
+        for paragraph in text.split("\n"):
+            while len(paragraph) > line_width:
+                split = paragraph.rfind(" ", 0, line_width)
+                split = split if split > 0 else line_width
+                lines.append(paragraph[:split])
+                paragraph = paragraph[split:].lstrip()
+            lines.append(paragraph)
+
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({line}) '" for line in escaped) + " ET"
+        stream = stream.encode("latin-1", errors="replace")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_ref, font, content)
+        ))
+
+    objects[pages_ref - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_ref)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, xref)
+
+    with open(path, 'wb') as f:
+        f.write(output)
+
+
+def generate_pdf(path: str, num_pages: int, words_per_page: int = 400, seed: int = 0):
+    """Write a synthetic PDF with the given number of pages"""
+    write_pdf(path, [generate_text(words_per_page, seed=seed + page) for page in range(num_pages)])
+
+
+def generate_corpus(directory: str, kind: str, num_files: int, words: int, pages: int = 1) -> List[str]:
+    """Write num_files synthetic documents of one kind ('txt', 'pdf' or 'docx') and return their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(num_files):
+        path = os.path.join(directory, f"bank_policy_{i}.{kind}")
+        if kind == 'pdf':
+            generate_pdf(path, pages, words_per_page=max(words // pages, 1), seed=i * 1000)
+        elif kind == 'docx':
+            write_docx(path, generate_text(words, seed=i))
+        else:
+            write_txt(path, generate_text(words, seed=i))
+        paths.append(path)
+    return paths
+
+
+def generate_mixed_corpus(directory: str, num_files: int, words: int, kinds=('txt', 'pdf', 'docx'),
+                          words_per_page: int = 400) -> List[str]:
+    """Write num_files documents cycling through the given kinds; PDFs get one page per words_per_page"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(num_files):
+        kind = kinds[i % len(kinds)]
+        path = os.path.join(directory, f"bank_policy_{i}.{kind}")
+        if kind == 'pdf':
+            pages = max(1, words // words_per_page)
+            generate_pdf(path, pages, words_per_page=max(words // pages, 1), seed=i * 1000)
+        elif kind == 'docx':
+            write_docx(path, generate_text(words, seed=i))
+        else:
+            write_txt(path, generate_text(words, seed=i))
+        paths.append(path)
+    return paths
+
+
+QUESTION_TEMPLATES = [
+    "What is the {0} {1} policy?",
+    "How does the {0} affect my {1}?",
+    "Is there a {0} for {1} accounts?",
+    "What are the {0} requirements for a {1}?",
+    "Can I change my {0} {1} online?",
+]
+
+
+def generate_queries(count: int, seed: int = 0) -> List[str]:
+    """Customer questions built from the corpus vocabulary, so retrieval has something to find"""
+    rng = random.Random(seed)
+    topics = WORDS[:WORDS.index("the")]
+    return [rng.choice(QUESTION_TEMPLATES).format(rng.choice(topics), rng.choice(topics)) for _ in range(count)]
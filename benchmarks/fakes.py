@@ -0,0 +1,262 @@
+# fakes.py - In-process stand-ins for the Pinecone and OpenAI clients, with configurable latency
+#
+# install_fakes() swaps them into the clients module so the whole
+# pipeline runs offline. The fakes only mirror the parts of each client API
+# the app calls; latencies model network round trips, not service internals.
+import asyncio
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+def _sleep(latency: float, jitter: float):
+    """Sleep for latency seconds, give or take up to jitter of it"""
+    if latency > 0:
+        time.sleep(latency * (1 + random.uniform(-jitter, jitter)))
+
+
+class FakeIndex:
+    """Exact cosine search over in-memory namespaces, answering like a Pinecone Index handle"""
+
+    def __init__(self, dimension: int, latency: float = 0.0, jitter: float = 0.2):
+        self.dimension = dimension
+        self.latency = latency
+        self.jitter = jitter
+        self._namespaces: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _namespace(self, namespace: str) -> Dict:
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            ns = self._namespaces[namespace] = {
+                'ids': [], 'rows': {}, 'vectors': np.empty((0, self.dimension), dtype=np.float32), 'metadata': [],
+            }
+        return ns
+
+    def upsert(self, vectors: List[Dict], namespace: str = "", **kwargs):
+        _sleep(self.latency, self.jitter)
+        with self._lock:
+            ns = self._namespace(namespace)
+            new_rows = []
+            for vector in vectors:
+                values = np.asarray(vector['values'], dtype=np.float32)
+                values /= np.linalg.norm(values) or 1.0
+                row = ns['rows'].get(vector['id'])
+                if row is None:
+                    ns['rows'][vector['id']] = len(ns['ids'])
+                    ns['ids'].append(vector['id'])
+                    ns['metadata'].append(vector.get('metadata', {}))
+                    new_rows.append(values)
+                else:
+                    ns['vectors'][row] = values
+                    ns['metadata'][row] = vector.get('metadata', {})
+            if new_rows:
+                ns['vectors'] = np.concatenate([ns['vectors'], np.stack(new_rows)])
+        return {'upserted_count': len(vectors)}
+
+    def query(self, vector: List[float], top_k: int = 10, namespace: str = "",
+              include_metadata: bool = False, **kwargs) -> Dict:
+        _sleep(self.latency, self.jitter)
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None or not ns['ids']:
+                return {'matches': [], 'namespace': namespace}
+            query = np.asarray(vector, dtype=np.float32)
+            scores = ns['vectors'] @ (query / (np.linalg.norm(query) or 1.0))
+            top = np.argsort(-scores)[:top_k]
+            matches = [{
+                'id': ns['ids'][row],
+                'score': float(scores[row]),
+                'metadata': dict(ns['metadata'][row]) if include_metadata else {},
+            } for row in top]
+        return {'matches': matches, 'namespace': namespace}
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> SimpleNamespace:
+        """Stored vectors by ID; like the SDK's FetchResponse, fields are attributes"""
+        _sleep(self.latency, self.jitter)
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            rows = ns['rows'] if ns is not None else {}
+            vectors = {
+                doc_id: SimpleNamespace(id=doc_id, values=ns['vectors'][rows[doc_id]].tolist(),
+                                        metadata=dict(ns['metadata'][rows[doc_id]]))
+                for doc_id in ids if doc_id in rows
+            }
+        return SimpleNamespace(vectors=vectors, namespace=namespace)
+
+    def update(self, id: str, set_metadata: Optional[Dict] = None, namespace: str = "", **kwargs):
+        """Merge fields into one vector's metadata"""
+        _sleep(self.latency, self.jitter)
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is not None and id in ns['rows']:
+                ns['metadata'][ns['rows'][id]].update(set_metadata or {})
+        return {}
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = "", **kwargs):
+        _sleep(self.latency, self.jitter)
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace, None)
+                return {}
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                return {}
+            remove = set(ids or [])
+            keep = [row for row, doc_id in enumerate(ns['ids']) if doc_id not in remove]
+            ns['ids'] = [ns['ids'][row] for row in keep]
+            ns['metadata'] = [ns['metadata'][row] for row in keep]
+            ns['vectors'] = ns['vectors'][keep]
+            ns['rows'] = {doc_id: row for row, doc_id in enumerate(ns['ids'])}
+        return {}
+
+    def list(self, namespace: str = "", limit: int = 100, **kwargs) -> Iterator[List[str]]:
+        """Vector IDs in pages, like the serverless list endpoint"""
+        with self._lock:
+            ids = list(self._namespaces.get(namespace, {}).get('ids', []))
+        for start in range(0, len(ids), limit):
+            _sleep(self.latency, self.jitter)
+            yield ids[start:start + limit]
+
+    def describe_index_stats(self, **kwargs) -> Dict:
+        _sleep(self.latency, self.jitter)
+        with self._lock:
+            namespaces = {name: {'vector_count': len(ns['ids'])} for name, ns in self._namespaces.items()}
+        return {
+            'dimension': self.dimension,
+            'index_fullness': 0.0,
+            'namespaces': namespaces,
+            'total_vector_count': sum(ns['vector_count'] for ns in namespaces.values()),
+        }
+
+
+class FakePinecone:
+    """Pinecone client whose indexes live in this process; every instance sees the same indexes"""
+
+    _indexes: Dict[str, FakeIndex] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, api_key: Optional[str] = None, latency: float = 0.0, jitter: float = 0.2, **kwargs):
+        self.latency = latency
+        self.jitter = jitter
+
+    def has_index(self, name: str) -> bool:
+        return name in self._indexes
+
+    def create_index(self, name: str, dimension: int, metric: str = 'cosine', spec=None, **kwargs):
+        with self._lock:
+            self._indexes.setdefault(name, FakeIndex(dimension, self.latency, self.jitter))
+
+    def describe_index(self, name: str):
+        index = self._indexes[name]
+        return SimpleNamespace(name=name, dimension=index.dimension, status={'ready': True})
+
+    def Index(self, name: str, **kwargs) -> FakeIndex:
+        return self._indexes[name]
+
+    @classmethod
+    def reset(cls):
+        """Forget every index (between benchmark runs)"""
+        import pinecone_vector
+
+        with cls._lock:
+            cls._indexes.clear()
+        # The app caches index handles per process
+        pinecone_vector._indexes.clear()
+
+
+class _FakeCompletions:
+    def __init__(self, client: 'FakeOpenAI'):
+        self.client = client
+
+    def create(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
+        client = self.client
+        answer = client.answer(messages)
+        _sleep(client.latency, client.jitter)
+        if not stream:
+            message = SimpleNamespace(role='assistant', content=answer)
+            return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')])
+        return client.stream_tokens(model, answer)
+
+
+class FakeOpenAI:
+    """OpenAI chat client that answers after a fixed time to first token plus a per-token delay.
+
+    The answer is the first sentences of the prompt's context, about
+    answer_tokens words long, so response sanitizing sees realistic text.
+    """
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0, answer_tokens: int = 60,
+                 jitter: float = 0.2, **kwargs):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.jitter = jitter
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    def answer(self, messages: List[Dict]) -> str:
+        prompt = messages[-1]['content']
+        context = prompt.split("CONTEXT FROM COMPANY DOCUMENTATION:", 1)[-1]
+        words = context.split()[:self.answer_tokens]
+        return " ".join(words) or "I don't have that information in the uploaded documents."
+
+    def stream_tokens(self, model: str, answer: str) -> Iterator:
+        for i, word in enumerate(answer.split(" ")):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            delta = SimpleNamespace(role='assistant', content=word if i == 0 else f" {word}")
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+
+
+class _FakeAsyncCompletions:
+    def __init__(self, client: 'FakeAsyncOpenAI'):
+        self.client = client
+
+    async def create(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
+        client = self.client
+        answer = client.answer(messages)
+        if client.latency > 0:
+            await asyncio.sleep(client.latency * (1 + random.uniform(-client.jitter, client.jitter)))
+        if stream:
+            return client.astream_tokens(model, answer)
+        message = SimpleNamespace(role='assistant', content=answer)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')])
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    """AsyncOpenAI counterpart of FakeOpenAI: waits on the event loop instead of blocking a thread"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=_FakeAsyncCompletions(self))
+
+    async def astream_tokens(self, model: str, answer: str) -> AsyncIterator:
+        for i, word in enumerate(answer.split(" ")):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            delta = SimpleNamespace(role='assistant', content=word if i == 0 else f" {word}")
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+
+
+def install_fakes(pinecone_latency: float = 0.0, llm_latency: float = 0.0, token_latency: float = 0.0,
+                  answer_tokens: int = 60, jitter: float = 0.2):
+    """Route the app's Pinecone and OpenAI clients to the fakes (call before building vector stores or chatbots)"""
+    os.environ.setdefault('PINECONE_API_KEY', 'benchmark')
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+    import clients
+
+    def new_openai(asynchronous: bool = False):
+        if asynchronous:
+            return FakeAsyncOpenAI(latency=llm_latency, token_latency=token_latency, answer_tokens=answer_tokens, jitter=jitter)
+        return FakeOpenAI(latency=llm_latency, token_latency=token_latency, answer_tokens=answer_tokens, jitter=jitter)
+
+    clients._new_pinecone = lambda api_key: FakePinecone(latency=pinecone_latency, jitter=jitter)
+    clients._new_openai = new_openai
+    # Clients built before this point would bypass the fakes
+    clients.reset_clients()
@@ -0,0 +1,309 @@
+# run_suite.py - End-to-end offline benchmark suite against fake Pinecone and OpenAI backends
+#
+#   python -m benchmarks.run_suite --files 6 --words 4000 --concurrency 1,4,16 --output bench.json
+#
+# Every stage runs in-process with real document processing, embedding and
+# security filtering; only the network services are replaced by benchmarks.fakes.
+# Compare the JSON of two commits to spot regressions.
+import argparse
+import io
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.corpus import generate_mixed_corpus, generate_queries
+from benchmarks.fakes import FakePinecone, install_fakes
+
+
+def latency_summary(seconds: List[float]) -> Dict:
+    """p50/p90/p99 and mean in milliseconds"""
+    ms = np.asarray(seconds) * 1000
+    return {
+        'count': len(ms),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+    }
+
+
+def bench_processing(paths: List[str], repeat: int):
+    """Load and chunk throughput of CompanyDocumentProcessor, best of `repeat` runs"""
+    from document_processor import CompanyDocumentProcessor
+
+    best = None
+    for _ in range(repeat):
+        processor = CompanyDocumentProcessor()
+        start = time.perf_counter()
+        documents = processor.load_documents(paths)
+        loaded = time.perf_counter()
+        chunks = processor.chunk_documents(documents)
+        end = time.perf_counter()
+        if best is None or end - start < best[0]:
+            best = (end - start, loaded - start, end - loaded, documents, chunks, processor)
+
+    total, load, chunk, documents, chunks, processor = best
+    chars = sum(len(doc.page_content) for doc in documents)
+    result = {
+        'files': len(paths),
+        'documents': len(documents),
+        'chunks': len(chunks),
+        'megabytes_on_disk': round(sum(os.path.getsize(path) for path in paths) / 1e6, 3),
+        'load_seconds': round(load, 4),
+        'chunk_seconds': round(chunk, 4),
+        'chars_per_second': round(chars / total),
+        'chunks_per_second': round(len(chunks) / chunk) if chunk else None,
+    }
+    return result, chunks, processor.lexical_index
+
+
+def bench_ingestion(chunks, batch_size: int):
+    """Embed and upsert rate of PineconeVectorStore.add_documents"""
+    from pinecone_vector import PineconeVectorStore
+
+    store = PineconeVectorStore(index_name='benchmark', namespace='ingestion')
+    start = time.perf_counter()
+    store.add_documents(chunks, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    return {
+        'chunks': len(chunks),
+        'batch_size': batch_size,
+        'seconds': round(elapsed, 4),
+        'chunks_per_second': round(len(chunks) / elapsed, 1),
+    }, store
+
+
+def bench_search(store, lexical_index, queries: List[str], k: int):
+    """Latency of dense-only and hybrid (dense + BM25) search over the ingested chunks"""
+    store.search(queries[0], k=k)  # Load the query encoder before timing
+
+    results = {}
+    for mode, index in (('dense', None), ('hybrid', lexical_index)):
+        store.lexical_index = index
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search(query, k=k)
+            timings.append(time.perf_counter() - start)
+        results[mode] = latency_summary(timings)
+    return results
+
+
+def bench_security_filter(iterations: int):
+    """Query screening throughput of SecurityFilter.analyze"""
+    from benchmarks.bench_security_filter import QUERIES
+    from security_filter import SecurityFilter
+
+    security_filter = SecurityFilter()
+    start = time.perf_counter()
+    for i in range(iterations):
+        security_filter.analyze(QUERIES[i % len(QUERIES)])
+    elapsed = time.perf_counter() - start
+    return {
+        'iterations': iterations,
+        'us_per_query': round(elapsed / iterations * 1e6, 2),
+        'queries_per_second': round(iterations / elapsed),
+    }
+
+
+def prepare_chat_session(paths: List[str], queries: List[str], upload_dir: str):
+    """Upload files through /api/upload, wait until they are indexed and return the app and session ID"""
+    from app import app
+
+    app.config['UPLOAD_FOLDER'] = upload_dir
+    client = app.test_client()
+
+    files = paths[:app.config['MAX_FILES']]
+    data = {'documents': [(io.BytesIO(open(path, 'rb').read()), os.path.basename(path)) for path in files]}
+    response = client.post('/api/upload', data=data, content_type='multipart/form-data')
+    if response.status_code != 200:
+        raise RuntimeError(f"Upload failed: {response.get_json()}")
+
+    deadline = time.monotonic() + 600
+    while client.get('/api/status').get_json()['status'] == 'processing':
+        if time.monotonic() > deadline:
+            raise RuntimeError("Upload did not finish processing")
+        time.sleep(0.1)
+    with client.session_transaction() as session:
+        sid = session['sid']
+
+    # First request builds this process's chatbot; keep it out of the numbers
+    client.post('/api/chat', json={'message': queries[0]})
+    return app, sid, len(files)
+
+
+def session_client(app, sid: str):
+    """A test client bound to an existing session"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['sid'] = sid
+    return client
+
+
+def bench_chat(app, sid: str, queries: List[str], concurrency_levels: List[int], requests_per_level: int):
+    """/api/chat latency and throughput with concurrent clients sharing one indexed session"""
+    results = []
+    query_number = [0]
+    lock = threading.Lock()
+    for concurrency in concurrency_levels:
+        timings, errors = [], [0]
+
+        def worker(count: int):
+            worker_client = session_client(app, sid)
+            for _ in range(count):
+                with lock:
+                    query_number[0] += 1
+                    # Unique questions so the answer cache does not short-circuit the pipeline
+                    message = f"{queries[query_number[0] % len(queries)]} (#{query_number[0]})"
+                start = time.perf_counter()
+                response = worker_client.post('/api/chat', json={'message': message})
+                elapsed = time.perf_counter() - start
+                with lock:
+                    timings.append(elapsed)
+                    if response.status_code != 200:
+                        errors[0] += 1
+
+        per_worker = max(1, requests_per_level // concurrency)
+        threads = [threading.Thread(target=worker, args=(per_worker,)) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        results.append({
+            'concurrency': concurrency,
+            'errors': errors[0],
+            'requests_per_second': round(len(timings) / wall, 2),
+            **latency_summary(timings),
+        })
+    return results
+
+
+def bench_chat_batch(app, sid: str, queries: List[str], batch_sizes: List[int], questions_per_size: int):
+    """/api/chat/batch throughput per batch size, sending questions_per_size questions in total each time"""
+    client = session_client(app, sid)
+    results = []
+    for batch_size in batch_sizes:
+        timings, errors = [], 0
+        start = time.perf_counter()
+        for offset in range(0, questions_per_size, batch_size):
+            # Unique questions so the answer cache does not short-circuit the pipeline
+            messages = [f"{queries[(offset + i) % len(queries)]} (batch {batch_size} #{offset + i})"
+                        for i in range(min(batch_size, questions_per_size - offset))]
+            request_start = time.perf_counter()
+            response = client.post('/api/chat/batch', json={'messages': messages})
+            timings.append(time.perf_counter() - request_start)
+            if response.status_code != 200:
+                errors += len(messages)
+            else:
+                errors += sum(not result['success'] for result in response.get_json()['results'])
+        wall = time.perf_counter() - start
+        results.append({
+            'batch_size': batch_size,
+            'questions': questions_per_size,
+            'errors': errors,
+            'questions_per_second': round(questions_per_size / wall, 2),
+            'batch_latency': latency_summary(timings),
+        })
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with fake Pinecone and OpenAI")
+    parser.add_argument('--files', type=int, default=6)
+    parser.add_argument('--words', type=int, default=4000, help="Words per generated document")
+    parser.add_argument('--kinds', default='txt,pdf,docx')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--security-iterations', type=int, default=20000)
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--chat-requests', type=int, default=64, help="Requests per concurrency level")
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--batch-questions', type=int, default=64, help="Questions sent per batch size")
+    parser.add_argument('--pinecone-latency', type=float, default=0.02, help="Seconds per Pinecone call")
+    parser.add_argument('--llm-latency', type=float, default=0.3, help="Seconds to the first LLM token")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="Seconds per streamed LLM token")
+    parser.add_argument('--embedding-cache', action='store_true', help="Keep the on-disk embedding cache enabled")
+    parser.add_argument('--skip', default='', help="Comma-separated stages to skip")
+    parser.add_argument('--output', help="Also write the JSON here")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    skip = {stage for stage in args.skip.split(',') if stage}
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Keep sessions and caches out of the working tree; must be set before the app modules load
+        os.environ['SESSION_STORE_URL'] = f"sqlite:///{os.path.join(workdir, 'sessions.db')}"
+        os.environ['EMBEDDING_CACHE_PATH'] = os.path.join(workdir, 'embeddings.db') if args.embedding_cache else ''
+        os.environ['VECTOR_BACKEND'] = 'pinecone'
+        install_fakes(pinecone_latency=args.pinecone_latency, llm_latency=args.llm_latency,
+                      token_latency=args.token_latency)
+
+        paths = generate_mixed_corpus(os.path.join(workdir, 'corpus'), args.files, args.words,
+                                      kinds=tuple(args.kinds.split(',')))
+        queries = generate_queries(args.queries, seed=args.seed)
+
+        results = {}
+        processing, chunks, lexical_index = bench_processing(paths, args.repeat)
+        results['processing'] = processing
+        if 'ingestion' not in skip or 'search' not in skip:
+            results['ingestion'], store = bench_ingestion(chunks, args.batch_size)
+            if 'search' not in skip:
+                results['search'] = bench_search(store, lexical_index, queries, args.k)
+        if 'security_filter' not in skip:
+            results['security_filter'] = bench_security_filter(args.security_iterations)
+        if 'chat' not in skip or 'chat_batch' not in skip:
+            app, sid, files = prepare_chat_session(paths, queries, os.path.join(workdir, 'uploads'))
+            if 'chat' not in skip:
+                concurrency = sorted({int(level) for level in args.concurrency.split(',')})
+                results['chat'] = {'files': files,
+                                   'levels': bench_chat(app, sid, queries, concurrency, args.chat_requests)}
+            if 'chat_batch' not in skip:
+                batch_sizes = sorted({int(size) for size in args.batch_sizes.split(',')})
+                results['chat_batch'] = {'files': files,
+                                         'sizes': bench_chat_batch(app, sid, queries, batch_sizes, args.batch_questions)}
+        FakePinecone.reset()
+
+    report = {
+        'benchmark': 'suite',
+        'commit': git_commit(),
+        'config': {
+            'files': args.files,
+            'words': args.words,
+            'kinds': args.kinds,
+            'pinecone_latency': args.pinecone_latency,
+            'llm_latency': args.llm_latency,
+            'token_latency': args.token_latency,
+            'embedding_cache': args.embedding_cache,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
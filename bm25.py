@@ -0,0 +1,158 @@
+# bm25.py - In-memory BM25 inverted index for lexical retrieval over chunks
+import re
+import hashlib
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+
+# Keep codes such as "chk-100" or "4.5" together; they are what lexical search is for
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i if in is it my of on or our
+so than that the their there this to was we what when where which who why will
+with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word and code tokens without stopwords"""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_key(doc: Document) -> str:
+    """Identify a chunk by source and content so dense and lexical hits can be matched"""
+    content_hash = doc.metadata.get('content_hash') or hashlib.md5(doc.page_content.encode()).hexdigest()
+    return f"{doc.metadata.get('source', 'unknown')}:{content_hash}"
+
+
+class _Postings:
+    """Immutable CSR postings: rows[indptr[t]:indptr[t + 1]] are the chunks containing term t"""
+
+    def __init__(self, indptr: np.ndarray, rows: np.ndarray, weights: np.ndarray, keys: List[str]):
+        self.indptr = indptr
+        self.rows = rows
+        self.weights = weights
+        self.keys = keys
+        self.num_docs = len(keys)
+
+
+class BM25Index:
+    """Okapi BM25 over chunks, stored as flat NumPy postings.
+
+    Per-posting BM25 weights are precomputed when the index is (re)built, so a
+    query is one gather over its terms' postings and one bincount; no Python
+    loop runs over documents. Only chunk keys are kept, not the chunks: hits
+    are resolved through the vector store's document store.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {}
+        self.keys: List[str] = []
+        self._key_to_row: Dict[str, int] = {}
+        # Per chunk: term IDs and their counts, or None once removed
+        self._doc_terms: List[Optional[Tuple[np.ndarray, np.ndarray]]] = []
+        self._postings: Optional[_Postings] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._key_to_row)
+
+    def add(self, doc: Document, key: Optional[str] = None):
+        """Index one chunk's terms under its key, replacing any chunk with the same key"""
+        key = key or chunk_key(doc)
+        counts = Counter(tokenize(doc.page_content))
+
+        with self._lock:
+            term_ids = np.fromiter((self.vocabulary.setdefault(term, len(self.vocabulary)) for term in counts),
+                                   dtype=np.int32, count=len(counts))
+            tfs = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+            row = self._key_to_row.get(key)
+            if row is None:
+                self._key_to_row[key] = len(self.keys)
+                self.keys.append(key)
+                self._doc_terms.append((term_ids, tfs))
+            else:
+                self._doc_terms[row] = (term_ids, tfs)
+            self._postings = None
+
+    def add_documents(self, documents: Iterable[Document]):
+        for doc in documents:
+            self.add(doc)
+
+    def remove(self, keys: Iterable[str]):
+        """Drop chunks by key; rows are compacted on the next rebuild"""
+        with self._lock:
+            for key in keys:
+                row = self._key_to_row.pop(key, None)
+                if row is not None:
+                    self._doc_terms[row] = None
+            self._postings = None
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Return the keys of the k best BM25 matches with their scores"""
+        postings = self._postings or self._build()
+        # Terms added after this snapshot was built have no postings yet
+        num_terms = len(postings.indptr) - 1
+        term_ids = [self.vocabulary[term] for term in set(tokenize(query)) if self.vocabulary.get(term, num_terms) < num_terms]
+        if not term_ids or not postings.num_docs:
+            return []
+
+        slices = [slice(postings.indptr[t], postings.indptr[t + 1]) for t in term_ids]
+        rows = np.concatenate([postings.rows[s] for s in slices])
+        weights = np.concatenate([postings.weights[s] for s in slices])
+        scores = np.bincount(rows, weights=weights, minlength=postings.num_docs)
+
+        matched = np.count_nonzero(scores)
+        k = min(k, matched)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(postings.keys[row], float(scores[row])) for row in top]
+
+    def _build(self) -> _Postings:
+        """Compact removed rows and lay postings out term by term with precomputed weights"""
+        with self._lock:
+            if self._postings is not None:
+                return self._postings
+
+            live = [row for row, terms in enumerate(self._doc_terms) if terms is not None]
+            if len(live) != len(self._doc_terms):
+                self.keys = [self.keys[row] for row in live]
+                self._doc_terms = [self._doc_terms[row] for row in live]
+                self._key_to_row = {key: row for row, key in enumerate(self.keys)}
+
+            num_docs = len(self._doc_terms)
+            if num_docs == 0:
+                self._postings = _Postings(np.zeros(len(self.vocabulary) + 1, dtype=np.int64),
+                                           np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32), [])
+                return self._postings
+
+            lengths = np.array([len(terms) for terms, _ in self._doc_terms], dtype=np.int64)
+            term_ids = np.concatenate([terms for terms, _ in self._doc_terms])
+            tfs = np.concatenate([tf for _, tf in self._doc_terms])
+            rows = np.repeat(np.arange(num_docs, dtype=np.int32), lengths)
+
+            # Document length is the token count, not the distinct term count
+            doc_lengths = np.bincount(rows, weights=tfs, minlength=num_docs)
+            avg_length = doc_lengths.mean() or 1.0
+
+            num_terms = len(self.vocabulary)
+            doc_freq = np.bincount(term_ids, minlength=num_terms)
+            idf = np.log1p((num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[rows] / avg_length)
+            weights = (idf[term_ids] * tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)
+
+            order = np.argsort(term_ids, kind='stable')
+            indptr = np.zeros(num_terms + 1, dtype=np.int64)
+            np.cumsum(doc_freq, out=indptr[1:])
+
+            self._postings = _Postings(indptr, rows[order], weights[order], list(self.keys))
+            return self._postings
@@ -0,0 +1,147 @@
+# cache.py - Small in-process caches shared by the RAG pipeline
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import numpy as np
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?.!,;:]+$')
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different phrasings share a cache key"""
+    query = _WHITESPACE.sub(' ', query.strip().lower())
+    return _TRAILING_PUNCTUATION.sub('', query)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL and hit/miss counters.
+
+    With sliding=True every hit restarts the entry's TTL, so entries expire
+    after ttl seconds without use rather than ttl seconds after being stored.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, sliding: bool = False):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sliding = sliding
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    if self.sliding:
+                        self._entries[key] = (value, time.monotonic() + self.ttl)
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries when full"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry, returning its value (expired or not) or default"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[0] if entry is not None else default
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        """Get cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ResponseCache:
+    """Caches chatbot answers per corpus version, optionally matching semantically similar queries"""
+
+    def __init__(self,
+                 max_size: int = 512,
+                 ttl: Optional[float] = 3600,
+                 similarity_threshold: Optional[float] = None):
+        self.similarity_threshold = similarity_threshold
+        self._answers = LRUCache(max_size=max_size, ttl=ttl)
+        # Query embeddings of cached answers, only kept in semantic mode
+        self._embeddings: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.semantic_hits = 0
+
+    def get(self, query: str, corpus_version: str, embedding: Optional[np.ndarray] = None) -> Optional[Dict]:
+        """Return the cached answer for a query against a corpus version"""
+        key = (corpus_version, normalize_query(query))
+        answer = self._answers.get(key)
+        if answer is not None or embedding is None or self.similarity_threshold is None:
+            return answer
+
+        with self._lock:
+            candidates = [(k, e) for k, e in self._embeddings.items() if k[0] == corpus_version]
+        if not candidates:
+            return None
+
+        scores = np.stack([e for _, e in candidates]) @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+
+        answer = self._answers.get(candidates[best][0])
+        if answer is not None:
+            self.semantic_hits += 1
+        return answer
+
+    def put(self, query: str, corpus_version: str, answer: Dict, embedding: Optional[np.ndarray] = None):
+        """Cache an answer for a query against a corpus version"""
+        key = (corpus_version, normalize_query(query))
+        self._answers.put(key, answer)
+
+        if embedding is not None and self.similarity_threshold is not None:
+            with self._lock:
+                self._embeddings[key] = embedding
+                self._embeddings.move_to_end(key)
+                while len(self._embeddings) > self._answers.max_size:
+                    self._embeddings.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached answer"""
+        self._answers.clear()
+        with self._lock:
+            self._embeddings.clear()
+
+    def stats(self) -> Dict:
+        """Get cache statistics"""
+        return {**self._answers.stats(), 'semantic_hits': self.semantic_hits}
@@ -1,22 +1,77 @@
 import os
+import asyncio
 import logging
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
 import hashlib
-from openai import OpenAI
+from cache import ResponseCache
+from clients import get_async_openai, get_openai, openai_upstream
+from context_builder import ContextBuilder, format_chunk, format_turn
+from encoders import encode_queries, encode_query
+from metrics import METRICS_ENABLED, collect_timings, record_cache, record_request, record_tokens, span
+from reranker import RERANK_CANDIDATES, RERANK_ENABLED, RERANK_TOP_N, CrossEncoderReranker, get_reranker
+from vector_store import create_vector_store
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
+# Answer cache settings; set RESPONSE_CACHE_SIMILARITY (e.g. 0.95) to also match similar questions
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+RESPONSE_CACHE_SIMILARITY = os.environ.get('RESPONSE_CACHE_SIMILARITY')
+
+SYSTEM_PROMPT = "You are a helpful company assistant. Only answer based on the provided context. If the information is not in the context, say so clearly."
+NO_RESULTS_MESSAGE = "I couldn't find relevant information in the uploaded documents. Please make sure you've uploaded the appropriate company documents."
+ERROR_MESSAGE = "I'm experiencing technical difficulties. Please try again later."
+
+# Batch questions answered at once per process; bounds concurrent retrievals and LLM calls
+CHAT_BATCH_CONCURRENCY = int(os.environ.get('CHAT_BATCH_CONCURRENCY', 8))
+_batch_pool = ThreadPoolExecutor(max_workers=CHAT_BATCH_CONCURRENCY, thread_name_prefix='chat-batch')
+
+# Conversation turns remembered per session
+MAX_HISTORY_TURNS = 10
+
+class ConversationHistory:
+    """Recent conversation turns held by the chatbot itself (one process)"""
+    
+    def __init__(self, max_turns: int = MAX_HISTORY_TURNS):
+        self.max_turns = max_turns
+        self.turns: List[Dict] = []
+    
+    def recent(self) -> List[Dict]:
+        return list(self.turns)
+    
+    def add(self, turn: Dict):
+        self.turns = (self.turns + [turn])[-self.max_turns:]
+
 class RAGChatbot:
     """Main RAG chatbot for company queries"""
     
     def __init__(self, 
-                 vector_store,
-                 model: str = "gpt-3.5-turbo"):
+                 vector_store=None,
+                 model: str = "gpt-3.5-turbo",
+                 response_cache: Optional[ResponseCache] = None,
+                 reranker: Optional[CrossEncoderReranker] = None,
+                 rerank_candidates: int = RERANK_CANDIDATES,
+                 rerank_top_n: int = RERANK_TOP_N,
+                 context_builder: Optional[ContextBuilder] = None,
+                 history=None):
         
-        self.vector_store = vector_store
+        # Fall back to the configured vector store backend
+        self.vector_store = vector_store if vector_store is not None else create_vector_store()
         self.model = model
         
+        # Optional rerank stage: retrieve rerank_candidates chunks, keep the best rerank_top_n
+        self.reranker = reranker if reranker is not None else (get_reranker() if RERANK_ENABLED else None)
+        self.rerank_candidates = rerank_candidates
+        self.rerank_top_n = rerank_top_n
+        
+        # Fits chunks and history into the prompt's token budget
+        self.context_builder = context_builder if context_builder is not None else ContextBuilder(model=model)
+        
         # Initialize OpenAI client
         if not os.environ.get('OPENAI_API_KEY'):
             raise ValueError("OpenAI API key not provided")
@@ -24,98 +79,439 @@ class RAGChatbot:
         os.environ.pop("HTTP_PROXY", None)
         os.environ.pop("HTTPS_PROXY", None)
 
-        self.client = OpenAI()
+        # Shared per process, so every chatbot reuses the same keep-alive connections
+        self.client = get_openai()
         
-        # Conversation history for this session
-        self.conversation_history = []
+        # Conversation history for this session; anything with recent() and add(turn),
+        # e.g. session_store.SessionHistory to share it between workers
+        self.history = history if history is not None else ConversationHistory()
+        
+        # Answers keyed by normalized query and corpus version
+        self.response_cache = response_cache if response_cache is not None else ResponseCache(
+            max_size=RESPONSE_CACHE_SIZE,
+            ttl=RESPONSE_CACHE_TTL,
+            similarity_threshold=float(RESPONSE_CACHE_SIMILARITY) if RESPONSE_CACHE_SIMILARITY else None,
+        )
+        self._cached_corpus_version = None
         
     def get_response(self, query: str, k: int = 5) -> Dict[str, any]:
         """Generate response using RAG pipeline"""
+        return self._respond(query, k, remember=True)
+    
+    def get_responses(self, queries: List[str], k: int = 5) -> List[Dict[str, any]]:
+        """Answer independent questions together, in order.
+        
+        All queries are embedded in one encoder pass, then each is answered on
+        the shared batch pool, which bounds how many retrievals and LLM calls
+        run at once. Batch questions neither see nor extend the conversation
+        history. A failed item gets an error response; the rest are unaffected.
+        """
+        try:
+            with span('chat_batch', 'query_encoding'):
+                encode_queries(queries, self.vector_store.embedding_model)
+        except Exception as e:
+            # Each search falls back to encoding its own query
+            logger.warning(f"Batch query encoding failed: {str(e)}")
+        
+        futures = [_batch_pool.submit(self._respond, query, k, False) for query in queries]
+        responses = []
+        for query, future in zip(queries, futures):
+            try:
+                responses.append(future.result())
+            except Exception as e:
+                query_id = self._new_query_id(query)
+                logger.error(f"Error answering batch query [{query_id}]: {str(e)}")
+                responses.append({**self._fallback_response(ERROR_MESSAGE, query_id), "error": ERROR_MESSAGE})
+        return responses
+    
+    def _respond(self, query: str, k: int, remember: bool) -> Dict[str, any]:
+        """Answer one query, collecting its stage timings"""
         
         # Generate query ID for tracking
-        query_id = hashlib.md5(f"{query}{datetime.now()}".encode()).hexdigest()[:8]
+        query_id = self._new_query_id(query)
         logger.info(f"Query [{query_id}]: {query[:50]}...")
         
-        try:
-            # Retrieve relevant chunks
-            search_results = self.vector_store.search(query, k=k)
-            
-            if not search_results:
-                return {
-                    "response": "I couldn't find relevant information in the uploaded documents. Please make sure you've uploaded the appropriate company documents.",
-                    "sources": [],
-                    "query_id": query_id,
-                    "confidence": 0.0
-                }
-            
-            # Extract chunks and sources
-            context_chunks = [result[0] for result in search_results]
-            sources = list(set([chunk.metadata.get('source', 'Unknown') for chunk in context_chunks]))
-            confidence = search_results[0][1] if search_results else 0.0
-            
-            # Build prompt
-            prompt = self._build_prompt(query, context_chunks)
-            
-            # Generate response
-            response = self.client.chat.completions.create(
+        with collect_timings() as timings:
+            try:
+                response = self._answer(query, k, query_id, remember)
+            except Exception as e:
+                logger.error(f"Error generating response [{query_id}]: {str(e)}")
+                record_request('chat', 'error')
+                response = {**self._fallback_response(ERROR_MESSAGE, query_id), "error": ERROR_MESSAGE}
+            return {**response, "debug": {"timings": timings}}
+    
+    async def aget_response(self, query: str, k: int = 5) -> Dict[str, any]:
+        """Generate a response without blocking the event loop.
+        
+        CPU and blocking I/O (screening, encoding, retrieval, prompt
+        building) run on the loop's default executor; only the LLM call is
+        awaited on the loop itself through the async OpenAI client.
+        """
+        return await self._arespond(query, k, remember=True)
+    
+    async def _arespond(self, query: str, k: int, remember: bool) -> Dict[str, any]:
+        """Async counterpart of _respond"""
+        
+        query_id = self._new_query_id(query)
+        logger.info(f"Query [{query_id}]: {query[:50]}...")
+        
+        with collect_timings() as timings:
+            try:
+                # to_thread copies this context, so spans in the worker thread land in timings
+                response, pending = await asyncio.to_thread(self._prepare, query, k, query_id, remember)
+                if response is None:
+                    with span('chat', 'generation'):
+                        completion = await openai_upstream.acall(
+                            self.async_client.chat.completions.create,
+                            model=self.model,
+                            messages=self._build_messages(pending["prompt"]),
+                            temperature=0.3,
+                            max_tokens=500
+                        )
+                    # Remembering the turn writes to the session store
+                    response = await asyncio.to_thread(self._finish, query, query_id, pending, completion, remember)
+            except Exception as e:
+                logger.error(f"Error generating response [{query_id}]: {str(e)}")
+                record_request('chat', 'error')
+                response = {**self._fallback_response(ERROR_MESSAGE, query_id), "error": ERROR_MESSAGE}
+            return {**response, "debug": {"timings": timings}}
+    
+    @property
+    def async_client(self) -> 'AsyncOpenAI':
+        """The shared async OpenAI client of the running event loop"""
+        return get_async_openai()
+    
+    def _answer(self, query: str, k: int, query_id: str, remember: bool = True) -> Dict[str, any]:
+        """Run cache lookup, retrieval, prompt building and generation, timing each stage"""
+        
+        response, pending = self._prepare(query, k, query_id, remember)
+        if response is not None:
+            return response
+        
+        # Generate response
+        with span('chat', 'generation'):
+            completion = openai_upstream.call(
+                self.client.chat.completions.create,
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful company assistant. Only answer based on the provided context. If the information is not in the context, say so clearly."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_messages(pending["prompt"]),
                 temperature=0.3,
                 max_tokens=500
             )
+        
+        return self._finish(query, query_id, pending, completion, remember)
+    
+    def _prepare(self, query: str, k: int, query_id: str, remember: bool) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Everything before the LLM call.
+        
+        Returns (response, None) when the query is answered without the LLM
+        (cached or nothing retrieved), otherwise (None, pending) where pending
+        holds the prompt and what _finish needs afterwards.
+        """
+        
+        # Serve repeated questions against the same documents from cache. Answers that depend on
+        # earlier turns (history goes into the prompt) are neither served from nor added to it
+        history = self.conversation_history if remember else []
+        cached = None
+        with span('chat', 'cache_lookup'):
+            corpus_version = self._current_corpus_version()
+            query_embedding = None
+            if not history:
+                query_embedding = self._cache_embedding(query)
+                cached = self.response_cache.get(query, corpus_version, query_embedding)
+                record_cache('response', hits=cached is not None, misses=cached is None)
+        if cached is not None:
+            logger.info(f"Response [{query_id}]: Served from cache")
+            if remember:
+                self._remember(query, cached["response"])
+            record_request('chat', 'cached')
+            return {**cached, "query_id": query_id, "cached": True}, None
+        
+        # Retrieve relevant chunks
+        search_results = self._retrieve(query, k)
+        
+        if not search_results:
+            record_request('chat', 'no_results')
+            return self._fallback_response(NO_RESULTS_MESSAGE, query_id), None
+        
+        # Extract chunks and sources
+        context_chunks, sources, confidence = self._unpack_results(search_results)
+        
+        # Build prompt
+        with span('chat', 'prompt'):
+            prompt = self._build_prompt(query, context_chunks, history)
+        
+        return None, {
+            "prompt": prompt,
+            "sources": sources,
+            "confidence": confidence,
+            "corpus_version": corpus_version,
+            "query_embedding": query_embedding,
+            "cacheable": not history,
+        }
+    
+    def _finish(self, query: str, query_id: str, pending: Dict, completion, remember: bool) -> Dict[str, any]:
+        """Record, remember and cache a generated answer"""
+        
+        answer = completion.choices[0].message.content
+        self._record_usage(completion, pending["prompt"], answer)
+        return self._keep_answer(query, query_id, pending, answer, remember)
+    
+    def _keep_answer(self, query: str, query_id: str, pending: Dict, answer: str, remember: bool) -> Dict[str, any]:
+        """Remember and cache an answer, returning the response for it"""
+        
+        # Add to conversation history
+        if remember:
+            self._remember(query, answer)
+        
+        logger.info(f"Response [{query_id}]: Generated successfully")
+        record_request('chat', 'answered')
+        
+        result = {
+            "response": answer,
+            "sources": pending["sources"],
+            "query_id": query_id,
+            "confidence": float(pending["confidence"])
+        }
+        if pending["cacheable"]:
+            self.response_cache.put(query, pending["corpus_version"], result, pending["query_embedding"])
+        
+        return result
+    
+    def stream_response(self, query: str, k: int = 5) -> Iterator[Dict[str, any]]:
+        """Generate a response as a stream of token events followed by a final done event"""
+        
+        query_id = self._new_query_id(query)
+        logger.info(f"Streaming query [{query_id}]: {query[:50]}...")
+        
+        # Spans only collect into this dict between yields; a generator must not hold the context open
+        timings = {}
+        try:
+            # As in _prepare, answers that depend on earlier turns bypass the cache
+            history = self.conversation_history
+            cached = None
+            with collect_timings(timings), span('chat', 'cache_lookup'):
+                corpus_version = self._current_corpus_version()
+                query_embedding = None
+                if not history:
+                    query_embedding = self._cache_embedding(query)
+                    cached = self.response_cache.get(query, corpus_version, query_embedding)
+                    record_cache('response', hits=cached is not None, misses=cached is None)
+            if cached is not None:
+                logger.info(f"Response [{query_id}]: Served from cache")
+                self._remember(query, cached["response"])
+                record_request('chat', 'cached')
+                yield {"type": "token", "content": cached["response"]}
+                yield {"type": "done", **cached, "query_id": query_id, "cached": True, "debug": {"timings": timings}}
+                return
+            
+            with collect_timings(timings):
+                search_results = self._retrieve(query, k)
             
-            answer = response.choices[0].message.content
+            if not search_results:
+                record_request('chat', 'no_results')
+                yield {"type": "token", "content": NO_RESULTS_MESSAGE}
+                yield {"type": "done", **self._fallback_response(NO_RESULTS_MESSAGE, query_id),
+                       "debug": {"timings": timings}}
+                return
             
-            # Add to conversation history
-            self.conversation_history.append({
-                "timestamp": datetime.now().isoformat(),
-                "query": query,
-                "response": answer
-            })
+            context_chunks, sources, confidence = self._unpack_results(search_results)
+            with collect_timings(timings), span('chat', 'prompt'):
+                prompt = self._build_prompt(query, context_chunks, history)
             
-            # Keep only last 10 interactions
-            if len(self.conversation_history) > 10:
-                self.conversation_history = self.conversation_history[-10:]
+            parts = []
+            with span('chat', 'generation', timings):
+                # Only opening the stream is retried; tokens already sent cannot be taken back
+                stream = openai_upstream.call(
+                    self.client.chat.completions.create,
+                    model=self.model,
+                    messages=self._build_messages(prompt),
+                    temperature=0.3,
+                    max_tokens=500,
+                    stream=True
+                )
+                
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if token:
+                        parts.append(token)
+                        yield {"type": "token", "content": token}
             
-            logger.info(f"Response [{query_id}]: Generated successfully")
+            answer = "".join(parts)
+            self._record_usage(None, prompt, answer)
+            self._remember(query, answer)
             
-            return {
+            logger.info(f"Response [{query_id}]: Streamed successfully")
+            record_request('chat', 'answered')
+            
+            result = {
                 "response": answer,
                 "sources": sources,
                 "query_id": query_id,
                 "confidence": float(confidence)
             }
+            if not history:
+                self.response_cache.put(query, corpus_version, result, query_embedding)
+            
+            yield {"type": "done", **result, "debug": {"timings": timings}}
             
         except Exception as e:
-            logger.error(f"Error generating response [{query_id}]: {str(e)}")
-            return {
-                "response": "I'm experiencing technical difficulties. Please try again later.",
-                "sources": [],
-                "query_id": query_id,
-                "confidence": 0.0
-            }
+            logger.error(f"Error streaming response [{query_id}]: {str(e)}")
+            record_request('chat', 'error')
+            yield {"type": "error", "content": ERROR_MESSAGE}
+            yield {"type": "done", **self._fallback_response(ERROR_MESSAGE, query_id), "debug": {"timings": timings}}
     
-    def _build_prompt(self, query: str, context_chunks: List) -> str:
+    async def astream_response(self, query: str, k: int = 5) -> AsyncIterator[Dict[str, any]]:
+        """Async counterpart of stream_response: tokens are awaited on the event loop.
+        
+        Screening, retrieval and prompt building run on the loop's default
+        executor, as in aget_response; the completion is streamed through the
+        async OpenAI client so no thread is held while tokens arrive.
+        """
+        
+        query_id = self._new_query_id(query)
+        logger.info(f"Streaming query [{query_id}]: {query[:50]}...")
+        
+        # As in stream_response, spans collect into this dict only between yields
+        timings = {}
+        try:
+            with collect_timings(timings):
+                response, pending = await asyncio.to_thread(self._prepare, query, k, query_id, True)
+            if response is not None:
+                yield {"type": "token", "content": response["response"]}
+                yield {"type": "done", **response, "debug": {"timings": timings}}
+                return
+            
+            parts = []
+            with span('chat', 'generation', timings):
+                # Only opening the stream is retried; tokens already sent cannot be taken back
+                stream = await openai_upstream.acall(
+                    self.async_client.chat.completions.create,
+                    model=self.model,
+                    messages=self._build_messages(pending["prompt"]),
+                    temperature=0.3,
+                    max_tokens=500,
+                    stream=True
+                )
+                
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if token:
+                        parts.append(token)
+                        yield {"type": "token", "content": token}
+            
+            answer = "".join(parts)
+            self._record_usage(None, pending["prompt"], answer)
+            # Remembering the turn writes to the session store
+            result = await asyncio.to_thread(self._keep_answer, query, query_id, pending, answer, True)
+            
+            yield {"type": "done", **result, "debug": {"timings": timings}}
+            
+        except Exception as e:
+            logger.error(f"Error streaming response [{query_id}]: {str(e)}")
+            record_request('chat', 'error')
+            yield {"type": "error", "content": ERROR_MESSAGE}
+            yield {"type": "done", **self._fallback_response(ERROR_MESSAGE, query_id), "debug": {"timings": timings}}
+    
+    def _retrieve(self, query: str, k: int) -> List[Tuple]:
+        """Search the vector store, reranking a wider candidate set when a reranker is configured"""
+        if self.reranker is None:
+            with span('chat', 'retrieval'):
+                return self.vector_store.search(query, k=k)
+        
+        with span('chat', 'retrieval'):
+            candidates = self.vector_store.search(query, k=max(k, self.rerank_candidates))
+        
+        with span('chat', 'rerank'):
+            return self.reranker.rerank(query, candidates, top_n=min(k, self.rerank_top_n))
+    
+    def _record_usage(self, response, prompt: str, answer: str):
+        """Count LLM tokens, from the API's usage report when there is one"""
+        if not METRICS_ENABLED:
+            return
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            record_tokens('prompt', getattr(usage, 'prompt_tokens', 0) or 0)
+            record_tokens('completion', getattr(usage, 'completion_tokens', 0) or 0)
+        else:
+            # Streamed completions carry no usage; count with the context builder's tokenizer
+            counter = self.context_builder.counter
+            record_tokens('prompt', counter.count(SYSTEM_PROMPT) + counter.count(prompt))
+            record_tokens('completion', counter.count(answer))
+    
+    def _new_query_id(self, query: str) -> str:
+        """Generate query ID for tracking"""
+        return hashlib.md5(f"{query}{datetime.now()}".encode()).hexdigest()[:8]
+    
+    def _fallback_response(self, message: str, query_id: str) -> Dict[str, any]:
+        """Response returned when no answer could be generated"""
+        return {
+            "response": message,
+            "sources": [],
+            "query_id": query_id,
+            "confidence": 0.0
+        }
+    
+    def _unpack_results(self, search_results: List[Tuple]) -> Tuple[List, List[str], float]:
+        """Extract chunks, unique sources and best similarity from search results"""
+        context_chunks = [result[0] for result in search_results]
+        sources = list(set([chunk.metadata.get('source', 'Unknown') for chunk in context_chunks]))
+        # Hybrid results are ordered by fused rank, so the best similarity is not always first
+        confidence = max(result[1] for result in search_results) if search_results else 0.0
+        return context_chunks, sources, confidence
+    
+    def _build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        """Wrap the prompt into chat completion messages"""
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """Recent interactions, oldest first"""
+        return self.history.recent()
+    
+    def _remember(self, query: str, answer: str):
+        """Add an interaction to the conversation history (the last MAX_HISTORY_TURNS are kept)"""
+        self.history.add({
+            "timestamp": datetime.now().isoformat(),
+            "query": query,
+            "response": answer
+        })
+    
+    def _current_corpus_version(self) -> str:
+        """Return the corpus version, dropping cached answers when documents changed"""
+        corpus_version = getattr(self.vector_store, 'corpus_version', '')
+        if corpus_version != self._cached_corpus_version:
+            if self._cached_corpus_version is not None:
+                logger.info("Documents changed, clearing response cache")
+                self.response_cache.clear()
+            self._cached_corpus_version = corpus_version
+        return corpus_version
+    
+    def _cache_embedding(self, query: str):
+        """Embed the query for semantic cache lookups (reused by search via the query cache)"""
+        if self.response_cache.similarity_threshold is None:
+            return None
+        return encode_query(query, self.vector_store.embedding_model)
+    
+    def _build_prompt(self, query: str, context_chunks: List, history: List[Dict]) -> str:
         """Construct prompt with retrieved context"""
         
+        # Merge overlapping neighbours and pack chunks, then recent history, into the token budget
+        context_chunks, recent_history = self.context_builder.build(context_chunks, history)
+        
         # Include recent conversation history if available
         history_context = ""
-        if len(self.conversation_history) > 0:
-            recent_history = self.conversation_history[-3:]  # Last 3 interactions
-            history_parts = []
-            for h in recent_history:
-                history_parts.append(f"Customer: {h['query']}")
-                history_parts.append(f"Assistant: {h['response']}")
-            history_context = "Recent conversation:\n" + "\n".join(history_parts) + "\n\n"
+        if recent_history:
+            history_context = "Recent conversation:\n" + "\n".join(format_turn(h) for h in recent_history) + "\n\n"
         
         # Combine context chunks
-        context = "\n\n".join([
-            f"[Source: {chunk.metadata.get('doc_type', 'unknown')}]\n{chunk.page_content}"
-            for chunk in context_chunks
-        ])
+        context = "\n\n".join(format_chunk(chunk) for chunk in context_chunks)
         
         prompt = f"""You are a helpful company assistant. Your role is to provide accurate, compliant information based solely on the company's official documentation provided below.
 
@@ -0,0 +1,244 @@
+# chunk_store.py - Columnar storage of chunk text and metadata keyed by vector ID
+import os
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# Metadata repeated across every chunk of a document, stored once per distinct value
+CATEGORICAL_COLUMNS = ('source', 'doc_type', 'last_updated', 'checksum')
+# Per-chunk integers
+INTEGER_COLUMNS = ('chunk_index', 'total_chunks', 'start_index')
+
+_MISSING = -1
+
+
+class ChunkStore:
+    """Chunks as columns instead of one Document (and metadata dict) per chunk.
+
+    Text lives in one UTF-8 buffer addressed by offsets, repeated metadata
+    strings are dictionary-encoded, chunk_index/total_chunks and content
+    hashes are fixed-width arrays. Lookups by vector ID are O(1) and a
+    Document is only built when a chunk is read. Removed rows are compacted
+    once they outnumber live ones. A saved store can be memory-mapped.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._ids: List[Optional[str]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._text = bytearray()
+        self._offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self._codes = np.full((capacity, len(CATEGORICAL_COLUMNS)), _MISSING, dtype=np.int32)
+        self._ints = np.full((capacity, len(INTEGER_COLUMNS)), _MISSING, dtype=np.int32)
+        self._hashes = np.zeros((capacity, 16), dtype=np.uint8)
+        self._categories: Dict[str, List[str]] = {column: [] for column in CATEGORICAL_COLUMNS}
+        self._category_codes: Dict[str, Dict[str, int]] = {column: {} for column in CATEGORICAL_COLUMNS}
+        # Metadata that fits no column, e.g. chunks added outside CompanyDocumentProcessor
+        self._extras: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._id_to_row)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_row
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._id_to_row))
+
+    def __getitem__(self, doc_id: str) -> Document:
+        return self._document(self._id_to_row[doc_id])
+
+    def __setitem__(self, doc_id: str, doc: Document):
+        self.add(doc_id, doc)
+
+    def get(self, doc_id: str, default: Optional[Document] = None) -> Optional[Document]:
+        row = self._id_to_row.get(doc_id)
+        return default if row is None else self._document(row)
+
+    def add(self, doc_id: str, doc: Document):
+        """Store a chunk; re-adding an ID replaces it"""
+        if doc_id in self._id_to_row:
+            self.pop(doc_id)
+        self._materialize()
+
+        row = len(self._ids)
+        self._reserve(row + 1)
+
+        text = doc.page_content.encode('utf-8')
+        self._text.extend(text)
+        self._offsets[row + 1] = self._offsets[row] + len(text)
+
+        metadata = dict(doc.metadata)
+        for i, column in enumerate(CATEGORICAL_COLUMNS):
+            value = metadata.pop(column, None)
+            self._codes[row, i] = _MISSING if value is None else self._encode(column, str(value))
+        for i, column in enumerate(INTEGER_COLUMNS):
+            value = metadata.pop(column, None)
+            self._ints[row, i] = _MISSING if value is None else int(value)
+
+        self._hashes[row] = 0
+        content_hash = metadata.get('content_hash')
+        if isinstance(content_hash, str) and len(content_hash) == 32:
+            try:
+                self._hashes[row] = np.frombuffer(bytes.fromhex(content_hash), dtype=np.uint8)
+                metadata.pop('content_hash')
+            except ValueError:
+                pass  # Not an md5 hex digest, keep it as an extra
+        # chunk_id is derived from source and chunk_index when read back
+        if metadata.get('chunk_id') == f"{doc.metadata.get('source')}_{doc.metadata.get('chunk_index')}":
+            metadata.pop('chunk_id')
+        if metadata:
+            self._extras[row] = metadata
+
+        self._ids.append(doc_id)
+        self._id_to_row[doc_id] = row
+
+    def pop(self, doc_id: str, default: Optional[Document] = None) -> Optional[Document]:
+        """Remove a chunk, returning it"""
+        row = self._id_to_row.pop(doc_id, None)
+        if row is None:
+            return default
+        doc = self._document(row)
+        self._ids[row] = None
+        self._extras.pop(row, None)
+        if len(self._ids) - len(self._id_to_row) > max(len(self._id_to_row), 1024):
+            self._compact()
+        return doc
+
+    def clear(self):
+        self.__init__()
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns (excluding the ID index)"""
+        rows = len(self._ids)
+        return (len(self._text) + self._offsets[:rows + 1].nbytes + self._codes[:rows].nbytes +
+                self._ints[:rows].nbytes + self._hashes[:rows].nbytes +
+                sum(len(value) for values in self._categories.values() for value in values))
+
+    def save(self, path: str):
+        """Write the store to a directory of flat files that load() can memory-map"""
+        self._compact()
+        rows = len(self._ids)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'text.bin'), 'wb') as f:
+            f.write(self._text)
+        np.save(os.path.join(path, 'offsets.npy'), self._offsets[:rows + 1])
+        np.save(os.path.join(path, 'codes.npy'), self._codes[:rows])
+        np.save(os.path.join(path, 'ints.npy'), self._ints[:rows])
+        np.save(os.path.join(path, 'hashes.npy'), self._hashes[:rows])
+        tmp_path = os.path.join(path, 'chunks.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'ids': self._ids,
+                'categories': self._categories,
+                'extras': {str(row): extra for row, extra in self._extras.items()},
+            }, f)
+        os.replace(tmp_path, os.path.join(path, 'chunks.json'))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'ChunkStore':
+        """Open a saved store; with mmap the text and columns are paged in on demand"""
+        store = cls(capacity=0)
+        mode = 'r' if mmap else None
+        with open(os.path.join(path, 'chunks.json'), 'r', encoding='utf-8') as f:
+            header = json.load(f)
+
+        store._ids = header['ids']
+        store._id_to_row = {doc_id: row for row, doc_id in enumerate(store._ids)}
+        store._categories = header['categories']
+        store._category_codes = {
+            column: {value: code for code, value in enumerate(values)}
+            for column, values in store._categories.items()
+        }
+        store._extras = {int(row): extra for row, extra in header['extras'].items()}
+
+        store._offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode=mode)
+        store._codes = np.load(os.path.join(path, 'codes.npy'), mmap_mode=mode)
+        store._ints = np.load(os.path.join(path, 'ints.npy'), mmap_mode=mode)
+        if store._ints.shape[1] < len(INTEGER_COLUMNS):
+            # Saved before later integer columns existed
+            store._ints = np.pad(store._ints, ((0, 0), (0, len(INTEGER_COLUMNS) - store._ints.shape[1])),
+                                 constant_values=_MISSING)
+        store._hashes = np.load(os.path.join(path, 'hashes.npy'), mmap_mode=mode)
+        text_path = os.path.join(path, 'text.bin')
+        if mmap and os.path.getsize(text_path):
+            store._text = np.memmap(text_path, dtype=np.uint8, mode='r')
+        else:
+            with open(text_path, 'rb') as f:
+                store._text = bytearray(f.read())
+        return store
+
+    def _document(self, row: int) -> Document:
+        """Build a Document view of one row"""
+        start, end = self._offsets[row], self._offsets[row + 1]
+        metadata = {}
+        for i, column in enumerate(CATEGORICAL_COLUMNS):
+            code = self._codes[row, i]
+            if code != _MISSING:
+                metadata[column] = self._categories[column][code]
+        for i, column in enumerate(INTEGER_COLUMNS):
+            value = self._ints[row, i]
+            if value != _MISSING:
+                metadata[column] = int(value)
+        if 'source' in metadata and 'chunk_index' in metadata:
+            metadata['chunk_id'] = f"{metadata['source']}_{metadata['chunk_index']}"
+        if self._hashes[row].any():
+            metadata['content_hash'] = bytes(self._hashes[row]).hex()
+        metadata.update(self._extras.get(row, {}))
+        return Document(page_content=bytes(self._text[start:end]).decode('utf-8'), metadata=metadata)
+
+    def _encode(self, column: str, value: str) -> int:
+        codes = self._category_codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._categories[column])
+            self._categories[column].append(value)
+        return code
+
+    def _reserve(self, rows: int):
+        """Grow the fixed-width columns geometrically"""
+        capacity = len(self._codes)
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 1024)
+        self._offsets = np.resize(self._offsets, capacity + 1)
+        self._codes = np.resize(self._codes, (capacity, len(CATEGORICAL_COLUMNS)))
+        self._ints = np.resize(self._ints, (capacity, len(INTEGER_COLUMNS)))
+        self._hashes = np.resize(self._hashes, (capacity, 16))
+
+    def _materialize(self):
+        """Copy memory-mapped columns into writable memory before the first write"""
+        if isinstance(self._text, bytearray) and self._codes.flags.writeable:
+            return
+        self._text = bytearray(self._text)
+        self._offsets = np.array(self._offsets)
+        self._codes = np.array(self._codes)
+        self._ints = np.array(self._ints)
+        self._hashes = np.array(self._hashes)
+
+    def _compact(self):
+        """Drop removed rows from every column"""
+        live = [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+        if len(live) == len(self._ids):
+            return
+        self._materialize()
+
+        rows = np.asarray(live, dtype=np.int64)
+        starts, ends = self._offsets[rows], self._offsets[rows + 1]
+        lengths = ends - starts
+        text = bytearray()
+        for start, end in zip(starts, ends):
+            text.extend(self._text[start:end])
+
+        self._text = text
+        self._offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self._codes = self._codes[rows]
+        self._ints = self._ints[rows]
+        self._hashes = self._hashes[rows]
+        self._extras = {new: self._extras[old] for new, old in enumerate(live) if old in self._extras}
+        self._ids = [self._ids[row] for row in live]
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(self._ids)}
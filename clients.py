@@ -0,0 +1,369 @@
+# clients.py - Process-wide OpenAI and Pinecone clients with timeouts, retries and circuit breakers
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+from metrics import record_upstream
+
+# The SDKs are imported when the first client is built, keeping them out of app startup
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from pinecone import Pinecone
+
+logger = logging.getLogger(__name__)
+
+# Point these at local stand-in servers (an OpenAI-compatible mock, pinecone-local) for testing
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+PINECONE_HOST = os.environ.get('PINECONE_HOST') or None
+# Data-plane host of the index; skips the control-plane lookup when set
+PINECONE_INDEX_HOST = os.environ.get('PINECONE_INDEX_HOST') or None
+
+# Seconds per call (connect timeouts are capped lower), retries after the first attempt
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 30))
+OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 2))
+PINECONE_TIMEOUT = float(os.environ.get('PINECONE_TIMEOUT', 10))
+PINECONE_MAX_RETRIES = int(os.environ.get('PINECONE_MAX_RETRIES', 2))
+
+# Keep-alive connection pools per process
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 100))
+OPENAI_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_KEEPALIVE_CONNECTIONS', 20))
+PINECONE_POOL_SIZE = int(os.environ.get('PINECONE_POOL_SIZE', 16))
+
+# Consecutive failures that open a circuit, and seconds before a trial call is let through
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', 30))
+
+# Backoff before retry n is BACKOFF_BASE * 2**n seconds with full jitter, capped at BACKOFF_MAX
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 4.0
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream that is failing"""
+
+
+class CircuitBreaker:
+    """Closed while calls succeed; open (failing fast) after a run of failures.
+
+    Once reset_seconds have passed a single trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go ahead"""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpen(f"{self.name} circuit is open after {self.failures} consecutive failures")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info(f"{self.name} circuit closed")
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_running = False
+
+    def release_trial(self):
+        """End a trial call that never reached the service, letting the next call try instead"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                logger.warning(f"{self.name} circuit opened after {self.failures} consecutive failures")
+
+
+class Upstream:
+    """Retry policy, circuit breaker and call counters for one remote service"""
+
+    def __init__(self, name: str, max_retries: int, is_retryable: Callable[[Exception], bool]):
+        self.name = name
+        self.max_retries = max_retries
+        self.is_retryable = is_retryable
+        self.breaker = CircuitBreaker(name, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        self.counts = {'calls': 0, 'successes': 0, 'failures': 0, 'retries': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable, *args, retries: Optional[int] = None, **kwargs):
+        """Call fn, retrying retryable errors with jittered exponential backoff"""
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            self._before_call()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not self._after_failure(e, attempt, retries):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                continue
+            except BaseException:
+                # Cancelled or interrupted mid-call: the outcome is unknown, so free the trial slot
+                self.breaker.release_trial()
+                raise
+            self._after_success()
+            return result
+
+    async def acall(self, fn: Callable, *args, retries: Optional[int] = None, **kwargs):
+        """Async counterpart of call for coroutine functions"""
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            self._before_call()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if not self._after_failure(e, attempt, retries):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            except BaseException:
+                # Cancelled or interrupted mid-call: the outcome is unknown, so free the trial slot
+                self.breaker.release_trial()
+                raise
+            self._after_success()
+            return result
+
+    def _before_call(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            self._count('rejected')
+            raise
+        self._count('calls')
+
+    def _after_success(self):
+        self.breaker.record_success()
+        self._count('successes')
+
+    def _after_failure(self, error: Exception, attempt: int, retries: int) -> bool:
+        """Record a failed attempt; True if it should be retried"""
+        retryable = self.is_retryable(error)
+        if retryable:
+            self.breaker.record_failure()
+        elif _http_status(error) is not None:
+            # The service answered (e.g. a 400): it is up, the request was wrong
+            self.breaker.record_success()
+        else:
+            # Raised on our side (bad arguments, a bug): says nothing about the service
+            self.breaker.release_trial()
+            return False
+        if attempt < retries and retryable:
+            self._count('retries')
+            logger.warning(f"{self.name} call failed ({str(error)}), retry {attempt + 1}/{retries}")
+            return True
+        self._count('failures')
+        return False
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # A rate limit response says how long to wait
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, BACKOFF_MAX)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] += 1
+        record_upstream(self.name, outcome)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            **counts,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'times_opened': self.breaker.times_opened,
+        }
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _http_status(error: Exception) -> Optional[int]:
+    """HTTP status of an error the service answered with, if any"""
+    status = getattr(error, 'status', None)
+    if status is None:
+        status = getattr(error, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def _openai_retryable(error: Exception) -> bool:
+    """Connection errors, timeouts, rate limits and 5xx; other API errors will fail again"""
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+    return isinstance(error, (APIConnectionError, RateLimitError, InternalServerError))
+
+
+_transport_errors: Optional[Tuple[type, ...]] = None
+
+
+def _transport_error_types() -> Tuple[type, ...]:
+    """Connection and timeout errors of the HTTP stacks the Pinecone client may run on"""
+    global _transport_errors
+    if _transport_errors is None:
+        types = [ConnectionError, TimeoutError]
+        try:
+            from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+            from urllib3.exceptions import TimeoutError as Urllib3Timeout
+            types += [MaxRetryError, NewConnectionError, ProtocolError, Urllib3Timeout]
+        except ImportError:
+            pass
+        try:
+            from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+            types += [RequestsConnectionError, Timeout]
+        except ImportError:
+            pass
+        _transport_errors = tuple(types)
+    return _transport_errors
+
+
+def _pinecone_retryable(error: Exception) -> bool:
+    """Rate limits, 5xx, and connection errors or timeouts; anything else is a bug or a bad request"""
+    status = _http_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    # The SDK wraps urllib3 protocol errors in its own type, so check what was raised underneath too
+    while error is not None:
+        if isinstance(error, _transport_error_types()):
+            return True
+        error = error.__cause__
+    return False
+
+
+openai_upstream = Upstream('openai', OPENAI_MAX_RETRIES, _openai_retryable)
+pinecone_upstream = Upstream('pinecone', PINECONE_MAX_RETRIES, _pinecone_retryable)
+
+_openai: Optional['OpenAI'] = None
+_async_openai: Dict[int, 'AsyncOpenAI'] = {}
+_pinecone: Optional['Pinecone'] = None
+_lock = threading.Lock()
+
+
+def _new_openai(asynchronous: bool = False):
+    """Build an OpenAI client with its own connection pool"""
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+    limits = httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS)
+    client_class, http_client = (AsyncOpenAI, DefaultAsyncHttpxClient) if asynchronous else (OpenAI, DefaultHttpxClient)
+    # Retries happen in openai_upstream so they are counted and feed the circuit breaker
+    return client_class(
+        base_url=OPENAI_BASE_URL,
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=min(OPENAI_TIMEOUT, 5.0)),
+        max_retries=0,
+        http_client=http_client(limits=limits),
+    )
+
+
+def _new_pinecone(api_key: str):
+    from pinecone import Pinecone
+
+    kwargs = {'host': PINECONE_HOST} if PINECONE_HOST else {}
+    return Pinecone(api_key=api_key, pool_threads=PINECONE_POOL_SIZE, **kwargs)
+
+
+def get_openai() -> 'OpenAI':
+    """The process's OpenAI client; its keep-alive pool is shared by every chatbot"""
+    global _openai
+    if _openai is None:
+        with _lock:
+            if _openai is None:
+                _openai = _new_openai()
+    return _openai
+
+
+def get_async_openai() -> 'AsyncOpenAI':
+    """The AsyncOpenAI client of the running event loop (pooled connections belong to one loop)"""
+    loop_id = id(asyncio.get_running_loop())
+    client = _async_openai.get(loop_id)
+    if client is None:
+        client = _new_openai(asynchronous=True)
+        # A worker runs one loop; forget clients of loops that have since finished
+        _async_openai.clear()
+        _async_openai[loop_id] = client
+    return client
+
+
+def get_pinecone() -> 'Pinecone':
+    """The process's Pinecone client"""
+    global _pinecone
+    if _pinecone is None:
+        api_key = os.environ.get('PINECONE_API_KEY')
+        if not api_key:
+            raise ValueError("Pinecone API key not provided")
+        with _lock:
+            if _pinecone is None:
+                _pinecone = _new_pinecone(api_key)
+    return _pinecone
+
+
+def reset_clients():
+    """Drop the shared clients so the next call builds new ones (after changing settings or in benchmarks)"""
+    global _openai, _pinecone
+    with _lock:
+        _openai = None
+        _pinecone = None
+        _async_openai.clear()
+
+
+def _pool_stats(client) -> Dict:
+    """Open connections in an OpenAI client's httpx pool (best effort, httpcore internals)"""
+    pool = getattr(getattr(getattr(client, '_client', None), '_transport', None), '_pool', None)
+    connections = getattr(pool, 'connections', None)
+    if connections is None:
+        return {}
+    return {
+        'open_connections': len(connections),
+        'idle_connections': sum(1 for connection in connections if connection.is_idle()),
+    }
+
+
+def upstream_stats() -> Dict:
+    """Call counters, circuit state and connection pools of every upstream in this process"""
+    return {
+        'openai': {
+            **openai_upstream.stats(),
+            'timeout_seconds': OPENAI_TIMEOUT,
+            'pool': {
+                'max_connections': OPENAI_MAX_CONNECTIONS,
+                'max_keepalive_connections': OPENAI_KEEPALIVE_CONNECTIONS,
+                **_pool_stats(_openai),
+            },
+        },
+        'pinecone': {
+            **pinecone_upstream.stats(),
+            'timeout_seconds': PINECONE_TIMEOUT,
+            'pool': {'max_connections': PINECONE_POOL_SIZE},
+        },
+    }
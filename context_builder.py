@@ -0,0 +1,176 @@
+# context_builder.py - Token-budgeted, deduplicated prompt context assembly
+import os
+import math
+import logging
+from typing import Dict, List, Tuple
+from langchain.schema import Document
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character heuristic; budgets become approximate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Tokens shared by retrieved chunks and conversation history in each prompt
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', 1500))
+# Most recent Q/A pairs considered for the prompt, newest first, while budget remains
+HISTORY_TURNS = int(os.environ.get('CONTEXT_HISTORY_TURNS', 3))
+# Longest overlap searched for when merging adjacent chunks (the splitter overlaps by 50 characters)
+MAX_CHUNK_OVERLAP = 200
+# Without recorded offsets, a shorter shared suffix/prefix is treated as coincidence, not overlap
+MIN_CHUNK_OVERLAP = 10
+
+
+class TokenCounter:
+    """Counts tokens with the model's tiktoken encoding, or about four characters per token without it"""
+
+    def __init__(self, model: str = "gpt-3.5-turbo"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / 4)
+
+
+def format_chunk(chunk: Document) -> str:
+    """How a chunk appears in the prompt"""
+    return f"[Source: {chunk.metadata.get('doc_type', 'unknown')}]\n{chunk.page_content}"
+
+
+def format_turn(turn: Dict) -> str:
+    """How a conversation turn appears in the prompt"""
+    return f"Customer: {turn['query']}\nAssistant: {turn['response']}"
+
+
+def _word_boundary(text: str, i: int) -> bool:
+    return i <= 0 or i >= len(text) or not (text[i - 1].isalnum() and text[i].isalnum())
+
+
+def _chunk_end(chunk: Document):
+    """Offset just past a chunk in its source document, if the splitter's start offset was recorded"""
+    start = chunk.metadata.get('start_index')
+    return None if start is None else start + len(chunk.page_content)
+
+
+def _join_overlapping(first: str, second: str, first_end=None, second_start=None) -> str:
+    """Concatenate two consecutive chunks, dropping only the text the splitter repeated between them.
+
+    With source offsets the overlap is exact. Without them (chunks indexed
+    before offsets were recorded) a shared suffix/prefix only counts if it is
+    at least MIN_CHUNK_OVERLAP characters and starts and ends on word
+    boundaries; otherwise the chunks are joined with a space.
+    """
+    if first_end is not None and second_start is not None:
+        overlap = first_end - second_start
+        if overlap == 0:
+            # Contiguous in the source, e.g. the next chunk starts with a kept separator
+            return first + second
+        if overlap < 0:
+            # Separated only by the whitespace the splitter stripped
+            return f"{first} {second}"
+        if overlap <= len(second) and first.endswith(second[:overlap]):
+            return first + second[overlap:]
+
+    for size in range(min(len(first), len(second), MAX_CHUNK_OVERLAP), MIN_CHUNK_OVERLAP - 1, -1):
+        if (first.endswith(second[:size]) and _word_boundary(first, len(first) - size)
+                and _word_boundary(second, size)):
+            return first + second[size:]
+    return f"{first} {second}"
+
+
+def merge_adjacent_chunks(chunks: List[Document]) -> List[Tuple[Document, int]]:
+    """Merge retrieved chunks that are consecutive in the same source.
+
+    Takes chunks in rank order and returns (chunk, best rank) pairs in rank
+    order, where runs of adjacent chunk_index values became one chunk.
+    """
+    positions: Dict[Tuple[str, int], int] = {}
+    for rank, chunk in enumerate(chunks):
+        key = (chunk.metadata.get('source', 'unknown'), chunk.metadata.get('chunk_index'))
+        if key[1] is not None:
+            positions.setdefault(key, rank)
+
+    merged, consumed = [], set()
+    for rank, chunk in enumerate(chunks):
+        source, index = chunk.metadata.get('source', 'unknown'), chunk.metadata.get('chunk_index')
+        if rank in consumed:
+            continue
+        if index is None:
+            merged.append((chunk, rank))
+            continue
+
+        # Extend the run down and up from this chunk while neighbours were retrieved too
+        first = index
+        while (source, first - 1) in positions and positions[(source, first - 1)] not in consumed:
+            first -= 1
+        last = index
+        while (source, last + 1) in positions and positions[(source, last + 1)] not in consumed:
+            last += 1
+        if first == last:
+            consumed.add(rank)
+            merged.append((chunk, rank))
+            continue
+
+        run = [positions[(source, i)] for i in range(first, last + 1)]
+        consumed.update(run)
+        text, end = chunks[run[0]].page_content, _chunk_end(chunks[run[0]])
+        for position in run[1:]:
+            chunk = chunks[position]
+            text = _join_overlapping(text, chunk.page_content, end, chunk.metadata.get('start_index'))
+            end = _chunk_end(chunk)
+        metadata = {**chunks[run[0]].metadata, 'last_chunk_index': last}
+        merged.append((Document(page_content=text, metadata=metadata), min(run)))
+
+    merged.sort(key=lambda item: item[1])
+    return merged
+
+
+class ContextBuilder:
+    """Packs retrieved chunks by rank into a token budget, then fills what is left with recent history"""
+
+    def __init__(self,
+                 model: str = "gpt-3.5-turbo",
+                 token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 history_turns: int = HISTORY_TURNS):
+        self.counter = TokenCounter(model)
+        self.token_budget = token_budget
+        self.history_turns = history_turns
+
+    def build(self, chunks: List[Document], history: List[Dict]) -> Tuple[List[Document], List[Dict]]:
+        """Select the chunks (in rank order) and history turns (oldest first) that fit the budget"""
+        remaining = self.token_budget
+
+        merged = [chunk for chunk, _ in merge_adjacent_chunks(chunks)]
+        selected = []
+        for chunk in merged:
+            tokens = self.counter.count(format_chunk(chunk))
+            # A lower-ranked but shorter chunk may still fit after a long one is skipped
+            if tokens > remaining:
+                continue
+            selected.append(chunk)
+            remaining -= tokens
+
+        # Always keep the best chunk, even when it alone exceeds the budget
+        if not selected and merged:
+            selected.append(merged[0])
+            remaining = 0
+
+        turns = []
+        for turn in reversed(history[-self.history_turns:] if self.history_turns else []):
+            tokens = self.counter.count(format_turn(turn))
+            if tokens > remaining:
+                break
+            turns.append(turn)
+            remaining -= tokens
+        turns.reverse()
+
+        logger.debug(f"Context uses {self.token_budget - remaining}/{self.token_budget} tokens: "
+                     f"{len(selected)}/{len(chunks)} chunks, {len(turns)} history turns")
+        return selected, turns
@@ -1,90 +1,176 @@
 # document_processor.py - Updated for Flask app
 import os
 import logging
-from typing import List, Dict, Optional
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
 import hashlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-import PyPDF2
-import docx
+from bm25 import BM25Index
+from extractors import load_pdf_pages, load_text_file, load_word_file, pdf_page_count, run_extraction_task
 
 logger = logging.getLogger(__name__)
 
+# Text extraction is CPU-bound, so it fans out across processes; every gunicorn worker
+# has its own pool, so by default each gets its share of the cores
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS')
+                         or max(1, (os.cpu_count() or 1) // int(os.environ.get('WEB_CONCURRENCY', 4))))
+PDF_PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 20))
+# The server is multi-threaded by the time uploads arrive and forking it can deadlock
+# the children, so extraction workers start from a clean forkserver (or spawn) process
+EXTRACTION_START_METHOD = os.environ.get('EXTRACTION_START_METHOD', 'forkserver')
+
+# Long-lived extraction pools keyed by worker count, shared by every upload in the process
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Return the process's extraction pool for a worker count, starting it on first use"""
+    with _pool_lock:
+        pool = _pools.get(max_workers)
+        if pool is None:
+            if EXTRACTION_START_METHOD in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context(EXTRACTION_START_METHOD)
+            else:
+                context = multiprocessing.get_context('spawn')
+            pool = _pools[max_workers] = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        return pool
+
+
+def _discard_extraction_pool(pool: ProcessPoolExecutor):
+    """Forget a broken pool so the next upload starts a new one"""
+    with _pool_lock:
+        for max_workers, existing in list(_pools.items()):
+            if existing is pool:
+                del _pools[max_workers]
+    pool.shutdown(wait=False)
+
+
 class CompanyDocumentProcessor:
     """Handles document ingestion and chunking for company documents"""
     
-    def __init__(self, chunk_size: int = 400, chunk_overlap: int = 50):
+    def __init__(self, chunk_size: int = 400, chunk_overlap: int = 50, max_workers: Optional[int] = None):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers or EXTRACTION_WORKERS
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
             length_function=len
         )
+        # Lexical index over every chunk this processor produces
+        self.lexical_index = BM25Index()
     
     def load_documents(self, file_paths: List[str]) -> List[Document]:
-        """Load company documents from various file types"""
-        documents = []
+        """Load company documents from various file types, extracting them in parallel"""
+        return list(self.iter_documents(file_paths))
+    
+    def iter_documents(self, file_paths: List[str]) -> Iterator[Document]:
+        """Yield loaded documents in order while later files are still being extracted"""
         
+        # Plan extraction tasks: one per file, large PDFs split into page ranges
+        plans = []
         for file_path in file_paths:
             try:
-                # Determine file type and extract text
-                file_extension = os.path.splitext(file_path)[1].lower()
-                
-                if file_extension == '.txt':
-                    content = self._load_text_file(file_path)
-                elif file_extension == '.pdf':
-                    content = self._load_pdf_file(file_path)
-                elif file_extension in ['.doc', '.docx']:
-                    content = self._load_word_file(file_path)
-                else:
-                    logger.warning(f"Unsupported file type: {file_extension}")
+                tasks = self._plan_extraction(file_path)
+                if tasks is None:
                     continue
-                
-                # Extract metadata
-                doc_type = self._classify_document(file_path, content)
-                
-                doc = Document(
-                    page_content=content,
-                    metadata={
-                        "source": os.path.basename(file_path),
-                        "doc_type": doc_type,
-                        "last_updated": datetime.now().isoformat(),
-                        "checksum": hashlib.md5(content.encode()).hexdigest()
-                    }
-                )
-                documents.append(doc)
-                logger.info(f"Loaded document: {os.path.basename(file_path)}")
-                
+                plans.append((file_path, tasks))
             except Exception as e:
                 logger.error(f"Error loading {file_path}: {str(e)}")
-                
-        return documents
+        
+        tasks = [task for _, file_tasks in plans for task in file_tasks]
+        
+        # Plain text reads are I/O bound and not worth a process hop
+        if len(tasks) <= 1 or self.max_workers <= 1 or all(task[0] is load_text_file for task in tasks):
+            for file_path, file_tasks in plans:
+                doc = self._build_document(file_path, [run_extraction_task(task) for task in file_tasks])
+                if doc is not None:
+                    yield doc
+            return
+        
+        # Keep a bounded window of files in flight so extracted text does not pile up
+        window = deque()
+        try:
+            for file_path, file_tasks in plans:
+                # Looked up per file so a pool replaced after a crash is picked up
+                pool = get_extraction_pool(self.max_workers)
+                window.append((pool, file_path, file_tasks, [pool.submit(run_extraction_task, task) for task in file_tasks]))
+                if len(window) > self.max_workers:
+                    doc = self._collect(*window.popleft())
+                    if doc is not None:
+                        yield doc
+            while window:
+                doc = self._collect(*window.popleft())
+                if doc is not None:
+                    yield doc
+        finally:
+            # An abandoned upload (cancelled job) should not leave its tasks queued in the shared pool
+            for *_, futures in window:
+                for future in futures:
+                    future.cancel()
     
-    def _load_text_file(self, file_path: str) -> str:
-        """Load text file"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+    def _plan_extraction(self, file_path: str) -> Optional[List[Tuple]]:
+        """Split one file into extraction tasks of (function, args)"""
+        # Determine file type
+        file_extension = os.path.splitext(file_path)[1].lower()
+        
+        if file_extension == '.txt':
+            return [(load_text_file, (file_path,))]
+        elif file_extension == '.pdf':
+            page_count = pdf_page_count(file_path)
+            return [
+                (load_pdf_pages, (file_path, start, min(start + PDF_PAGES_PER_TASK, page_count)))
+                for start in range(0, page_count, PDF_PAGES_PER_TASK)
+            ]
+        elif file_extension in ['.doc', '.docx']:
+            return [(load_word_file, (file_path,))]
+        
+        logger.warning(f"Unsupported file type: {file_extension}")
+        return None
     
-    def _load_pdf_file(self, file_path: str) -> str:
-        """Load PDF file"""
-        text = ""
-        with open(file_path, 'rb') as f:
-            pdf_reader = PyPDF2.PdfReader(f)
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
-        return text
+    def _collect(self, pool, file_path: str, tasks: List[Tuple], futures: List) -> Optional[Document]:
+        """Wait for one file's extraction tasks, rerunning them inline if the pool broke"""
+        results = []
+        for task, future in zip(tasks, futures):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as e:
+                logger.warning(f"Extraction pool failed ({str(e)}), extracting {file_path} inline")
+                _discard_extraction_pool(pool)
+                results.append(run_extraction_task(task))
+        return self._build_document(file_path, results)
     
-    def _load_word_file(self, file_path: str) -> str:
-        """Load Word document"""
-        doc = docx.Document(file_path)
-        text = []
-        for paragraph in doc.paragraphs:
-            text.append(paragraph.text)
-        return '\n'.join(text)
+    def _build_document(self, file_path: str, results: List[Tuple[bool, str]]) -> Optional[Document]:
+        """Join extracted parts into a Document; a failed file is skipped, not fatal"""
+        errors = [value for ok, value in results if not ok]
+        if errors:
+            logger.error(f"Error loading {file_path}: {errors[0]}")
+            return None
+        
+        content = "".join(value for _, value in results)
+        
+        # Extract metadata
+        doc_type = self._classify_document(file_path, content)
+        
+        doc = Document(
+            page_content=content,
+            metadata={
+                "source": os.path.basename(file_path),
+                "doc_type": doc_type,
+                "last_updated": datetime.now().isoformat(),
+                "checksum": hashlib.md5(content.encode()).hexdigest()
+            }
+        )
+        logger.info(f"Loaded document: {os.path.basename(file_path)}")
+        return doc
     
     def _classify_document(self, file_path: str, content: str) -> str:
         """Classify document type based on content and filename"""
@@ -114,23 +200,41 @@ class CompanyDocumentProcessor:
         return "general"
     
     def chunk_documents(self, documents: List[Document]) -> List[Document]:
-        """Split documents into chunks with metadata preservation"""
-        all_chunks = []
-        
+        """Split documents into chunks with metadata preservation, indexing them for BM25 search"""
+        all_chunks = list(self.iter_chunks(documents))
+        logger.info(f"Created {len(all_chunks)} chunks from {len(documents)} documents")
+        return all_chunks
+    
+    def _chunk_starts(self, text: str, chunks: List[str]) -> List[Optional[int]]:
+        """Character offset of each chunk in the text, located like the splitter's add_start_index"""
+        starts, search_from = [], 0
+        for chunk in chunks:
+            start = text.find(chunk, search_from)
+            if start < 0:
+                starts.append(None)
+                continue
+            starts.append(start)
+            # The next chunk repeats at most chunk_overlap characters of this one
+            search_from = max(search_from, start + len(chunk) - self.chunk_overlap)
+        return starts
+    
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Yield chunks one document at a time so only the current document is held in memory"""
         for doc in documents:
             chunks = self.text_splitter.split_text(doc.page_content)
+            starts = self._chunk_starts(doc.page_content, chunks)
             
-            for i, chunk in enumerate(chunks):
-                chunk_doc = Document(
-                    page_content=chunk,
-                    metadata={
-                        **doc.metadata,
-                        "chunk_id": f"{doc.metadata['source']}_{i}",
-                        "chunk_index": i,
-                        "total_chunks": len(chunks)
-                    }
-                )
-                all_chunks.append(chunk_doc)
-                
-        logger.info(f"Created {len(all_chunks)} chunks from {len(documents)} documents")
-        return all_chunks
\ No newline at end of file
+            for i, (chunk, start) in enumerate(zip(chunks, starts)):
+                metadata = {
+                    **doc.metadata,
+                    "chunk_id": f"{doc.metadata['source']}_{i}",
+                    "chunk_index": i,
+                    "total_chunks": len(chunks),
+                    "content_hash": hashlib.md5(chunk.encode()).hexdigest()
+                }
+                # Lets prompt assembly cut exactly the overlap when merging neighbouring chunks
+                if start is not None:
+                    metadata["start_index"] = start
+                chunk_doc = Document(page_content=chunk, metadata=metadata)
+                self.lexical_index.add(chunk_doc)
+                yield chunk_doc
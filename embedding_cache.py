@@ -0,0 +1,183 @@
+# embedding_cache.py - Persistent chunk embedding cache shared by every worker on a host
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding cached embeddings; empty disables the cache
+EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH', 'embedding_cache.db')
+# Least recently used embeddings are evicted once the cache grows past this size
+EMBEDDING_CACHE_MAX_MB = float(os.environ.get('EMBEDDING_CACHE_MAX_MB') or 512)
+
+# Rows written between size checks, and the fraction of the limit eviction brings the cache back to
+EVICTION_CHECK_INTERVAL = 1000
+EVICTION_TARGET = 0.9
+# Bound on parameters per statement (older SQLite builds allow 999)
+_QUERY_BATCH = 500
+
+
+class EmbeddingCache:
+    """Normalized float32 embeddings keyed by (model name, chunk content hash).
+
+    Lives in one SQLite file in WAL mode so gunicorn workers on a host share
+    it: readers never block, writers queue on SQLite's lock. Cache errors are
+    logged and treated as misses; ingestion never fails because of the cache.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._writes_since_check = EVICTION_CHECK_INTERVAL
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, content_hash)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers and a writer from other processes overlap"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, content_hashes: List[str], dimension: int) -> Dict[str, np.ndarray]:
+        """Return the cached embeddings among content_hashes, marking them recently used"""
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(content_hashes))
+        try:
+            conn = self._connect()
+            for start in range(0, len(unique), _QUERY_BATCH):
+                batch = unique[start:start + _QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                    (model, *batch)
+                ).fetchall()
+                for content_hash, vector in rows:
+                    # A model reloaded with a different output size must not serve stale rows
+                    if len(vector) == dimension * 4:
+                        found[content_hash] = np.frombuffer(vector, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND content_hash = ?",
+                    [(now, model, content_hash) for content_hash in found]
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed, encoding every chunk: {str(e)}")
+
+        hits = sum(1 for content_hash in content_hashes if content_hash in found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(content_hashes) - hits
+        record_cache('embedding', hits=hits, misses=len(content_hashes) - hits)
+        return found
+
+    def put_many(self, model: str, content_hashes: List[str], embeddings: np.ndarray):
+        """Store freshly encoded embeddings, evicting old ones when the cache is over its limit"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, content_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                    [(model, content_hash, embedding.tobytes(), now)
+                     for content_hash, embedding in zip(content_hashes, embeddings)]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            with self._lock:
+                self._writes_since_check += len(content_hashes)
+                check = self._writes_since_check >= EVICTION_CHECK_INTERVAL
+                if check:
+                    self._writes_since_check = 0
+            if check:
+                self._evict()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {str(e)}")
+
+    def _evict(self):
+        """Delete least recently used rows until the cache is back under EVICTION_TARGET of its limit"""
+        conn = self._connect()
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        if size <= self.max_bytes or not count:
+            return
+
+        excess = size - self.max_bytes * EVICTION_TARGET
+        rows = min(count, int(excess / (size / count)) + 1)
+        conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (rows,)
+        )
+        with self._lock:
+            self.evicted += rows
+        logger.info(f"Evicted {rows} embeddings from cache ({size / 1e6:.1f} MB > {self.max_bytes / 1e6:.1f} MB)")
+
+    def stats(self) -> Dict:
+        """Hit rate of this process and the size of the shared cache"""
+        lookups = self.hits + self.misses
+        stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evicted': self.evicted,
+            'max_bytes': self.max_bytes,
+        }
+        try:
+            count, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+            stats.update(entries=count, bytes=size)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache stats unavailable: {str(e)}")
+        return stats
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_disabled = False
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache, or None when it is disabled"""
+    global _cache, _cache_disabled
+    if not EMBEDDING_CACHE_PATH or _cache_disabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None and not _cache_disabled:
+                try:
+                    _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, int(EMBEDDING_CACHE_MAX_MB * 1e6))
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning(f"Embedding cache disabled, {EMBEDDING_CACHE_PATH} is unusable: {str(e)}")
+                    _cache_disabled = True
+    return _cache
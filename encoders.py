@@ -0,0 +1,182 @@
+# encoders.py - Process-wide sentence encoder registry with selectable inference backends
+import os
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from cache import LRUCache, normalize_query
+from metrics import record_cache
+
+# sentence_transformers pulls in torch; it is imported when the first model loads
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+
+# torch (SentenceTransformer), onnx (ONNX Runtime export) or onnx-int8 (dynamically quantized export).
+# ONNX backends need an export built with `python -m onnx_encoder`; without one they fall back to torch
+ENCODER_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+ENCODER_BACKEND = os.environ.get('ENCODER_BACKEND', 'torch').lower()
+# ONNX exports whose embeddings agree less than this (min cosine vs torch) are not used
+ENCODER_PARITY_THRESHOLD = float(os.environ.get('ENCODER_PARITY_THRESHOLD', 0.98))
+
+# Loaded encoders keyed by model name, shared by every vector store in the process.
+# ONNX encoders expose the same encode() and get_sentence_embedding_dimension().
+_encoders: Dict[str, 'SentenceTransformer'] = {}
+# Backend each loaded encoder actually runs on (a failed ONNX load falls back to torch)
+_backends: Dict[str, str] = {}
+_warmed_up = set()
+_lock = threading.Lock()
+
+# Query embeddings keyed by (model name, normalized query) so repeated questions skip the encoder
+query_embedding_cache = LRUCache(
+    max_size=int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 2048)),
+    ttl=float(os.environ.get('QUERY_EMBEDDING_CACHE_TTL', 3600)),
+)
+
+
+def get_encoder(model_name: str = DEFAULT_EMBEDDING_MODEL) -> 'SentenceTransformer':
+    """Return the shared encoder for a model, loading and warming it up on first use"""
+    encoder = _encoders.get(model_name)
+    if encoder is None or model_name not in _warmed_up:
+        with _lock:
+            encoder = _load_encoder(model_name)
+            _warm_up(model_name, encoder)
+    return encoder
+
+
+def encoder_id(model_name: str = DEFAULT_EMBEDDING_MODEL) -> str:
+    """Identify a model together with its backend, for keying cached embeddings.
+
+    Backends produce slightly different vectors, so caches must not mix them;
+    torch keeps the bare model name so existing caches stay valid.
+    """
+    get_encoder(model_name)
+    backend = _backends[model_name]
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
+
+
+def encode_query(query: str, model_name: str = DEFAULT_EMBEDDING_MODEL) -> np.ndarray:
+    """Return the normalized embedding of a query, served from cache when possible"""
+    normalized = normalize_query(query)
+    key = (encoder_id(model_name), normalized)
+    embedding = query_embedding_cache.get(key)
+    record_cache('query_embedding', hits=embedding is not None, misses=embedding is None)
+    if embedding is None:
+        embedding = get_encoder(model_name).encode(
+            [normalized],
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )[0].astype(np.float32, copy=False)
+        # Cached arrays are shared between threads, keep them immutable
+        embedding.setflags(write=False)
+        query_embedding_cache.put(key, embedding)
+    return embedding
+
+
+def encode_queries(queries: List[str], model_name: str = DEFAULT_EMBEDDING_MODEL) -> np.ndarray:
+    """Embed many queries with one forward pass over the uncached ones.
+
+    The embeddings are also cached, so the searches that follow find them
+    through encode_query without touching the encoder.
+    """
+    normalized = [normalize_query(query) for query in queries]
+    cache_id = encoder_id(model_name)
+    embeddings = [query_embedding_cache.get((cache_id, text)) for text in normalized]
+    missing = list(dict.fromkeys(text for text, embedding in zip(normalized, embeddings) if embedding is None))
+    hits = sum(embedding is not None for embedding in embeddings)
+    record_cache('query_embedding', hits=hits, misses=len(queries) - hits)
+
+    if missing:
+        encoded = get_encoder(model_name).encode(
+            missing,
+            batch_size=len(missing),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).astype(np.float32, copy=False)
+        fresh = {}
+        for text, embedding in zip(missing, encoded):
+            embedding = embedding.copy()
+            embedding.setflags(write=False)
+            query_embedding_cache.put((cache_id, text), embedding)
+            fresh[text] = embedding
+        embeddings = [fresh[text] if embedding is None else embedding for text, embedding in zip(normalized, embeddings)]
+
+    return np.stack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+
+
+def preload_encoders(model_names: Optional[Iterable[str]] = None):
+    """Load encoder weights without running inference.
+
+    Meant to run in the gunicorn master before workers fork so that the
+    weights are shared copy-on-write. Inference is deliberately skipped here:
+    torch thread pools started before a fork are not safe to reuse in children.
+    ONNX Runtime sessions start threads when created, so models that will run
+    on ONNX are left for each worker to load; the rest are loaded with torch.
+    """
+    with _lock:
+        for model_name in model_names or [DEFAULT_EMBEDDING_MODEL]:
+            if _runs_on_onnx(model_name):
+                logger.info(f"Not preloading {ENCODER_BACKEND} encoder {model_name} before fork")
+                continue
+            _load_encoder(model_name)
+
+
+def warm_up_encoders():
+    """Run a warm-up encode for every loaded encoder (call once per worker)"""
+    with _lock:
+        for model_name, encoder in _encoders.items():
+            _warm_up(model_name, encoder)
+
+
+def _load_encoder(model_name: str) -> 'SentenceTransformer':
+    """Load an encoder if it is not registered yet (caller holds the lock)"""
+    encoder = _encoders.get(model_name)
+    if encoder is None:
+        start = time.perf_counter()
+        encoder, backend = _build_encoder(model_name, ENCODER_BACKEND)
+        _encoders[model_name] = encoder
+        _backends[model_name] = backend
+        logger.info(f"Loaded embedding model {model_name} ({backend}) in {time.perf_counter() - start:.2f}s")
+    return encoder
+
+
+def _runs_on_onnx(model_name: str) -> bool:
+    """Whether loading a model will create an ONNX Runtime session rather than fall back to torch"""
+    if ENCODER_BACKEND == 'torch' or ENCODER_BACKEND not in ENCODER_BACKENDS:
+        return False
+    try:
+        from onnx_encoder import ONNX_EXPORT_ON_LOAD, has_export
+    except ImportError:
+        return False
+    return ONNX_EXPORT_ON_LOAD or has_export(model_name)
+
+
+def _build_encoder(model_name: str, backend: str) -> Tuple['SentenceTransformer', str]:
+    """Load a model on the requested backend, falling back to torch if the ONNX one is unusable"""
+    if backend not in ENCODER_BACKENDS:
+        logger.warning(f"Unknown ENCODER_BACKEND {backend}, using torch")
+    elif backend != 'torch':
+        try:
+            from onnx_encoder import load_onnx_encoder
+            return load_onnx_encoder(model_name, backend, ENCODER_PARITY_THRESHOLD), backend
+        except Exception as e:
+            logger.warning(f"{backend} encoder unavailable for {model_name}, using torch: {str(e)}")
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name), 'torch'
+
+
+def _warm_up(model_name: str, encoder: 'SentenceTransformer'):
+    """Pay first-inference costs up front (caller holds the lock)"""
+    if model_name in _warmed_up:
+        return
+    start = time.perf_counter()
+    encoder.encode(["warm up"], show_progress_bar=False)
+    _warmed_up.add(model_name)
+    logger.info(f"Warmed up embedding model {model_name} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,45 @@
+# extractors.py - Text extraction run in the extraction worker processes
+# Workers import only this module (by the functions they are sent), so it stays clear of
+# langchain and the rest of the app to keep each worker small
+import PyPDF2
+import docx
+from typing import Tuple
+
+
+def load_text_file(file_path: str) -> str:
+    """Load text file"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def load_pdf_pages(file_path: str, start: int, end: int) -> str:
+    """Load a range of PDF pages"""
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        pages = [pdf_reader.pages[page_num].extract_text() for page_num in range(start, end)]
+    return "".join(f"{page}\n" for page in pages)
+
+
+def pdf_page_count(file_path: str) -> int:
+    """Page count from the page tree root, without loading every page object"""
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        try:
+            return int(pdf_reader.trailer['/Root']['/Pages']['/Count'])
+        except (KeyError, TypeError, ValueError):
+            return len(pdf_reader.pages)
+
+
+def load_word_file(file_path: str) -> str:
+    """Load Word document"""
+    doc = docx.Document(file_path)
+    return '\n'.join(paragraph.text for paragraph in doc.paragraphs)
+
+
+def run_extraction_task(task: Tuple) -> Tuple[bool, str]:
+    """Run one extraction task, returning (ok, text or error message)"""
+    function, args = task
+    try:
+        return True, function(*args)
+    except Exception as e:
+        return False, str(e)
@@ -0,0 +1,34 @@
+# gunicorn.conf.py - Worker settings, optional encoder preload in the master, metrics cleanup
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+
+# master: load encoder weights before forking; background (default) and 0 are handled by preload.py
+PRELOAD_IN_MASTER = os.environ.get('PRELOAD_ENCODERS', 'background').lower() in ('master', '1')
+
+
+def on_starting(server):
+    """Optionally load encoder weights before workers fork so they are shared copy-on-write"""
+    # Samples left by a previous run's workers would be added to this run's
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+    # Workers are not started (and requests not served) until this returns
+    if PRELOAD_IN_MASTER:
+        from encoders import preload_encoders
+        preload_encoders()
+
+        from reranker import RERANK_ENABLED, get_cross_encoder
+        if RERANK_ENABLED:
+            get_cross_encoder()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the aggregated /metrics output"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,324 @@
+# ingestion.py - Streaming ingestion pipeline: load -> chunk -> embed -> upsert
+import os
+import logging
+import time
+import queue
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from metrics import observe, record_chunks
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# Chunks per embedding batch and batches buffered between two stages
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 64))
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 4))
+
+_DONE = object()
+
+
+def chunk_position(doc: 'Document') -> Tuple:
+    """Where a chunk sits in its source document; the only stored metadata that can change for the same text"""
+    return (doc.metadata.get('chunk_index', 0), doc.metadata.get('start_index'))
+
+
+class _Aborted(Exception):
+    """Raised inside a stage when another stage has failed"""
+
+
+class IngestionCancelled(Exception):
+    """Raised when ingestion is stopped through its cancel event"""
+
+
+class IngestionPipeline:
+    """Streams chunks into a vector store through bounded queues so memory stays flat.
+
+    Stages run in their own threads: produce (load, chunk and skip chunks that
+    are already indexed) -> embed -> write. Skipped chunks still travel to the
+    writers, unembedded, when their position in the document has moved, so
+    their stored metadata follows the new document. Each queue holds at most
+    `queue_size` batches, so a slow stage applies backpressure to the ones
+    before it and only a handful of batches are ever held in memory.
+
+    Setting `cancel_event` stops every stage at its next item; chunks already
+    written stay indexed and recorded in the manifest.
+    """
+
+    def __init__(self,
+                 vector_store,
+                 processor=None,
+                 batch_size: int = INGEST_BATCH_SIZE,
+                 queue_size: int = INGEST_QUEUE_SIZE,
+                 progress_callback: Optional[Callable[[Dict], None]] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        self.vector_store = vector_store
+        self.processor = processor
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event or threading.Event()
+
+        self.stats = {
+            'files': 0,
+            'documents': 0,
+            'chunks': 0,
+            'encoded': 0,
+            'embedded': 0,
+            'unchanged': 0,
+            'deleted': 0,
+        }
+        # Seconds each stage spent working (writer threads are summed)
+        self.timings = {'load': 0.0, 'chunk': 0.0, 'embed': 0.0, 'write': 0.0}
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def run(self, file_paths: List[str]) -> Dict:
+        """Load, chunk and sync files into the vector store"""
+        self.stats['files'] = len(file_paths)
+        documents = self._count_documents(self.processor.iter_documents(file_paths))
+        stats = self.index(self.processor.iter_chunks(documents), sync=True)
+        # The processor indexed exactly the synced chunks for BM25 while chunking them
+        self.vector_store.lexical_index = self.processor.lexical_index
+        return stats
+
+    def index(self, chunks: Iterable['Document'], sync: bool = False) -> Dict:
+        """Embed and write a stream of chunks.
+
+        With sync=True chunks already in the manifest are not re-embedded (only
+        the metadata of moved ones is rewritten) and indexed chunks missing
+        from the stream are deleted afterwards.
+        """
+        store = self.vector_store
+        writers = max(1, store.write_concurrency)
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        wanted, checksums, written = set(), set(), {}
+        new_vectors = [0]
+
+        store.refresh_manifest()
+        store.begin_writes()
+        threads = [
+            threading.Thread(target=self._guard, name='ingest-produce',
+                             args=(self._produce, chunks, embed_queue, wanted, checksums, new_vectors, sync)),
+            threading.Thread(target=self._guard, name='ingest-embed',
+                             args=(self._embed, embed_queue, write_queue, writers)),
+        ] + [
+            threading.Thread(target=self._guard, name=f'ingest-write-{i}', args=(self._write, write_queue, written))
+            for i in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            # Record what was written so a later sync neither re-embeds nor orphans it
+            if written:
+                store.manifest.add(written)
+                store.finish_writes(0)
+            self._record_metrics()
+            raise self._error
+
+        store.manifest.add(written)
+        store.finish_writes(new_vectors[0])
+
+        # Delete after writing so vector counts only grow while waiting for new vectors
+        if sync:
+            stale_ids = [doc_id for doc_id in store.manifest.chunk_ids if doc_id not in wanted]
+            if stale_ids:
+                store.delete_documents(stale_ids)
+            self.stats['deleted'] = len(stale_ids)
+
+        store.update_corpus_version(checksums, replace=sync)
+        self._report()
+        self._record_metrics()
+
+        logger.info(f"Ingested into namespace '{store.namespace}': {self.stats}")
+        return dict(self.stats)
+
+    def _count_documents(self, documents: Iterable['Document']) -> Iterator['Document']:
+        """Pass documents through, counting them for progress reporting and timing their loading"""
+        documents = iter(documents)
+        while True:
+            start = time.perf_counter()
+            doc = next(documents, _DONE)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                # Loading happens inside the producer's pull for the next chunk; keep it out of chunk time
+                self.timings['load'] += elapsed
+                self.timings['chunk'] -= elapsed
+                if doc is not _DONE:
+                    self.stats['documents'] += 1
+            if doc is _DONE:
+                return
+            yield doc
+
+    def _produce(self, chunks: Iterable['Document'], out: queue.Queue,
+                 wanted: set, checksums: set, new_vectors: List[int], sync: bool):
+        """Assign chunk IDs and group chunks into batches to embed and batches of unchanged ones"""
+        store = self.vector_store
+        batch, unchanged = [], []
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            doc = next(chunks, _DONE)
+            self._add_time('chunk', start)
+            if doc is _DONE:
+                break
+            self._check_cancelled()
+
+            doc_id = store._generate_doc_id(doc)
+            if doc_id in wanted:
+                continue
+            wanted.add(doc_id)
+            checksums.add(doc.metadata.get('checksum') or doc.metadata.get('content_hash') or doc_id)
+
+            # Unchanged chunks are not re-embedded but must stay available for search results
+            store.remember_document(doc_id, doc)
+            indexed = doc_id in store.manifest
+            with self._lock:
+                self.stats['chunks'] += 1
+                if sync and indexed:
+                    self.stats['unchanged'] += 1
+            if sync and indexed:
+                self._report()
+                # Same text; only rewrite its metadata if its position in the document moved
+                if store.manifest.positions.get(doc_id) == chunk_position(doc):
+                    continue
+                unchanged.append((doc_id, doc))
+                if len(unchanged) >= self.batch_size:
+                    self._put(out, (unchanged, False))
+                    unchanged = []
+                continue
+
+            if not indexed:
+                new_vectors[0] += 1
+            batch.append((doc_id, doc))
+            if len(batch) >= self.batch_size:
+                self._put(out, (batch, True))
+                batch = []
+
+        if batch:
+            self._put(out, (batch, True))
+        if unchanged:
+            self._put(out, (unchanged, False))
+        self._put(out, _DONE)
+
+    def _embed(self, source: queue.Queue, out: queue.Queue, writers: int):
+        """Encode batches of chunks, passing unchanged ones through unembedded"""
+        while True:
+            item = self._get(source)
+            if item is _DONE:
+                for _ in range(writers):
+                    self._put(out, _DONE)
+                return
+            self._check_cancelled()
+            batch, needs_embedding = item
+            if not needs_embedding:
+                self._put(out, (batch, None))
+                continue
+            start = time.perf_counter()
+            embeddings = self.vector_store.embed_documents([doc for _, doc in batch])
+            self._add_time('embed', start)
+            with self._lock:
+                self.stats['encoded'] += len(batch)
+            self._put(out, (batch, embeddings))
+
+    def _write(self, source: queue.Queue, written: Dict[str, Tuple]):
+        """Write embedded batches to the vector store, recording each chunk's position"""
+        while True:
+            item = self._get(source)
+            if item is _DONE:
+                return
+            self._check_cancelled()
+            batch, embeddings = item
+            doc_ids = [doc_id for doc_id, _ in batch]
+            start = time.perf_counter()
+            if embeddings is None:
+                self.vector_store.update_metadata([doc for _, doc in batch], doc_ids)
+                self._add_time('write', start)
+                with self._lock:
+                    written.update((doc_id, chunk_position(doc)) for doc_id, doc in batch)
+                continue
+            self.vector_store.write_embeddings([doc for _, doc in batch], doc_ids, embeddings)
+            self._add_time('write', start)
+            with self._lock:
+                written.update((doc_id, chunk_position(doc)) for doc_id, doc in batch)
+                self.stats['embedded'] += len(batch)
+            self._report()
+
+    def _report(self):
+        """Send per-chunk progress to the callback"""
+        if self.progress_callback is None:
+            return
+        with self._lock:
+            stats = dict(self.stats)
+            timings = dict(self.timings)
+        done = stats['embedded'] + stats['unchanged']
+        # Chunk totals are only known once every file is loaded, so scale by the loaded share
+        loaded = min(stats['documents'] / stats['files'], 1.0) if stats['files'] else 1.0
+        fraction = loaded * done / stats['chunks'] if stats['chunks'] else 0.0
+        to_embed = stats['chunks'] - stats['unchanged']
+        stages = {
+            'load': {'done': stats['documents'], 'total': stats['files'], 'seconds': round(timings['load'], 3)},
+            'chunk': {'done': stats['chunks'], 'total': stats['chunks'], 'seconds': round(max(timings['chunk'], 0.0), 3)},
+            'embed': {'done': stats['encoded'], 'total': to_embed, 'seconds': round(timings['embed'], 3)},
+            'write': {'done': stats['embedded'], 'total': to_embed, 'seconds': round(timings['write'], 3)},
+        }
+        self.progress_callback({**stats, 'chunks_done': done, 'fraction': fraction, 'stages': stages})
+
+    def _record_metrics(self):
+        """Feed this run's stage times and chunk counts to the metrics registry"""
+        with self._lock:
+            stats = dict(self.stats)
+            timings = dict(self.timings)
+        for stage, seconds in timings.items():
+            observe('ingestion', stage, seconds)
+        record_chunks('chunked', stats['chunks'])
+        record_chunks('unchanged', stats['unchanged'])
+        record_chunks('encoded', stats['encoded'])
+        record_chunks('written', stats['embedded'])
+        record_chunks('deleted', stats['deleted'])
+
+    def _add_time(self, stage: str, start: float):
+        with self._lock:
+            self.timings[stage] += time.perf_counter() - start
+
+    def _check_cancelled(self):
+        """Stop the calling stage if ingestion was cancelled or another stage failed"""
+        if self.cancel_event.is_set():
+            raise IngestionCancelled()
+        if self._failed.is_set():
+            raise _Aborted()
+
+    def _guard(self, stage: Callable, *args):
+        """Run a stage, recording the first failure and stopping the other stages"""
+        try:
+            stage(*args)
+        except _Aborted:
+            pass
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._failed.set()
+
+    def _put(self, target: queue.Queue, item):
+        while not self._failed.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Aborted()
+
+    def _get(self, source: queue.Queue):
+        while not self._failed.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise _Aborted()
@@ -0,0 +1,229 @@
+# jobs.py - Bounded ingestion job queue with a fixed worker pool
+import os
+import time
+import uuid
+import queue
+import socket
+import logging
+import threading
+from typing import Callable, Dict, Optional, Set
+
+from ingestion import IngestionCancelled
+from session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+# Ingestion jobs run concurrently per process; each one already keeps the CPU busy encoding
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 1))
+# Jobs waiting per process before uploads are rejected with 429
+INGEST_JOB_QUEUE_SIZE = int(os.environ.get('INGEST_JOB_QUEUE_SIZE', 8))
+# How often a running job writes progress and checks for cancellation (seconds)
+JOB_POLL_INTERVAL = float(os.environ.get('INGEST_JOB_POLL_INTERVAL', 0.5))
+# The owning process refreshes its jobs' heartbeats this often (seconds); a queued or running
+# job whose heartbeat is older than JOB_STALE_SECONDS lost its process and is failed
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('INGEST_JOB_HEARTBEAT_INTERVAL', 5))
+JOB_STALE_SECONDS = float(os.environ.get('INGEST_JOB_STALE_SECONDS', 60))
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class JobQueueFull(Exception):
+    """Raised when the ingestion queue has no room for another job"""
+
+
+class JobContext:
+    """Handle passed to a running job for reporting progress and noticing cancellation"""
+
+    def __init__(self, job_id: str, session_id: str, store: SessionStore):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.store = store
+        self.cancel_event = threading.Event()
+        self.last_progress: Optional[Dict] = None
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    def report(self, progress: Dict):
+        """Progress callback for IngestionPipeline; writes to the store at most once per poll interval"""
+        with self._lock:
+            self.last_progress = progress
+            now = time.monotonic()
+            if now < self._next_poll:
+                return
+            self._next_poll = now + JOB_POLL_INTERVAL
+
+        # Cancellation may have been requested through another worker process
+        job = self.store.update(self.job_id, progress=int(100 * progress['fraction']),
+                                stages=progress['stages'])
+        if job.get('cancel_requested'):
+            self.cancel_event.set()
+
+    def flush(self):
+        """Write the latest progress regardless of the poll interval"""
+        if self.last_progress is not None:
+            self.store.update(self.job_id, progress=int(100 * self.last_progress['fraction']),
+                              stages=self.last_progress['stages'])
+
+
+class IngestionScheduler:
+    """Runs ingestion jobs on a fixed pool of worker threads fed by a bounded queue.
+
+    Job records live in a shared store so any worker process can report on or
+    cancel a job; the queue and threads belong to the process that accepted it.
+    That process keeps a heartbeat on each of its jobs, so when it dies any
+    other process can tell and fail the job (see fail_if_stale).
+    """
+
+    def __init__(self,
+                 store: SessionStore,
+                 workers: int = INGEST_WORKERS,
+                 queue_size: int = INGEST_JOB_QUEUE_SIZE):
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_queued = queue_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._running: Dict[str, JobContext] = {}
+        # Queued and running jobs of this process, kept alive by the heartbeat thread
+        self._owned: Set[str] = set()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def submit(self, session_id: str, target: Callable, *args) -> Dict:
+        """Queue target(job, *args), raising JobQueueFull instead of waiting when the queue is full"""
+        self._start_workers()
+        now = time.time()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'session_id': session_id,
+            'status': 'queued',  # queued, running, completed, failed, cancelled
+            'progress': 0,
+            'stages': {},
+            'result': None,
+            'error': None,
+            'cancel_requested': False,
+            'owner': self._owner,
+            'heartbeat_at': now,
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+        }
+        self.store.save(job_id, job)
+
+        try:
+            self._queue.put_nowait((job_id, session_id, target, args))
+        except queue.Full:
+            self.store.delete(job_id)
+            raise JobQueueFull(f"Ingestion queue is full ({self.max_queued} jobs waiting)")
+        with self._lock:
+            self._owned.add(job_id)
+
+        logger.info(f"Queued ingestion job {job_id} for session {session_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Request cancellation; queued jobs never start and running jobs stop at their next item"""
+        # Conditional updates, so a worker starting the job in between cannot undo the cancellation
+        job = self.store.update_if(job_id, {'status': 'queued'},
+                                   status='cancelled', cancel_requested=True, finished_at=time.time())
+        if job is None:
+            job = self.store.update_if(job_id, {'status': 'running'}, cancel_requested=True)
+        if job is None:
+            # Missing or already finished
+            return self.store.get(job_id)
+
+        # Jobs running in this process stop right away, others on their next progress report
+        context = self._running.get(job_id)
+        if context is not None:
+            context.cancel_event.set()
+
+        logger.info(f"Cancellation requested for ingestion job {job_id}")
+        return job
+
+    def fail_if_stale(self, job_id: str) -> Optional[Dict]:
+        """Fail a queued or running job whose process stopped sending heartbeats; the failed job, or None"""
+        job = self.store.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return None
+        if time.time() - job.get('heartbeat_at', job['created_at']) < JOB_STALE_SECONDS:
+            return None
+
+        # Only if no heartbeat or status change landed since it was read
+        job = self.store.update_if(job_id, {'status': job['status'], 'heartbeat_at': job.get('heartbeat_at')},
+                                   status='failed', error=f"Worker {job.get('owner')} stopped responding",
+                                   finished_at=time.time())
+        if job is not None:
+            logger.warning(f"Failed stale ingestion job {job_id} of worker {job.get('owner')}")
+        return job
+
+    def queued(self) -> int:
+        """Jobs waiting in this process"""
+        return self._queue.qsize()
+
+    def _start_workers(self):
+        """Start the pool on first use so threads are created in the serving process, not before a fork"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'ingest-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name='ingest-job-heartbeat', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _heartbeat(self):
+        """Refresh the heartbeat of every job this process holds"""
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            with self._lock:
+                job_ids = list(self._owned)
+            for job_id in job_ids:
+                try:
+                    # Conditional, so a deleted job is not recreated
+                    self.store.update_if(job_id, {'owner': self._owner}, heartbeat_at=time.time())
+                except Exception as e:
+                    logger.error(f"Error refreshing heartbeat of ingestion job {job_id}: {str(e)}")
+
+    def _work(self):
+        while True:
+            job_id, session_id, target, args = self._queue.get()
+            try:
+                self._run(job_id, session_id, target, args)
+            except Exception as e:
+                logger.error(f"Error running ingestion job {job_id}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._owned.discard(job_id)
+                self._queue.task_done()
+
+    def _run(self, job_id: str, session_id: str, target: Callable, args: tuple):
+        # Start the job only if it is still queued; cancel() moves queued jobs the same way
+        job = self.store.update_if(job_id, {'status': 'queued', 'cancel_requested': False},
+                                   status='running', started_at=time.time())
+        if job is None:
+            logger.info(f"Skipping cancelled ingestion job {job_id}")
+            return
+
+        context = JobContext(job_id, session_id, self.store)
+        self._running[job_id] = context
+
+        try:
+            result = target(context, *args)
+            status, fields = 'completed', {'result': result, 'progress': 100}
+        except IngestionCancelled:
+            status, fields = 'cancelled', {}
+        except Exception as e:
+            status, fields = 'failed', {'error': str(e)}
+        finally:
+            self._running.pop(job_id, None)
+
+        context.flush()
+        job = self.store.update(job_id, status=status, finished_at=time.time(), **fields)
+        logger.info(f"Ingestion job {job_id} {status} in {job['finished_at'] - job['started_at']:.2f}s")
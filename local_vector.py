@@ -0,0 +1,166 @@
+# local_vector.py - In-process vector store for small per-session corpora
+import os
+import logging
+from typing import List, Dict, Tuple
+import numpy as np
+from langchain.schema import Document
+from encoders import DEFAULT_EMBEDDING_MODEL, encode_query, get_encoder
+from metrics import span
+from quantization import EmbeddingMatrix
+from vector_store import VectorStore
+
+try:
+    import hnswlib
+except ImportError:  # HNSW is optional, brute force is exact and fast for small corpora
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# Switch from brute-force scoring to an HNSW graph above this many vectors
+HNSW_THRESHOLD = int(os.environ.get('LOCAL_HNSW_THRESHOLD', 50000))
+
+# Storage for in-process vectors: "float32", "float16" (half the memory) or "int8" (a quarter)
+LOCAL_VECTOR_DTYPE = os.environ.get('LOCAL_VECTOR_DTYPE', 'float16')
+
+
+class LocalVectorStore(VectorStore):
+    """Keeps normalized embeddings in a (optionally quantized) NumPy matrix and searches them in-process"""
+
+    def __init__(self,
+                 namespace: str = "default",
+                 embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+                 hnsw_threshold: int = HNSW_THRESHOLD,
+                 dtype: str = LOCAL_VECTOR_DTYPE,
+                 ):
+        super().__init__(namespace=namespace)
+
+        self.embedding_model = embedding_model
+        self.encoder = get_encoder(embedding_model)
+        self.dimension = self.encoder.get_sentence_embedding_dimension()
+        self.hnsw_threshold = hnsw_threshold
+
+        # Row i of the matrix holds the embedding of self.ids[i]
+        self.ids: List[str] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.embeddings = EmbeddingMatrix(self.dimension, dtype)
+        self.graph = None
+        self.begin_writes()
+
+    def begin_writes(self):
+        """Start buffering new rows for one ingestion run"""
+        self._pending_ids: List[str] = []
+        self._pending_blocks: List[np.ndarray] = []
+        self._updated_rows: List[int] = []
+
+    def write_embeddings(self, documents: List[Document], doc_ids: List[str], embeddings: np.ndarray):
+        """Overwrite known rows in place and buffer new ones until finish_writes"""
+        new_positions, updated_positions, updated_rows = [], [], []
+        for position, doc_id in enumerate(doc_ids):
+            row = self.id_to_row.get(doc_id)
+            if row is not None:
+                updated_positions.append(position)
+                updated_rows.append(row)
+            else:
+                new_positions.append(position)
+
+        if updated_rows:
+            self.embeddings.set_rows(updated_rows, embeddings[updated_positions])
+            self._updated_rows.extend(updated_rows)
+
+        if new_positions:
+            self._pending_ids.extend(doc_ids[position] for position in new_positions)
+            self._pending_blocks.append(embeddings[new_positions])
+
+    def finish_writes(self, new_vectors: int):
+        """Append buffered rows to the matrix in one copy and refresh the graph"""
+        if self._pending_ids:
+            for doc_id in self._pending_ids:
+                self.id_to_row[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+            self.embeddings.append(np.concatenate(self._pending_blocks))
+
+        self._update_graph(self._updated_rows)
+        self.begin_writes()
+
+        logger.info(f"Local index for namespace '{self.namespace}' now holds {len(self.ids)} vectors")
+
+    def dense_search(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+        """Search the in-memory index with cosine similarity"""
+        if not self.ids:
+            return []
+
+        try:
+            with span('search', 'query_encoding'):
+                query_embedding = encode_query(query, self.embedding_model)
+
+            k = min(k, len(self.ids))
+            with span('search', 'vector_query'):
+                if self.graph is not None:
+                    self.graph.set_ef(max(64, k))
+                    rows, distances = self.graph.knn_query(query_embedding, k=k)
+                    rows, scores = rows[0], 1.0 - distances[0]
+                else:
+                    rows, scores = self.embeddings.top_k(query_embedding, k)
+
+            return [(self.documents[self.ids[row]], float(score)) for row, score in zip(rows, scores)]
+
+        except Exception as e:
+            logger.error(f"Error searching local index: {str(e)}")
+            return []
+
+    def delete_documents(self, doc_ids: List[str]):
+        """Remove chunks from the in-memory index"""
+        rows = [self.id_to_row[doc_id] for doc_id in doc_ids if doc_id in self.id_to_row]
+        for doc_id in doc_ids:
+            self.documents.pop(doc_id, None)
+        self.manifest.remove(doc_ids)
+        if not rows:
+            return
+
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[rows] = False
+        self.embeddings.keep(keep)
+        self.ids = [doc_id for doc_id, kept in zip(self.ids, keep) if kept]
+        self.id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+        # Rows were renumbered, so the graph has to be rebuilt
+        self.graph = None
+        self._update_graph([])
+
+        logger.info(f"Deleted {len(rows)} vectors from local index for namespace '{self.namespace}'")
+
+    def get_stats(self) -> Dict:
+        """Get index statistics"""
+        return {
+            'total_vectors': len(self.ids),
+            'namespace_vectors': len(self.ids),
+            'dimension': self.dimension,
+            'index_fullness': 0,
+            'namespaces': [self.namespace],
+            'hnsw': self.graph is not None,
+            'dtype': self.embeddings.dtype,
+            'memory_bytes': self.embeddings.nbytes,
+            'embedding_cache': self.embedding_cache_stats(),
+        }
+
+    def _update_graph(self, updated_rows: List[int]):
+        """Build or extend the HNSW graph once the corpus outgrows brute force"""
+        if hnswlib is None or len(self.ids) < self.hnsw_threshold:
+            return
+
+        if self.graph is None:
+            self.graph = hnswlib.Index(space='cosine', dim=self.dimension)
+            self.graph.init_index(max_elements=len(self.ids), ef_construction=200, M=16)
+            rows = np.arange(len(self.ids))
+            logger.info(f"Building HNSW graph for namespace '{self.namespace}'")
+        else:
+            if self.graph.get_max_elements() < len(self.ids):
+                self.graph.resize_index(len(self.ids))
+            # Adding an existing label replaces its vector
+            rows = np.concatenate([
+                np.asarray(updated_rows, dtype=np.int64),
+                np.arange(self.graph.get_current_count(), len(self.ids)),
+            ])
+
+        if len(rows):
+            self.graph.add_items(self.embeddings.dequantize(rows), rows)
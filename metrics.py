@@ -0,0 +1,134 @@
+# metrics.py - Stage timing spans, counters and Prometheus exposition
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess
+except ImportError:  # Metrics are disabled without it; spans still fill per-request timings
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Set METRICS_ENABLED=0 to skip histogram and counter updates entirely
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1' and prometheus_client is not None
+# gunicorn workers each write their samples here and /metrics aggregates them (see gunicorn.conf.py)
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+# Stage durations range from sub-millisecond cache lookups to multi-second LLM calls and uploads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+if METRICS_ENABLED:
+    STAGE_SECONDS = Histogram('chatbot_stage_seconds', "Time spent in each stage of an operation",
+                              ['operation', 'stage'], buckets=LATENCY_BUCKETS)
+    REQUESTS = Counter('chatbot_requests_total', "Chat requests by outcome", ['operation', 'outcome'])
+    CACHE_REQUESTS = Counter('chatbot_cache_requests_total', "Cache lookups by cache and result", ['cache', 'result'])
+    CHUNKS = Counter('chatbot_chunks_total', "Chunks passing through each ingestion stage", ['stage'])
+    LLM_TOKENS = Counter('chatbot_llm_tokens_total', "LLM tokens sent and received", ['kind'])
+    UPSTREAM_CALLS = Counter('chatbot_upstream_calls_total', "OpenAI and Pinecone call attempts by outcome",
+                             ['upstream', 'outcome'])
+elif os.environ.get('METRICS_ENABLED', '1') == '1':
+    logger.warning("prometheus_client is not installed, metrics are disabled")
+
+# Stage timings of the request being handled, returned to the client in its debug field
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    'request_timings', default=None)
+
+
+class Span:
+    """Times a block, feeding the stage histogram and the current request's timings"""
+
+    __slots__ = ('operation', 'stage', 'timings', 'start', 'seconds')
+
+    def __init__(self, operation: str, stage: str, timings: Optional[Dict[str, float]]):
+        self.operation = operation
+        self.stage = stage
+        self.timings = timings
+        self.seconds = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+        if self.timings is not None:
+            self.timings[f"{self.stage}_ms"] = round(self.seconds * 1000, 1)
+        if METRICS_ENABLED:
+            STAGE_SECONDS.labels(self.operation, self.stage).observe(self.seconds)
+
+
+def span(operation: str, stage: str, timings: Optional[Dict[str, float]] = None):
+    """Time a stage; a no-op when metrics are off and no timings are being collected"""
+    if timings is None:
+        timings = _request_timings.get()
+    if timings is None and not METRICS_ENABLED:
+        return nullcontext()
+    return Span(operation, stage, timings)
+
+
+@contextmanager
+def collect_timings(timings: Optional[Dict[str, float]] = None) -> Iterator[Dict[str, float]]:
+    """Make spans in this block (and threads started with its context) record into one timings dict.
+
+    Nested calls without a dict share the outer one, so a wrapper and the
+    method it calls report a single set of timings.
+    """
+    current = _request_timings.get()
+    if timings is None and current is not None:
+        yield current
+        return
+    timings = {} if timings is None else timings
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def observe(operation: str, stage: str, seconds: float):
+    """Record a duration measured elsewhere"""
+    if METRICS_ENABLED:
+        STAGE_SECONDS.labels(operation, stage).observe(seconds)
+
+
+def record_request(operation: str, outcome: str):
+    if METRICS_ENABLED:
+        REQUESTS.labels(operation, outcome).inc()
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    if METRICS_ENABLED:
+        if hits:
+            CACHE_REQUESTS.labels(cache, 'hit').inc(hits)
+        if misses:
+            CACHE_REQUESTS.labels(cache, 'miss').inc(misses)
+
+
+def record_chunks(stage: str, count: int):
+    if METRICS_ENABLED and count:
+        CHUNKS.labels(stage).inc(count)
+
+
+def record_tokens(kind: str, count: int):
+    if METRICS_ENABLED and count:
+        LLM_TOKENS.labels(kind).inc(count)
+
+
+def record_upstream(upstream: str, outcome: str):
+    if METRICS_ENABLED:
+        UPSTREAM_CALLS.labels(upstream, outcome).inc()
+
+
+def render() -> Tuple[bytes, str]:
+    """Prometheus text exposition of every worker's metrics (or this process's without a multiprocess dir)"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,260 @@
+# onnx_encoder.py - ONNX Runtime sentence encoders exported from SentenceTransformer models
+#
+# export_onnx_model() writes, per model, a float32 ONNX export, a dynamically
+# quantized int8 copy, the fast tokenizer and an encoder.json recording pooling
+# and each variant's cosine agreement with the PyTorch model. Exporting needs
+# torch; running the export only needs onnxruntime and tokenizers.
+#
+#   python -m onnx_encoder [model ...]   # export ahead of time (defaults to EMBEDDING_MODEL)
+import os
+import json
+import shutil
+import inspect
+import logging
+import tempfile
+from typing import Dict, List, Optional, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Exports live in ONNX_MODEL_DIR/<model name>/
+ONNX_MODEL_DIR = os.environ.get('ONNX_MODEL_DIR', 'onnx_models')
+# ONNX Runtime threads per session; by default each gunicorn worker gets its share of the cores
+ONNX_THREADS = int(os.environ.get('ONNX_THREADS')
+                   or max(1, (os.cpu_count() or 1) // int(os.environ.get('WEB_CONCURRENCY', 4))))
+# Export missing models when a worker first loads them (needs torch); otherwise exports are built
+# ahead of time with `python -m onnx_encoder` (the Dockerfile does this) and missing ones fall back to torch
+ONNX_EXPORT_ON_LOAD = os.environ.get('ONNX_EXPORT_ON_LOAD', '0') == '1'
+
+MODEL_FILES = {'onnx': 'model.onnx', 'onnx-int8': 'model-int8.onnx'}
+
+# Texts the exports are compared on: questions, policy prose, numbers, long and short inputs
+PARITY_SENTENCES = [
+    "What are the monthly fees for a checking account?",
+    "How do I reset my online banking password?",
+    "Overdraft protection links your savings account to cover transactions that exceed your checking balance.",
+    "Wire transfers submitted after 4 p.m. Eastern are processed on the next business day.",
+    "The premium card requires a minimum balance of $5,000 and charges a $25 annual fee after the first year.",
+    "branch hours",
+    "Employees must complete security awareness training within 30 days of their start date and every year "
+    "after that; managers are responsible for tracking completion and reporting exceptions to compliance.",
+    "Can I dispute a charge on my credit card statement?",
+    "Mortgage applications need two years of tax returns, recent pay stubs and a signed purchase agreement.",
+    "Remote work requests are approved by the department head and reviewed every six months.",
+    "Fraud alerts are sent by text message and email whenever an unusual transaction is detected.",
+    "What documents do I need to open a business account?",
+    "Interest on savings accounts is compounded daily and credited monthly.",
+    "Lost or stolen cards can be frozen immediately from the mobile app.",
+    "Customer complaints are acknowledged within two business days and resolved within fifteen.",
+    "The expense policy reimburses economy airfare, standard hotel rooms and meals up to the daily limit.",
+]
+
+
+class ParityError(ValueError):
+    """An export's embeddings disagree with the PyTorch model beyond the allowed threshold"""
+
+
+class OnnxEncoder:
+    """Runs an exported transformer with ONNX Runtime and pools its output like the original model.
+
+    Exposes the slice of the SentenceTransformer interface the app uses:
+    encode() and get_sentence_embedding_dimension().
+    """
+
+    def __init__(self, model_dir: str, file_name: str):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, 'encoder.json'), encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.pooling = self.config['pooling']
+        self.normalize = self.config['normalize']
+        self.dimension = self.config['dimension']
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_token_id'], pad_token=self.config['pad_token'])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(os.path.join(model_dir, file_name), options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Embed sentences; longest first within batches to keep padding down, returned in input order"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        embeddings = np.empty((len(sentences), self.dimension), dtype=np.float32)
+        order = np.argsort([-len(sentence) for sentence in sentences], kind='stable')
+
+        for start in range(0, len(sentences), max(1, batch_size)):
+            rows = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([sentences[row] for row in rows])
+            mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {
+                'input_ids': np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                'attention_mask': mask,
+                'token_type_ids': np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+
+            if self.pooling == 'cls':
+                pooled = hidden[:, 0]
+            else:
+                weights = mask[:, :, None].astype(np.float32)
+                pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+            embeddings[rows] = pooled
+
+        if self.normalize or normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+def export_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.strip('/').replace('/', '__'))
+
+
+def has_export(model_name: str) -> bool:
+    """Whether a finished export of the model exists"""
+    return os.path.exists(os.path.join(export_dir(model_name), 'encoder.json'))
+
+
+def load_onnx_encoder(model_name: str, backend: str, parity_threshold: float) -> OnnxEncoder:
+    """Load the onnx or onnx-int8 export of a model, exporting it first if ONNX_EXPORT_ON_LOAD is set.
+
+    Raises FileNotFoundError if there is no export to load, and ParityError if the export's recorded cosine agreement with the
+    PyTorch model is below parity_threshold.
+    """
+    directory = export_dir(model_name)
+    if not has_export(model_name):
+        if not ONNX_EXPORT_ON_LOAD:
+            raise FileNotFoundError(f"no ONNX export of {model_name} in {directory}; "
+                                    f"build one with `python -m onnx_encoder {model_name}`")
+        export_onnx_model(model_name, directory)
+
+    with open(os.path.join(directory, 'encoder.json'), encoding='utf-8') as f:
+        parity = json.load(f)['parity'][backend]
+    if parity['min_cosine'] < parity_threshold:
+        raise ParityError(f"{backend} export of {model_name} has min cosine {parity['min_cosine']:.4f} "
+                          f"with the PyTorch model (threshold {parity_threshold})")
+    return OnnxEncoder(directory, MODEL_FILES[backend])
+
+
+def export_onnx_model(model_name: str, directory: Optional[str] = None) -> Dict:
+    """Export a SentenceTransformer model to ONNX (float32 and int8) and record parity with it.
+
+    The export is written to a temporary directory and renamed into place, so
+    workers exporting at the same time never see a partial one.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    directory = directory or export_dir(model_name)
+    reference = SentenceTransformer(model_name, device='cpu')
+    transformer, pooling = reference[0], reference[1]
+    if pooling.pooling_mode_mean_tokens:
+        pooling_mode = 'mean'
+    elif pooling.pooling_mode_cls_token:
+        pooling_mode = 'cls'
+    else:
+        raise ValueError(f"{model_name} uses pooling the ONNX encoder does not implement")
+
+    tokenizer = transformer.tokenizer
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids')
+                   if name in tokenizer.model_input_names]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(os.path.dirname(os.path.abspath(directory)), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.export-', dir=os.path.dirname(os.path.abspath(directory)))
+    try:
+        sample = tokenizer(["export sample sentence"], return_tensors='pt')
+        axes = {0: 'batch', 1: 'sequence'}
+        # Newer torch defaults to the dynamo exporter; the TorchScript one handles these models everywhere
+        legacy = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                LastHiddenState(transformer.auto_model.eval()),
+                tuple(sample[name] for name in input_names),
+                os.path.join(staging, MODEL_FILES['onnx']),
+                input_names=input_names,
+                output_names=['last_hidden_state'],
+                dynamic_axes={**{name: axes for name in input_names}, 'last_hidden_state': axes},
+                opset_version=14,
+                **legacy,
+            )
+        quantize_dynamic(os.path.join(staging, MODEL_FILES['onnx']), os.path.join(staging, MODEL_FILES['onnx-int8']),
+                         weight_type=QuantType.QInt8)
+        tokenizer.backend_tokenizer.save(os.path.join(staging, 'tokenizer.json'))
+
+        config = {
+            'model': model_name,
+            'dimension': reference.get_sentence_embedding_dimension(),
+            'max_seq_length': reference.max_seq_length,
+            'pooling': pooling_mode,
+            'normalize': any(type(module).__name__ == 'Normalize' for module in reference),
+            'pad_token': tokenizer.pad_token,
+            'pad_token_id': tokenizer.pad_token_id,
+            'parity': {},
+        }
+        _write_config(staging, config)
+
+        expected = reference.encode(PARITY_SENTENCES, convert_to_numpy=True, normalize_embeddings=True)
+        for backend, file_name in MODEL_FILES.items():
+            actual = OnnxEncoder(staging, file_name).encode(PARITY_SENTENCES, normalize_embeddings=True)
+            config['parity'][backend] = cosine_agreement(expected, actual)
+        _write_config(staging, config)
+
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # Another process finished its export first; theirs is as good as ours
+            shutil.rmtree(staging, ignore_errors=True)
+        logger.info(f"Exported {model_name} to ONNX in {directory}: parity {config['parity']}")
+        return config
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def cosine_agreement(expected: np.ndarray, actual: np.ndarray) -> Dict[str, float]:
+    """Row-wise cosine similarity between two sets of embeddings"""
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    actual = actual / np.linalg.norm(actual, axis=1, keepdims=True)
+    cosines = (expected * actual).sum(axis=1)
+    return {'min_cosine': round(float(cosines.min()), 6), 'mean_cosine': round(float(cosines.mean()), 6)}
+
+
+def _write_config(directory: str, config: Dict):
+    with open(os.path.join(directory, 'encoder.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+
+if __name__ == '__main__':
+    import argparse
+    from encoders import DEFAULT_EMBEDDING_MODEL
+
+    parser = argparse.ArgumentParser(description="Export SentenceTransformer models to ONNX_MODEL_DIR")
+    parser.add_argument('models', nargs='*', default=[DEFAULT_EMBEDDING_MODEL])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for name in args.models:
+        if has_export(name):
+            logger.info(f"{name} is already exported to {export_dir(name)}")
+        else:
+            export_onnx_model(name)
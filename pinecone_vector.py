@@ -1,54 +1,82 @@
 # vector_store_pinecone.py - Pinecone Vector Store Implementation
 import os
 import logging
-from typing import List, Dict, Optional, Tuple
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone, ServerlessSpec
+import threading
+from typing import List, Dict, Tuple
 from langchain.schema import Document
-import hashlib
+from clients import PINECONE_INDEX_HOST, PINECONE_POOL_SIZE, PINECONE_TIMEOUT, get_pinecone, pinecone_upstream
+from encoders import DEFAULT_EMBEDDING_MODEL, encode_query, get_encoder
+from metrics import span
+from vector_store import IndexManifest, VectorStore
 import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-class PineconeVectorStore:
+# Parallel upsert requests per ingestion run
+UPSERT_CONCURRENCY = int(os.environ.get('PINECONE_UPSERT_CONCURRENCY', 4))
+UPSERT_MAX_RETRIES = int(os.environ.get('PINECONE_UPSERT_RETRIES', 3))
+# Seconds to wait for upserted vectors to show up in index stats
+INDEX_READY_TIMEOUT = float(os.environ.get('PINECONE_READY_TIMEOUT', 30))
+# Chunk text is stored in metadata up to this length; longer chunks are also kept locally
+METADATA_TEXT_LIMIT = 1000
+
+# Index handles by name, shared by every store in the process so uploads skip the control plane
+_indexes: Dict = {}
+_index_lock = threading.Lock()
+
+class PineconeVectorStore(VectorStore):
     """Manages embeddings and vector search using Pinecone"""
     
     def __init__(self, 
                  index_name: str = "company-chatbot",
                  namespace: str = "default",
-                 embedding_model: str = 'all-MiniLM-L6-v2',
+                 embedding_model: str = DEFAULT_EMBEDDING_MODEL,
                 ):    
+        super().__init__(namespace=namespace)
         
-        # Initialize Pinecone
-        self.__api_key = os.environ.get('PINECONE_API_KEY')
-        if not self.__api_key:
-            raise ValueError("Pinecone API key not provided")
+        # Shared Pinecone client (raises if no API key is configured)
+        self.pc = get_pinecone()
         
-        # Initialize Pinecone client
-        self.pc = Pinecone(api_key=self.__api_key)
-        
-        # Initialize embedding model
-        self.encoder = SentenceTransformer(embedding_model)
+        # Use the process-wide embedding model (loaded once per process)
+        self.embedding_model = embedding_model
+        self.encoder = get_encoder(embedding_model)
         self.dimension = self.encoder.get_sentence_embedding_dimension()
-        self.namespace = namespace
         
         # Initialize or get index
         self.index = self._initialize_index(index_name)
         
-        # Store for document tracking
-        self.documents = {}
-        
     def _initialize_index(self, index_name: str):
-        """Initialize Pinecone index"""
+        """Return the process's handle to a Pinecone index, creating the index on first use"""
         index_name = index_name.lower()
+        index = _indexes.get(index_name)
+        if index is not None:
+            return index
+        
+        with _index_lock:
+            index = _indexes.get(index_name)
+            if index is None:
+                index = _indexes[index_name] = self._connect_index(index_name)
+            return index
+    
+    def _connect_index(self, index_name: str):
+        """Create the index if needed and open a pooled handle to it"""
         try:
+            if PINECONE_INDEX_HOST:
+                # Data-plane host given (e.g. a local stand-in): the index is managed elsewhere
+                index = self.pc.Index(index_name, host=PINECONE_INDEX_HOST,
+                                      pool_threads=PINECONE_POOL_SIZE, connection_pool_maxsize=PINECONE_POOL_SIZE)
+                logger.info(f"Connected to Pinecone index {index_name} at {PINECONE_INDEX_HOST}")
+                return index
+            
             # Check if index exists
-            if not self.pc.has_index(index_name):
+            if not pinecone_upstream.call(self.pc.has_index, index_name):
                 logger.info(f"Creating new Pinecone index: {index_name}")
+                from pinecone import ServerlessSpec
                 
                 # Create index with serverless spec
-                self.pc.create_index(
+                pinecone_upstream.call(
+                    self.pc.create_index,
                     name=index_name,
                     dimension=self.dimension,
                     metric='cosine',
@@ -63,7 +91,8 @@ class PineconeVectorStore:
                     time.sleep(1)
                     
             # Connect to index
-            index = self.pc.Index(index_name)
+            index = self.pc.Index(index_name, pool_threads=PINECONE_POOL_SIZE,
+                                  connection_pool_maxsize=PINECONE_POOL_SIZE)
             logger.info(f"Connected to Pinecone index: {index_name}")
             
             return index
@@ -72,73 +101,166 @@ class PineconeVectorStore:
             logger.error(f"Error initializing Pinecone index: {str(e)}")
             raise
     
-    def add_documents(self, documents: List[Document], batch_size: int = 100):
-        """Add documents to Pinecone index"""
+    # Upserts run on several ingestion writer threads; embedding of the next batch overlaps them
+    write_concurrency = UPSERT_CONCURRENCY
+    
+    def begin_writes(self):
+        """Record the namespace size so finish_writes knows how many vectors to wait for"""
+        self._vectors_before = self.vector_count()
+    
+    def write_embeddings(self, documents: List[Document], doc_ids: List[str], embeddings):
+        """Upsert one embedded batch to Pinecone"""
         try:
-            logger.info(f"Adding {len(documents)} documents to Pinecone")
-            
-            # Generate embeddings
-            texts = [doc.page_content for doc in documents]
-            embeddings = self.encoder.encode(texts, show_progress_bar=True)
-            
-            # Prepare vectors for Pinecone
-            vectors = []
-            for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
-                print(f"Processing document metadata {doc.metadata}")
-                # Generate unique ID
-                doc_id = self._generate_doc_id(doc.page_content, i)
-                
-                # Prepare metadata
-                metadata = {
-                    'text': doc.page_content[:1000],  # Pinecone has metadata size limits
-                    'source': doc.metadata.get('source', 'unknown'),
-                    'doc_type': doc.metadata.get('doc_type', 'general'),
-                    'chunk_index': doc.metadata.get('chunk_index', 0),
-                    'namespace': self.namespace,
-                    'created_at': doc.metadata.get('created_at', datetime.now().isoformat()),
-                }
-                
-                # Store full document locally
-                self.documents[doc_id] = doc
-                
-                vectors.append({
-                    'id': doc_id,
-                    'values': embedding.tolist(),
-                    'metadata': metadata
-                })
-            
-            # Upload in batches
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                self.index.upsert(
-                    vectors=batch,
-                    namespace=self.namespace
-                )
-                logger.info(f"Uploaded batch {i//batch_size + 1}/{(len(vectors) + batch_size - 1)//batch_size}")
-            
-            # Wait for indexing to complete
-            time.sleep(1)
-            
-            logger.info(f"Successfully added {len(documents)} documents to namespace '{self.namespace}'")
+            vectors = [
+                self._prepare_vector(doc, doc_id, embedding)
+                for doc, doc_id, embedding in zip(documents, doc_ids, embeddings)
+            ]
+            with span('ingestion', 'upsert_batch'):
+                self._upsert_batch(vectors)
             
         except Exception as e:
             logger.error(f"Error adding documents to Pinecone: {str(e)}")
             raise
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+    def update_metadata(self, documents: List[Document], doc_ids: List[str]):
+        """Set the new position of chunks whose text is unchanged, leaving their vectors in place"""
+        try:
+            with span('ingestion', 'metadata_update'):
+                for doc, doc_id in zip(documents, doc_ids):
+                    position = {'chunk_index': doc.metadata.get('chunk_index', 0)}
+                    if doc.metadata.get('start_index') is not None:
+                        position['start_index'] = doc.metadata['start_index']
+                    pinecone_upstream.call(self.index.update, id=doc_id, set_metadata=position,
+                                           namespace=self.namespace, _request_timeout=PINECONE_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error updating metadata in Pinecone: {str(e)}")
+            raise
+    
+    def finish_writes(self, new_vectors: int):
+        """Wait for indexing to complete"""
+        self._wait_for_vectors(self._vectors_before + new_vectors)
+        logger.info(f"Successfully added {new_vectors} new vectors to namespace '{self.namespace}'")
+    
+    def remember_document(self, doc_id: str, doc: Document):
+        """Only keep chunks locally that do not fit in Pinecone metadata"""
+        if len(doc.page_content) > METADATA_TEXT_LIMIT:
+            self.documents[doc_id] = doc
+    
+    def delete_documents(self, doc_ids: List[str], batch_size: int = 1000):
+        """Delete chunks from this namespace"""
+        try:
+            for i in range(0, len(doc_ids), batch_size):
+                pinecone_upstream.call(self.index.delete, ids=doc_ids[i:i + batch_size], namespace=self.namespace,
+                                       _request_timeout=PINECONE_TIMEOUT)
+            for doc_id in doc_ids:
+                self.documents.pop(doc_id, None)
+            self.manifest.remove(doc_ids)
+            logger.info(f"Deleted {len(doc_ids)} stale vectors from namespace '{self.namespace}'")
+            
+        except Exception as e:
+            logger.error(f"Error deleting documents from Pinecone: {str(e)}")
+            raise
+    
+    def drop_namespace(self):
+        """Delete every vector in this namespace"""
+        try:
+            pinecone_upstream.call(self.index.delete, delete_all=True, namespace=self.namespace,
+                                   _request_timeout=PINECONE_TIMEOUT)
+        except Exception as e:
+            # Pinecone reports a missing namespace as an error; nothing was indexed then
+            logger.warning(f"Could not delete namespace '{self.namespace}': {str(e)}")
+        self.manifest.discard()
+        self.documents.clear()
+        self.lexical_index = None
+        self.update_corpus_version([], replace=True)
+        logger.info(f"Dropped namespace '{self.namespace}'")
+    
+    def refresh_manifest(self):
+        """Reload the chunk IDs this namespace holds from Pinecone, the record every replica shares"""
+        with span('ingestion', 'manifest_list'):
+            chunk_ids = set(pinecone_upstream.call(self._list_ids))
+        # Positions this process wrote are only trusted while no other replica has changed the namespace;
+        # chunks of an edited document always change IDs, so a changed ID set marks such a sync
+        positions = self.manifest.positions if chunk_ids == self.manifest.chunk_ids else None
+        self.manifest = IndexManifest(chunk_ids, positions)
+    
+    def _list_ids(self) -> List[str]:
+        """Every vector ID in this namespace, page by page"""
+        chunk_ids = []
+        for ids in self.index.list(namespace=self.namespace):
+            chunk_ids.extend(ids)
+        return chunk_ids
+    
+    def _prepare_vector(self, doc: Document, doc_id: str, embedding) -> Dict:
+        """Build the Pinecone upsert payload for one chunk"""
+        # Prepare metadata
+        metadata = {
+            'text': doc.page_content[:METADATA_TEXT_LIMIT],  # Pinecone has metadata size limits
+            'source': doc.metadata.get('source', 'unknown'),
+            'doc_type': doc.metadata.get('doc_type', 'general'),
+            'chunk_index': doc.metadata.get('chunk_index', 0),
+            'content_hash': doc.metadata.get('content_hash', ''),
+            'namespace': self.namespace,
+            'created_at': doc.metadata.get('created_at', datetime.now().isoformat()),
+        }
+        # Offset in the source document, used to merge neighbouring chunks in prompts
+        if doc.metadata.get('start_index') is not None:
+            metadata['start_index'] = doc.metadata['start_index']
+        
+        return {
+            'id': doc_id,
+            'values': embedding.tolist(),
+            'metadata': metadata
+        }
+    
+    def _upsert_batch(self, vectors: List[Dict]):
+        """Upsert one batch, retrying transient failures with jittered exponential backoff"""
+        pinecone_upstream.call(
+            self.index.upsert,
+            vectors=vectors,
+            namespace=self.namespace,
+            _request_timeout=PINECONE_TIMEOUT,
+            retries=UPSERT_MAX_RETRIES
+        )
+        logger.info(f"Uploaded batch of {len(vectors)} vectors")
+    
+    def vector_count(self) -> int:
+        """Number of vectors currently visible in this namespace, as every replica sees it"""
+        stats = pinecone_upstream.call(self.index.describe_index_stats, _request_timeout=PINECONE_TIMEOUT)
+        return stats.get('namespaces', {}).get(self.namespace, {}).get('vector_count', 0)
+    
+    def _wait_for_vectors(self, expected: int):
+        """Poll index stats until the expected vector count is visible (or give up)"""
+        deadline = time.monotonic() + INDEX_READY_TIMEOUT
+        delay = 0.1
+        while True:
+            count = self.vector_count()
+            if count >= expected:
+                return
+            if time.monotonic() >= deadline:
+                logger.warning(f"Namespace '{self.namespace}' shows {count}/{expected} vectors after {INDEX_READY_TIMEOUT}s")
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+    
+    def dense_search(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
         """Search for relevant documents in Pinecone"""
         try:
-            # Generate query embedding
-            query_embedding = self.encoder.encode([query])[0]
+            # Generate query embedding (cached for repeated questions)
+            with span('search', 'query_encoding'):
+                query_embedding = encode_query(query, self.embedding_model)
             logger.info(f"Searching Pinecone for query: {query}")
             
             # Search in Pinecone by namespace
-            results = self.index.query(
-                vector=query_embedding.tolist(),
-                top_k=k,
-                namespace=self.namespace,
-                include_metadata=True
-            )
+            with span('search', 'vector_query'):
+                results = pinecone_upstream.call(
+                    self.index.query,
+                    vector=query_embedding.tolist(),
+                    top_k=k,
+                    namespace=self.namespace,
+                    include_metadata=True,
+                    _request_timeout=PINECONE_TIMEOUT
+                )
             
             # Process results
             search_results = []
@@ -151,14 +273,7 @@ class PineconeVectorStore:
                     doc = self.documents[doc_id]
                 else:
                     # Reconstruct from metadata if not in local storage
-                    metadata = match.get('metadata', {})
-                    doc = Document(
-                        page_content=metadata.get('text', ''),
-                        metadata={
-                            'source': metadata.get('source', 'unknown'),
-                            'doc_type': metadata.get('doc_type', 'general')
-                        }
-                    )
+                    doc = self._document_from_metadata(match.get('metadata', {}))
                 
                 search_results.append((doc, score))
             
@@ -169,10 +284,40 @@ class PineconeVectorStore:
             return []
     
     
+    def resolve_chunks(self, keys: List[str]) -> Dict[str, Document]:
+        """Look up BM25 hits locally, fetching the chunks only kept in Pinecone metadata"""
+        found = super().resolve_chunks(keys)
+        remote = {self._doc_id_for_key(key): key for key in keys if key not in found}
+        if not remote:
+            return found
+        
+        try:
+            with span('search', 'chunk_fetch'):
+                response = pinecone_upstream.call(self.index.fetch, ids=list(remote), namespace=self.namespace,
+                                                  _request_timeout=PINECONE_TIMEOUT)
+            for doc_id, vector in response.vectors.items():
+                found[remote[doc_id]] = self._document_from_metadata(vector.metadata or {})
+        except Exception as e:
+            # Lexical-only hits are dropped; dense results still come back
+            logger.warning(f"Could not fetch chunks from Pinecone: {str(e)}")
+        return found
+    
+    def _document_from_metadata(self, metadata: Dict) -> Document:
+        """Rebuild a chunk from the metadata stored with its vector"""
+        doc_metadata = {
+            'source': metadata.get('source', 'unknown'),
+            'doc_type': metadata.get('doc_type', 'general'),
+            'chunk_index': int(metadata.get('chunk_index', 0)),
+            'content_hash': metadata.get('content_hash', '')
+        }
+        if 'start_index' in metadata:
+            doc_metadata['start_index'] = int(metadata['start_index'])
+        return Document(page_content=metadata.get('text', ''), metadata=doc_metadata)
+    
     def get_stats(self) -> Dict:
         """Get index statistics"""
         try:
-            stats = self.index.describe_index_stats()
+            stats = pinecone_upstream.call(self.index.describe_index_stats, _request_timeout=PINECONE_TIMEOUT)
             namespace_stats = stats.get('namespaces', {}).get(self.namespace, {})
             
             return {
@@ -180,13 +325,9 @@ class PineconeVectorStore:
                 'namespace_vectors': namespace_stats.get('vector_count', 0),
                 'dimension': stats.get('dimension', self.dimension),
                 'index_fullness': stats.get('index_fullness', 0),
-                'namespaces': list(stats.get('namespaces', {}).keys())
+                'namespaces': list(stats.get('namespaces', {}).keys()),
+                'embedding_cache': self.embedding_cache_stats(),
             }
         except Exception as e:
             logger.error(f"Error getting stats: {str(e)}")
             return {}
-    
-    def _generate_doc_id(self, content: str, index: int) -> str:
-        """Generate unique document ID"""
-        content_hash = hashlib.md5(content.encode()).hexdigest()[:8]
-        return f"{self.namespace}_{content_hash}_{index}"
\ No newline at end of file
@@ -0,0 +1,81 @@
+# preload.py - Background loading of heavy modules and models, and the readiness state behind /readyz
+import os
+import time
+import logging
+import importlib
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# background: each worker loads in a thread while already serving requests (default)
+# master: gunicorn loads encoder weights before forking (shared copy-on-write, but boot waits for them)
+# 0: load everything on first use
+PRELOAD_ENCODERS = os.environ.get('PRELOAD_ENCODERS', 'background').lower()
+
+_started = False
+_ready = threading.Event()
+_error: Optional[str] = None
+_seconds: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def start_preload():
+    """Start loading in a daemon thread (once per process); a no-op when preloading is off"""
+    global _started
+    with _lock:
+        if _started or PRELOAD_ENCODERS in ('0', 'off'):
+            return
+        _started = True
+    threading.Thread(target=_preload, name='preload', daemon=True).start()
+
+
+def is_ready() -> bool:
+    """True once everything is loaded, or right away when preloading is off"""
+    return _ready.is_set() or not _started
+
+
+def status() -> Dict:
+    return {
+        'ready': is_ready(),
+        'preload': PRELOAD_ENCODERS if _started else 'disabled',
+        'error': _error,
+        'seconds': dict(_seconds),
+    }
+
+
+def _preload():
+    global _error
+    from vector_store import DEFAULT_VECTOR_BACKEND
+
+    backend_module = 'local_vector' if DEFAULT_VECTOR_BACKEND == 'local' else 'pinecone_vector'
+    start = time.perf_counter()
+    try:
+        for module in ('document_processor', 'secured_chatbot', backend_module):
+            _timed(module, importlib.import_module, module)
+
+        from encoders import get_encoder
+        _timed('encoder', get_encoder)
+
+        from reranker import RERANK_ENABLED, get_cross_encoder
+        if RERANK_ENABLED:
+            _timed('cross_encoder', get_cross_encoder)
+
+        from clients import get_openai
+        if os.environ.get('OPENAI_API_KEY'):
+            _timed('openai_client', get_openai)
+    except Exception as e:
+        # Stay not ready; requests still load what they need on first use
+        _error = str(e)
+        logger.error(f"Preload failed: {str(e)}")
+        return
+
+    _seconds['total'] = round(time.perf_counter() - start, 3)
+    _ready.set()
+    logger.info(f"Preload finished in {_seconds['total']:.2f}s")
+
+
+def _timed(name: str, fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    _seconds[name] = round(time.perf_counter() - start, 3)
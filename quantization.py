@@ -0,0 +1,99 @@
+# quantization.py - Compact embedding matrices (float32 / float16 / int8) with top-k scoring
+import logging
+from typing import Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DTYPES = ('float32', 'float16', 'int8')
+
+# Rows dequantized at a time while scoring, bounding the float32 scratch memory
+SCORE_BLOCK_ROWS = 2048
+
+
+class EmbeddingMatrix:
+    """Contiguous embedding rows stored as float32, float16 or per-row scaled int8.
+
+    int8 rows keep a float32 scale each (row = codes * scale / 127), so cosine
+    scores against a float32 query are recovered exactly up to rounding.
+    Scoring dequantizes one block of rows at a time; the full float32 matrix
+    is never materialized.
+    """
+
+    def __init__(self, dimension: int, dtype: str = 'float32'):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        self.dimension = dimension
+        self.dtype = dtype
+        self.codes = np.empty((0, dimension), dtype=np.int8 if dtype == 'int8' else dtype)
+        self.scales = np.empty(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode float32 rows into this matrix's storage format"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if self.dtype != 'int8':
+            return vectors.astype(self.dtype), np.empty(0, dtype=np.float32)
+
+        scales = np.abs(vectors).max(axis=1)
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors * (127.0 / scales[:, None])).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def dequantize(self, rows=slice(None)) -> np.ndarray:
+        """Decode rows back to float32"""
+        block = self.codes[rows].astype(np.float32)
+        if self.dtype == 'int8':
+            block *= (self.scales[rows] / 127.0)[:, None]
+        return block
+
+    def append(self, vectors: np.ndarray):
+        """Add rows in one copy"""
+        codes, scales = self.quantize(vectors)
+        self.codes = np.concatenate([self.codes, codes])
+        if self.dtype == 'int8':
+            self.scales = np.concatenate([self.scales, scales])
+
+    def set_rows(self, rows, vectors: np.ndarray):
+        """Overwrite existing rows"""
+        codes, scales = self.quantize(vectors)
+        self.codes[rows] = codes
+        if self.dtype == 'int8':
+            self.scales[rows] = scales
+
+    def keep(self, mask: np.ndarray):
+        """Drop every row where mask is False"""
+        self.codes = self.codes[mask]
+        if self.dtype == 'int8':
+            self.scales = self.scales[mask]
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Dot product of every row with a float32 query"""
+        query = np.asarray(query, dtype=np.float32)
+        if self.dtype == 'float32':
+            return self.codes @ query
+
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCORE_BLOCK_ROWS):
+            end = start + SCORE_BLOCK_ROWS
+            scores[start:end] = self.codes[start:end].astype(np.float32) @ query
+        if self.dtype == 'int8':
+            # Scaling the scores is cheaper than scaling every dequantized row
+            scores *= self.scales / 127.0
+        return scores
+
+    def top_k(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and scores of the k best rows, best first"""
+        scores = self.scores(query)
+        if k < len(scores):
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows])]
+        return rows, scores[rows]
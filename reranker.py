@@ -0,0 +1,96 @@
+# reranker.py - Cross-encoder reranking of retrieved chunks
+import os
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+from bm25 import chunk_key
+from cache import LRUCache, normalize_query
+from metrics import record_cache
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+logger = logging.getLogger(__name__)
+
+# Set RERANK_ENABLED=1 to rerank a wider candidate set and keep only the best chunks
+RERANK_ENABLED = os.environ.get('RERANK_ENABLED', '0') == '1'
+RERANK_MODEL = os.environ.get('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_CANDIDATES = int(os.environ.get('RERANK_CANDIDATES', 20))
+RERANK_TOP_N = int(os.environ.get('RERANK_TOP_N', 3))
+RERANK_CACHE_SIZE = int(os.environ.get('RERANK_CACHE_SIZE', 8192))
+
+# Loaded cross-encoders keyed by model name, shared by every chatbot in the process
+_models: Dict[str, 'CrossEncoder'] = {}
+_rerankers: Dict[str, 'CrossEncoderReranker'] = {}
+_lock = threading.Lock()
+
+
+def get_cross_encoder(model_name: str = RERANK_MODEL) -> 'CrossEncoder':
+    """Return the shared cross-encoder for a model, loading it on first use"""
+    model = _models.get(model_name)
+    if model is None:
+        with _lock:
+            model = _models.get(model_name)
+            if model is None:
+                from sentence_transformers import CrossEncoder
+                logger.info(f"Loading cross-encoder: {model_name}")
+                model = CrossEncoder(model_name, device='cpu')
+                _models[model_name] = model
+    return model
+
+
+def get_reranker(model_name: str = RERANK_MODEL) -> 'CrossEncoderReranker':
+    """Return the process-wide reranker for a model so its score cache is shared"""
+    reranker = _rerankers.get(model_name)
+    if reranker is None:
+        with _lock:
+            reranker = _rerankers.setdefault(model_name, CrossEncoderReranker(model_name))
+    return reranker
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a cross-encoder in one batch, caching scores per chunk"""
+
+    def __init__(self, model_name: str = RERANK_MODEL, cache_size: int = RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        # Scores keyed by (normalized query, chunk key); chunk keys are content addressed
+        self.score_cache = LRUCache(max_size=cache_size)
+
+    def score(self, query: str, documents: List[Document]) -> np.ndarray:
+        """Relevance score of every document for the query; only uncached pairs reach the model"""
+        normalized = normalize_query(query)
+        keys = [(normalized, chunk_key(doc)) for doc in documents]
+        scores = np.array([self.score_cache.get(key, np.nan) for key in keys], dtype=np.float32)
+
+        missing = np.flatnonzero(np.isnan(scores))
+        record_cache('rerank', hits=len(keys) - len(missing), misses=len(missing))
+        if len(missing):
+            pairs = [(query, documents[i].page_content) for i in missing]
+            predicted = get_cross_encoder(self.model_name).predict(
+                pairs,
+                batch_size=len(pairs),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+            scores[missing] = predicted
+            for i, value in zip(missing, predicted):
+                self.score_cache.put(keys[i], float(value))
+
+        return scores
+
+    def rerank(self,
+               query: str,
+               results: List[Tuple[Document, float]],
+               top_n: Optional[int] = RERANK_TOP_N) -> List[Tuple[Document, float]]:
+        """Reorder retrieval results by cross-encoder score and keep the top_n.
+
+        The (document, retrieval score) pairs are returned unchanged so
+        similarity-based confidence keeps its meaning.
+        """
+        if not results:
+            return []
+        scores = self.score(query, [doc for doc, _ in results])
+        order = np.argsort(-scores, kind='stable')[:top_n]
+        return [results[i] for i in order]
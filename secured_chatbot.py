@@ -1,6 +1,8 @@
-from typing import Dict, List, Tuple, Optional
+import asyncio
+from typing import AsyncIterator, Dict, Iterator, Optional
 from chatbot import RAGChatbot
-from security_filter import SecurityFilter
+from metrics import collect_timings, record_request, span
+from security_filter import SecurityFilter, StreamingSanitizer
 from datetime import datetime
 import hashlib
 
@@ -12,15 +14,113 @@ class SecureRAGChatbot(RAGChatbot):
         super().__init__(*args, **kwargs)
         self.security_filter = SecurityFilter()
     
-    def get_response(self, query: str, k: int = 5) -> Dict[str, any]:
-        """Get response with security filtering"""
+    def _respond(self, query: str, k: int, remember: bool) -> Dict[str, any]:
+        """Get response with security filtering (single and batch questions alike)"""
+        
+        with collect_timings() as timings:
+            with span('chat', 'security_screen'):
+                blocked = self._screen_query(query)
+            if blocked:
+                record_request('chat', 'blocked')
+                return {**blocked, "debug": {"timings": timings}}
+            
+            # Get normal response
+            response_data = super()._respond(query, k, remember)
+            
+            # Sanitize response before returning
+            with span('chat', 'sanitize'):
+                response_data["response"] = self.security_filter.sanitize_response(response_data["response"])
+            
+            return response_data
+    
+    async def _arespond(self, query: str, k: int, remember: bool) -> Dict[str, any]:
+        """Async counterpart of _respond; screening and sanitizing run off the event loop"""
+        
+        with collect_timings() as timings:
+            with span('chat', 'security_screen'):
+                blocked = await asyncio.to_thread(self._screen_query, query)
+            if blocked:
+                record_request('chat', 'blocked')
+                return {**blocked, "debug": {"timings": timings}}
+            
+            response_data = await super()._arespond(query, k, remember)
+            
+            with span('chat', 'sanitize'):
+                response_data["response"] = await asyncio.to_thread(
+                    self.security_filter.sanitize_response, response_data["response"])
+            
+            return response_data
+    
+    def stream_response(self, query: str, k: int = 5) -> Iterator[Dict[str, any]]:
+        """Stream response with security filtering applied to every emitted token"""
+        
+        timings = {}
+        with span('chat', 'security_screen', timings):
+            blocked = self._screen_query(query)
+        if blocked:
+            record_request('chat', 'blocked')
+            yield {"type": "token", "content": blocked["response"]}
+            yield {"type": "done", **blocked, "debug": {"timings": timings}}
+            return
+        
+        sanitizer = StreamingSanitizer(self.security_filter)
+        for event in super().stream_response(query, k):
+            if event["type"] == "token":
+                text = sanitizer.feed(event["content"])
+                if text:
+                    yield {"type": "token", "content": text}
+            elif event["type"] == "done":
+                tail = sanitizer.flush()
+                if tail:
+                    yield {"type": "token", "content": tail}
+                with span('chat', 'sanitize', timings):
+                    event["response"] = self.security_filter.sanitize_response(event["response"])
+                event["debug"] = {"timings": {**timings, **event.get("debug", {}).get("timings", {})}}
+                yield event
+            else:
+                yield event
+    
+    async def astream_response(self, query: str, k: int = 5) -> AsyncIterator[Dict[str, any]]:
+        """Async counterpart of stream_response; screening and sanitizing run off the event loop"""
+        
+        timings = {}
+        with span('chat', 'security_screen', timings):
+            blocked = await asyncio.to_thread(self._screen_query, query)
+        if blocked:
+            record_request('chat', 'blocked')
+            yield {"type": "token", "content": blocked["response"]}
+            yield {"type": "done", **blocked, "debug": {"timings": timings}}
+            return
+        
+        sanitizer = StreamingSanitizer(self.security_filter)
+        async for event in super().astream_response(query, k):
+            if event["type"] == "token":
+                text = sanitizer.feed(event["content"])
+                if text:
+                    yield {"type": "token", "content": text}
+            elif event["type"] == "done":
+                tail = sanitizer.flush()
+                if tail:
+                    yield {"type": "token", "content": tail}
+                with span('chat', 'sanitize', timings):
+                    event["response"] = await asyncio.to_thread(
+                        self.security_filter.sanitize_response, event["response"])
+                event["debug"] = {"timings": {**timings, **event.get("debug", {}).get("timings", {})}}
+                yield event
+            else:
+                yield event
+    
+    def _screen_query(self, query: str) -> Optional[Dict[str, any]]:
+        """Run the query safety checks, returning the refusal response for unsafe queries"""
+        
+        # Scan the query once for every check
+        analysis = self.security_filter.analyze(query)
         
         # Check query safety first
-        is_safe, reason = self.security_filter.is_query_safe(query)
-        if not is_safe:
+        if not analysis.is_safe:
             self.security_filter.log_security_event("UNSAFE_QUERY", {
-                "reason": reason,
-                "risk_level": self.security_filter.get_risk_level(query)
+                "reason": analysis.reason,
+                "risk_level": analysis.risk_level
             })
             
             return {
@@ -32,16 +132,10 @@ class SecureRAGChatbot(RAGChatbot):
             }
         
         # Check if human review needed
-        if self.security_filter.requires_human_review(query):
+        if analysis.requires_review:
             self.security_filter.log_security_event("HUMAN_REVIEW_REQUIRED", {
                 "query_preview": query[:50],
-                "risk_level": self.security_filter.get_risk_level(query)
+                "risk_level": analysis.risk_level
             })
         
-        # Get normal response
-        response_data = super().get_response(query, k)
-        
-        # Sanitize response before returning
-        response_data["response"] = self.security_filter.sanitize_response(response_data["response"])
-        
-        return response_data
\ No newline at end of file
+        return None
\ No newline at end of file
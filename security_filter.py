@@ -1,25 +1,103 @@
 import re
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import List, Tuple, Optional
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+# PII patterns - common patterns that might appear in banking queries
+DEFAULT_PII_PATTERNS = {
+    "ssn": r'\b\d{3}-\d{2}-\d{4}\b',  # Social Security Number
+    "credit_card": r'\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b',  # Credit card
+    "account_number": r'\b\d{9,12}\b',  # Bank account numbers
+    "routing_number": r'\b\d{9}\b',  # Routing numbers
+    "phone": r'\b\d{3}[\s\-\.]?\d{3}[\s\-\.]?\d{4}\b',  # Phone numbers
+    "email": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',  # Email
+    "drivers_license": r'\b[A-Z]{1,2}\d{5,8}\b',  # Driver's license (varies by state)
+    "passport": r'\b[A-Z][0-9]{8}\b',  # US Passport format
+}
+
+# Every default PII pattern needs a digit or an "@", so text without either skips PII matching entirely
+_PII_HINT = re.compile(r'[\d@]')
+_AMOUNT = re.compile(r'\$[\d,]+')
+
+
+@dataclass
+class SecurityAnalysis:
+    """Everything the filter found in one query"""
+    pii: List[Tuple[str, str]] = field(default_factory=list)
+    blocked_terms: List[str] = field(default_factory=list)
+    sensitive_topics: List[str] = field(default_factory=list)
+    high_risk_patterns: List[str] = field(default_factory=list)
+    risk_level: str = "LOW"
+
+    @property
+    def is_safe(self) -> bool:
+        return not self.pii and not self.blocked_terms
+
+    @property
+    def reason(self) -> Optional[str]:
+        if self.pii:
+            pii_types = list(dict.fromkeys(pii_type for pii_type, _ in self.pii))
+            return f"Query contains sensitive information: {', '.join(pii_types)}"
+        if self.blocked_terms:
+            return "Query contains restricted information"
+        return None
+
+    @property
+    def requires_review(self) -> bool:
+        return bool(self.sensitive_topics or self.high_risk_patterns)
+
+
+@dataclass(frozen=True)
+class _CompiledRules:
+    """Regexes compiled once per distinct rule set and shared by every filter instance"""
+    pii: Tuple[Tuple[str, "re.Pattern", str], ...]
+    # Text this does not match cannot contain PII; None once patterns other than the defaults are in use
+    pii_hint: Optional["re.Pattern"]
+    topics: Optional["re.Pattern"]
+    blocked: Optional["re.Pattern"]
+    high_risk: Optional["re.Pattern"]
+
+
+def _alternation(terms: Tuple[str, ...]) -> Optional["re.Pattern"]:
+    """One regex matching any of the literal terms (longest first)"""
+    if not terms:
+        return None
+    return re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)))
+
+
+def _may_contain_pii(text: str, rules: _CompiledRules) -> bool:
+    return rules.pii_hint is None or rules.pii_hint.search(text) is not None
+
+
+@lru_cache(maxsize=8)
+def _compile_rules(pii_patterns: Tuple[Tuple[str, str], ...],
+                   sensitive_topics: Tuple[str, ...],
+                   blocked_terms: Tuple[str, ...],
+                   high_risk_patterns: Tuple[str, ...]) -> _CompiledRules:
+    return _CompiledRules(
+        pii=tuple(
+            (pii_type, re.compile(pattern, re.IGNORECASE), f"[{pii_type.upper()}_REDACTED]")
+            for pii_type, pattern in pii_patterns
+        ),
+        pii_hint=_PII_HINT if all(DEFAULT_PII_PATTERNS.get(pii_type) == pattern
+                                  for pii_type, pattern in pii_patterns) else None,
+        topics=_alternation(sensitive_topics),
+        blocked=_alternation(blocked_terms),
+        # One named group per pattern so a match tells which pattern fired, whatever groups the patterns have
+        high_risk=re.compile("|".join(f"(?P<r{i}>{pattern})" for i, pattern in enumerate(high_risk_patterns)))
+        if high_risk_patterns else None,
+    )
+
+
 class SecurityFilter:
     """Handles security filtering for queries and responses"""
     
     def __init__(self):
-        # PII patterns - common patterns that might appear in banking queries
-        self.pii_patterns = {
-            "ssn": r'\b\d{3}-\d{2}-\d{4}\b',  # Social Security Number
-            "credit_card": r'\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b',  # Credit card
-            "account_number": r'\b\d{9,12}\b',  # Bank account numbers
-            "routing_number": r'\b\d{9}\b',  # Routing numbers
-            "phone": r'\b\d{3}[\s\-\.]?\d{3}[\s\-\.]?\d{4}\b',  # Phone numbers
-            "email": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',  # Email
-            "drivers_license": r'\b[A-Z]{1,2}\d{5,8}\b',  # Driver's license (varies by state)
-            "passport": r'\b[A-Z][0-9]{8}\b',  # US Passport format
-        }
+        self.pii_patterns = dict(DEFAULT_PII_PATTERNS)
         
         # Sensitive topics that require special handling
         self.sensitive_topics = [
@@ -45,94 +123,153 @@ class SecurityFilter:
             r'share.*login.*credentials'
         ]
     
-    def check_pii(self, text: str) -> List[Tuple[str, str]]:
-        """Check text for PII patterns"""
-        found_pii = []
-        
-        for pii_type, pattern in self.pii_patterns.items():
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                found_pii.extend([(pii_type, match) for match in matches])
-                logger.warning(f"PII detected - Type: {pii_type}, Count: {len(matches)}")
-        
-        return found_pii
+    @property
+    def rules(self) -> _CompiledRules:
+        """Compiled form of the current rule lists (cached across instances)"""
+        return _compile_rules(
+            tuple(self.pii_patterns.items()),
+            tuple(self.sensitive_topics),
+            tuple(self.blocked_terms),
+            tuple(self.high_risk_patterns),
+        )
     
-    def is_query_safe(self, query: str) -> Tuple[bool, Optional[str]]:
-        """Check if query is safe to process"""
+    def analyze(self, query: str) -> SecurityAnalysis:
+        """Scan a query once for PII, blocked terms, sensitive topics and high-risk patterns"""
+        rules = self.rules
+        query_lower = query.lower()
         
-        # Check for PII
-        pii_found = self.check_pii(query)
-        if pii_found:
-            pii_types = list(set([pii[0] for pii in pii_found]))
-            return False, f"Query contains sensitive information: {', '.join(pii_types)}"
+        analysis = SecurityAnalysis(
+            pii=self._find_pii(query, rules),
+            blocked_terms=rules.blocked.findall(query_lower) if rules.blocked else [],
+            sensitive_topics=rules.topics.findall(query_lower) if rules.topics else [],
+        )
+        if rules.high_risk:
+            match = rules.high_risk.search(query_lower)
+            if match:
+                analysis.high_risk_patterns.append(self.high_risk_patterns[int(match.lastgroup[1:])])
         
-        # Check for blocked terms
-        query_lower = query.lower()
-        for term in self.blocked_terms:
-            if term in query_lower:
-                logger.warning(f"Blocked term detected: {term}")
-                return False, f"Query contains restricted information"
+        # Critical risk - contains PII or blocked terms
+        if not analysis.is_safe:
+            analysis.risk_level = "CRITICAL"
+        # High risk - contains sensitive topics or high-risk patterns
+        elif analysis.requires_review:
+            analysis.risk_level = "HIGH"
+        # Medium risk - contains financial amounts or account references
+        elif _AMOUNT.search(query) or 'account' in query_lower:
+            analysis.risk_level = "MEDIUM"
         
-        # Check for high-risk patterns
-        for pattern in self.high_risk_patterns:
-            if re.search(pattern, query_lower):
-                logger.warning(f"High-risk query pattern detected: {pattern}")
-                # Don't block, but flag for review
+        if analysis.blocked_terms:
+            logger.warning(f"Blocked term detected: {analysis.blocked_terms[0]}")
+        if analysis.high_risk_patterns:
+            logger.warning(f"High-risk query pattern detected: {analysis.high_risk_patterns[0]}")
         
-        return True, None
+        return analysis
+    
+    def check_pii(self, text: str) -> List[Tuple[str, str]]:
+        """Check text for PII patterns"""
+        return self._find_pii(text, self.rules)
+    
+    def find_pii_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Return (start, end) offsets of every PII match in text"""
+        rules = self.rules
+        if not _may_contain_pii(text, rules):
+            return []
+        return [match.span() for _, pattern, _ in rules.pii for match in pattern.finditer(text)]
+    
+    def is_query_safe(self, query: str) -> Tuple[bool, Optional[str]]:
+        """Check if query is safe to process"""
+        analysis = self.analyze(query)
+        return analysis.is_safe, analysis.reason
     
     def sanitize_response(self, response: str) -> str:
         """Sanitize response to ensure no PII is exposed"""
+        rules = self.rules
+        if not _may_contain_pii(response, rules):
+            return response
+        
         sanitized = response
         
-        # Replace any PII patterns found in response
-        for pii_type, pattern in self.pii_patterns.items():
-            # Count matches before replacing
-            matches = re.findall(pattern, sanitized)
-            if matches:
-                logger.warning(f"Sanitizing {len(matches)} {pii_type} patterns from response")
-            
-            # Replace with safe placeholder
-            sanitized = re.sub(pattern, f"[{pii_type.upper()}_REDACTED]", sanitized, flags=re.IGNORECASE)
+        # Replace any PII patterns found in response with safe placeholders
+        for pii_type, pattern, placeholder in rules.pii:
+            sanitized, count = pattern.subn(placeholder, sanitized)
+            if count:
+                logger.warning(f"Sanitizing {count} {pii_type} patterns from response")
         
         return sanitized
     
     def requires_human_review(self, query: str) -> bool:
         """Check if query involves sensitive topics requiring human review"""
-        query_lower = query.lower()
-        
-        for topic in self.sensitive_topics:
-            if topic in query_lower:
-                logger.info(f"Sensitive topic detected, flagging for review: {topic}")
-                return True
-        
-        # Check for high-risk patterns
-        for pattern in self.high_risk_patterns:
-            if re.search(pattern, query_lower):
-                logger.info(f"High-risk pattern detected, flagging for review")
-                return True
-        
-        return False
+        analysis = self.analyze(query)
+        if analysis.requires_review:
+            logger.info(f"Sensitive topic detected, flagging for review: {(analysis.sensitive_topics or analysis.high_risk_patterns)[0]}")
+        return analysis.requires_review
     
     def get_risk_level(self, query: str) -> str:
         """Assess risk level of query"""
-        query_lower = query.lower()
-        
-        # Critical risk - contains PII or blocked terms
-        if self.check_pii(query) or any(term in query_lower for term in self.blocked_terms):
-            return "CRITICAL"
+        return self.analyze(query).risk_level
+    
+    def log_security_event(self, event_type: str, details: dict):
+        """Log security-related events for audit trail"""
+        logger.warning(f"SECURITY_EVENT: {event_type} - {json.dumps(details)}")
+    
+    def _find_pii(self, text: str, rules: _CompiledRules) -> List[Tuple[str, str]]:
+        """Run the precompiled PII patterns, skipping text that cannot contain PII"""
+        found_pii = []
+        if not _may_contain_pii(text, rules):
+            return found_pii
         
-        # High risk - contains sensitive topics or high-risk patterns
-        if (any(topic in query_lower for topic in self.sensitive_topics) or 
-            any(re.search(pattern, query_lower) for pattern in self.high_risk_patterns)):
-            return "HIGH"
+        for pii_type, pattern, _ in rules.pii:
+            matches = pattern.findall(text)
+            if matches:
+                found_pii.extend([(pii_type, match) for match in matches])
+                logger.warning(f"PII detected - Type: {pii_type}, Count: {len(matches)}")
         
-        # Medium risk - contains financial amounts or account references
-        if re.search(r'\$[\d,]+', query) or 'account' in query_lower:
-            return "MEDIUM"
+        return found_pii
+
+
+class StreamingSanitizer:
+    """Redacts PII from streamed text without letting a match straddle two emitted pieces"""
+    
+    # Longer than any PII pattern that may contain whitespace (credit card numbers)
+    HOLDBACK = 32
+    
+    def __init__(self, security_filter: SecurityFilter):
+        self.security_filter = security_filter
+        self._buffer = ""
+    
+    def feed(self, text: str) -> str:
+        """Add streamed text and return whatever prefix is safe to emit, already sanitized"""
+        self._buffer += text
+        cut = self._safe_cut()
+        if cut <= 0:
+            return ""
         
-        return "LOW"
+        emitted, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return self.security_filter.sanitize_response(emitted)
     
-    def log_security_event(self, event_type: str, details: dict):
-        """Log security-related events for audit trail"""
-        logger.warning(f"SECURITY_EVENT: {event_type} - {json.dumps(details)}")
\ No newline at end of file
+    def flush(self) -> str:
+        """Return the sanitized remainder once the stream has ended"""
+        emitted, self._buffer = self._buffer, ""
+        return self.security_filter.sanitize_response(emitted) if emitted else ""
+    
+    def _safe_cut(self) -> int:
+        """Find the end of the longest prefix that ends on whitespace outside any PII match"""
+        buffer = self._buffer
+        cut = len(buffer) - self.HOLDBACK
+        spans = None
+        
+        while cut > 0:
+            # Emails and other unbounded patterns never contain whitespace
+            whitespace = max(buffer.rfind(' ', 0, cut), buffer.rfind('\n', 0, cut), buffer.rfind('\t', 0, cut))
+            if whitespace < 0:
+                return 0
+            cut = whitespace + 1
+            
+            if spans is None:
+                spans = self.security_filter.find_pii_spans(buffer)
+            straddling = [start for start, end in spans if start < cut < end]
+            if not straddling:
+                return cut
+            cut = min(straddling)
+        
+        return 0
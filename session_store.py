@@ -0,0 +1,278 @@
+# session_store.py - Per-session state shared by every worker process
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# "sqlite:///path/to/sessions.db" (one host) or "redis://host:port/db" (several replicas)
+SESSION_STORE_URL = os.environ.get('SESSION_STORE_URL', 'sqlite:///sessions.db')
+# Sessions idle for longer than this are evicted together with their files and vectors
+SESSION_TTL_SECONDS = int(float(os.environ.get('SESSION_TTL_MINUTES', 30)) * 60)
+
+
+def new_session_state() -> Dict:
+    """Initial state of a session"""
+    return {
+        'status': 'idle',  # idle, processing, ready, error
+        'processing_progress': 0,
+        'chunks_done': 0,
+        'chunks_total': 0,
+        'documents': [],
+        'message_count': 0,
+        'history': [],  # recent conversation turns, so every worker sees the same conversation
+        'corpus_version': '',
+        'created_at': time.time(),
+    }
+
+
+class SessionStore(ABC):
+    """Stores session state as JSON documents keyed by session ID"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Return the session state, or None if the session does not exist"""
+
+    @abstractmethod
+    def save(self, session_id: str, state: Dict):
+        """Replace the session state and mark the session as active"""
+
+    @abstractmethod
+    def update(self, session_id: str, **fields) -> Dict:
+        """Atomically merge fields into the session state (creating it if needed)"""
+
+    @abstractmethod
+    def update_if(self, session_id: str, expected: Dict, **fields) -> Optional[Dict]:
+        """Atomically merge fields only while the state holds the expected values; None if it does not"""
+
+    @abstractmethod
+    def increment(self, session_id: str, field: str, amount: int = 1) -> int:
+        """Atomically add to a numeric field"""
+
+    @abstractmethod
+    def append(self, session_id: str, field: str, item, keep: Optional[int] = None) -> List:
+        """Atomically append to a list field, keeping only its last `keep` items"""
+
+    @abstractmethod
+    def touch(self, session_id: str):
+        """Mark the session as active"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Delete a session, returning False if another process already did"""
+
+    @abstractmethod
+    def idle_sessions(self, ttl: float) -> List[str]:
+        """IDs of sessions not touched for more than ttl seconds"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a SQLite file; shared by the processes of one host and used for testing"""
+
+    def __init__(self, path: str = 'sessions.db', table: str = 'sessions',
+                 initial_state: Callable[[], Dict] = new_session_state):
+        self.path = path
+        self.table = table
+        self.initial_state = initial_state
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    session_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    last_seen REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_seen ON {table} (last_seen)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers and a writer from other processes overlap"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            f"SELECT state FROM {self.table} WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, state: Dict):
+        self._connect().execute(
+            f"INSERT OR REPLACE INTO {self.table} (session_id, state, last_seen) VALUES (?, ?, ?)",
+            (session_id, json.dumps(state), time.time())
+        )
+
+    def update(self, session_id: str, **fields) -> Dict:
+        return self._transform(session_id, lambda state: state.update(fields))
+
+    def update_if(self, session_id: str, expected: Dict, **fields) -> Optional[Dict]:
+        return self._transform(session_id, lambda state: _update_if(state, expected, fields))
+
+    def increment(self, session_id: str, field: str, amount: int = 1) -> int:
+        state = self._transform(session_id, lambda state: state.__setitem__(field, state.get(field, 0) + amount))
+        return state[field]
+
+    def append(self, session_id: str, field: str, item, keep: Optional[int] = None) -> List:
+        state = self._transform(session_id, lambda state: _append(state, field, item, keep))
+        return state[field]
+
+    def _transform(self, session_id: str, change) -> Optional[Dict]:
+        """Read-modify-write of one session under a write lock; nothing is written if change returns False"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(f"SELECT state FROM {self.table} WHERE session_id = ?", (session_id,)).fetchone()
+            state = json.loads(row[0]) if row else self.initial_state()
+            if change(state) is False:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (session_id, state, last_seen) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), time.time())
+            )
+            conn.execute("COMMIT")
+            return state
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def touch(self, session_id: str):
+        self._connect().execute(
+            f"UPDATE {self.table} SET last_seen = ? WHERE session_id = ?", (time.time(), session_id)
+        )
+
+    def delete(self, session_id: str) -> bool:
+        cursor = self._connect().execute(f"DELETE FROM {self.table} WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def idle_sessions(self, ttl: float) -> List[str]:
+        rows = self._connect().execute(
+            f"SELECT session_id FROM {self.table} WHERE last_seen < ?", (time.time() - ttl,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+class RedisSessionStore(SessionStore):
+    """Session store in Redis, shared by every replica"""
+
+    def __init__(self, url: str, prefix: str = 'chatbot:session:',
+                 initial_state: Callable[[], Dict] = new_session_state):
+        import redis  # Optional dependency, only needed for multi-replica deployments
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.initial_state = initial_state
+        self.activity_key = f"{prefix}last_seen"
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        raw = self.client.get(self._key(session_id))
+        return json.loads(raw) if raw else None
+
+    def save(self, session_id: str, state: Dict):
+        pipe = self.client.pipeline()
+        pipe.set(self._key(session_id), json.dumps(state))
+        pipe.zadd(self.activity_key, {session_id: time.time()})
+        pipe.execute()
+
+    def update(self, session_id: str, **fields) -> Dict:
+        return self._transform(session_id, lambda state: state.update(fields))
+
+    def update_if(self, session_id: str, expected: Dict, **fields) -> Optional[Dict]:
+        return self._transform(session_id, lambda state: _update_if(state, expected, fields))
+
+    def increment(self, session_id: str, field: str, amount: int = 1) -> int:
+        state = self._transform(session_id, lambda state: state.__setitem__(field, state.get(field, 0) + amount))
+        return state[field]
+
+    def append(self, session_id: str, field: str, item, keep: Optional[int] = None) -> List:
+        state = self._transform(session_id, lambda state: _append(state, field, item, keep))
+        return state[field]
+
+    def _transform(self, session_id: str, change) -> Optional[Dict]:
+        """Optimistic read-modify-write of one session; nothing is written if change returns False"""
+        import redis
+        key = self._key(session_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    state = json.loads(raw) if raw else self.initial_state()
+                    if change(state) is False:
+                        pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.set(key, json.dumps(state))
+                    pipe.zadd(self.activity_key, {session_id: time.time()})
+                    pipe.execute()
+                    return state
+                except redis.WatchError:
+                    continue
+
+    def touch(self, session_id: str):
+        self.client.zadd(self.activity_key, {session_id: time.time()}, xx=True)
+
+    def delete(self, session_id: str) -> bool:
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(session_id))
+        pipe.zrem(self.activity_key, session_id)
+        deleted, _ = pipe.execute()
+        return deleted > 0
+
+    def idle_sessions(self, ttl: float) -> List[str]:
+        ids = self.client.zrangebyscore(self.activity_key, 0, time.time() - ttl)
+        return [session_id.decode() for session_id in ids]
+
+
+def _update_if(state: Dict, expected: Dict, fields: Dict) -> Optional[bool]:
+    if any(state.get(field) != value for field, value in expected.items()):
+        return False
+    state.update(fields)
+
+
+def _append(state: Dict, field: str, item, keep: Optional[int]):
+    items = state.get(field, []) + [item]
+    state[field] = items[-keep:] if keep else items
+
+
+class SessionHistory:
+    """A session's conversation history kept in the session store, shared by every worker"""
+
+    def __init__(self, store: SessionStore, session_id: str, max_turns: int = 10):
+        self.store = store
+        self.session_id = session_id
+        self.max_turns = max_turns
+
+    def recent(self) -> List[Dict]:
+        state = self.store.get(self.session_id) or {}
+        return state.get('history', [])
+
+    def add(self, turn: Dict):
+        self.store.append(self.session_id, 'history', turn, keep=self.max_turns)
+
+
+def create_session_store(url: Optional[str] = None, kind: str = 'session') -> SessionStore:
+    """Create the configured store; `kind` keeps other records (e.g. jobs) apart from sessions"""
+    url = url or SESSION_STORE_URL
+
+    initial_state = new_session_state if kind == 'session' else dict
+
+    if url.startswith('sqlite:///'):
+        return SQLiteSessionStore(url[len('sqlite:///'):], table=f"{kind}s", initial_state=initial_state)
+    elif url.startswith(('redis://', 'rediss://')):
+        return RedisSessionStore(url, prefix=f"chatbot:{kind}:", initial_state=initial_state)
+
+    raise ValueError(f"Unsupported session store URL: {url}")
@@ -0,0 +1,267 @@
+# vector_store.py - Vector store interface and backend selection
+import os
+import hashlib
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, List, Dict, Optional, Set, Tuple
+import numpy as np
+from langchain.schema import Document
+from bm25 import BM25Index, chunk_key
+from chunk_store import ChunkStore
+from embedding_cache import get_embedding_cache
+from encoders import encoder_id
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Backend used when none is requested explicitly: "pinecone" or "local"
+DEFAULT_VECTOR_BACKEND = os.environ.get('VECTOR_BACKEND', 'pinecone')
+
+# Hybrid search fetches this many candidates per k from each retriever before fusing
+HYBRID_CANDIDATE_FACTOR = int(os.environ.get('HYBRID_CANDIDATE_FACTOR', 4))
+# Reciprocal rank fusion constant; larger values flatten the gap between top ranks
+RRF_K = int(os.environ.get('RRF_K', 60))
+
+# Dense queries run here while the calling thread scores BM25
+_dense_search_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('HYBRID_SEARCH_THREADS', 8)),
+                                        thread_name_prefix='dense-search')
+
+
+def reciprocal_rank_fusion(dense: List[Tuple[Document, float]],
+                           lexical: List[Tuple[str, float]],
+                           k: int,
+                           resolve: Callable[[List[str]], Dict[str, Document]],
+                           rrf_k: int = RRF_K) -> List[Tuple[Document, float]]:
+    """Merge dense hits and BM25 chunk keys by summed 1 / (rrf_k + rank).
+
+    Lexical-only hits that make the top k are looked up with resolve (chunk
+    key -> Document); ones it cannot find are dropped. Results keep their
+    dense cosine score (0.0 for lexical-only hits) so callers can still read
+    a similarity from them.
+    """
+    fused: Dict[str, float] = {}
+    hits: Dict[str, Tuple[Document, float]] = {}
+    for rank, (doc, score) in enumerate(dense):
+        key = chunk_key(doc)
+        fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+        hits[key] = (doc, score)
+    for rank, (key, _) in enumerate(lexical):
+        fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+    ranked = sorted(fused, key=fused.get, reverse=True)[:k]
+    missing = [key for key in ranked if key not in hits]
+    if missing:
+        for key, doc in resolve(missing).items():
+            hits[key] = (doc, 0.0)
+    return [hits[key] for key in ranked if key in hits]
+
+
+class IndexManifest:
+    """Records the chunk IDs already indexed in a namespace and where each chunk sat when it was written"""
+
+    def __init__(self, chunk_ids: Iterable[str] = (), positions: Optional[Dict[str, Tuple]] = None):
+        self.chunk_ids: Set[str] = set(chunk_ids)
+        # Chunk ID -> (chunk_index, start_index) as last written; unknown for chunks only listed from the index
+        self.positions: Dict[str, Tuple] = {
+            chunk_id: position for chunk_id, position in (positions or {}).items() if chunk_id in self.chunk_ids
+        }
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.chunk_ids
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def add(self, positions: Dict[str, Tuple]):
+        """Record written chunks by ID with their positions"""
+        self.chunk_ids.update(positions)
+        self.positions.update(positions)
+
+    def remove(self, chunk_ids: Iterable[str]):
+        for chunk_id in chunk_ids:
+            self.chunk_ids.discard(chunk_id)
+            self.positions.pop(chunk_id, None)
+
+    def discard(self):
+        """Forget every chunk ID"""
+        self.chunk_ids = set()
+        self.positions = {}
+
+
+class VectorStore(ABC):
+    """Common interface for embedding storage and similarity search backends"""
+
+    def __init__(self, namespace: str = "default"):
+        self.namespace = namespace
+
+        # Chunk text and metadata by vector ID, stored column-wise
+        self.documents = ChunkStore()
+
+        # Checksums of the source documents indexed so far, folded into corpus_version
+        self.checksums = set()
+        self.corpus_version = ""
+
+        # Chunk IDs already indexed; shared backends reload it from the index before each ingestion run
+        self.manifest = IndexManifest()
+
+        # BM25 index over the same chunks, attached after chunking; enables hybrid search
+        self.lexical_index: Optional[BM25Index] = None
+
+    # Number of threads the ingestion pipeline may use to write batches concurrently
+    write_concurrency: int = 1
+
+    def add_documents(self, documents: Iterable[Document], batch_size: int = 100):
+        """Embed and index documents"""
+        from ingestion import IngestionPipeline
+        IngestionPipeline(self, batch_size=batch_size).index(documents)
+
+    def sync_documents(self, documents: Iterable[Document], batch_size: int = 100) -> Dict:
+        """Make the namespace hold exactly these chunks, embedding only the ones not indexed yet"""
+        from ingestion import IngestionPipeline
+        return IngestionPipeline(self, batch_size=batch_size).index(documents, sync=True)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+        """Return the k most relevant chunks, fusing dense and BM25 rankings when a lexical index is attached"""
+        lexical_index = self.lexical_index
+        if lexical_index is None or not len(lexical_index):
+            return self.dense_search(query, k)
+
+        candidates = k * HYBRID_CANDIDATE_FACTOR
+        # Run in a copy of this context so the dense stages land in the caller's request timings
+        dense_future = _dense_search_pool.submit(contextvars.copy_context().run, self.dense_search, query, candidates)
+        with span('search', 'lexical_query'):
+            lexical = lexical_index.search(query, candidates)
+        dense = dense_future.result()
+        with span('search', 'fusion'):
+            return reciprocal_rank_fusion(dense, lexical, k, self.resolve_chunks)
+
+    def resolve_chunks(self, keys: List[str]) -> Dict[str, Document]:
+        """Look up chunks by chunk key (as returned by BM25 search) in the document store"""
+        found = {}
+        for key in keys:
+            doc = self.documents.get(self._doc_id_for_key(key))
+            if doc is not None:
+                found[key] = doc
+        return found
+
+    @abstractmethod
+    def dense_search(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+        """Return the k most similar documents with their cosine scores"""
+
+    @abstractmethod
+    def delete_documents(self, doc_ids: List[str]):
+        """Remove indexed chunks by ID"""
+
+    @abstractmethod
+    def get_stats(self) -> Dict:
+        """Get index statistics"""
+
+    def vector_count(self) -> int:
+        """Number of vectors this namespace holds"""
+        return len(self.manifest)
+
+    def drop_namespace(self):
+        """Delete everything indexed in this namespace, e.g. when its session expires"""
+        if self.manifest.chunk_ids:
+            self.delete_documents(list(self.manifest.chunk_ids))
+        self.manifest.discard()
+        self.documents.clear()
+        self.lexical_index = None
+        self.update_corpus_version([], replace=True)
+
+    def embed_documents(self, documents: List[Document]) -> np.ndarray:
+        """Encode one batch of chunks into normalized float32 embeddings, reusing cached ones"""
+        cache = get_embedding_cache()
+        if cache is None:
+            return self._encode_documents(documents)
+
+        hashes = [doc.metadata.get('content_hash') or hashlib.md5(doc.page_content.encode()).hexdigest()
+                  for doc in documents]
+        model = encoder_id(self.embedding_model)
+        cached = cache.get_many(model, hashes, self.dimension)
+        missing = [i for i, content_hash in enumerate(hashes) if content_hash not in cached]
+
+        embeddings = np.empty((len(documents), self.dimension), dtype=np.float32)
+        for i, content_hash in enumerate(hashes):
+            if content_hash in cached:
+                embeddings[i] = cached[content_hash]
+        if missing:
+            encoded = self._encode_documents([documents[i] for i in missing])
+            embeddings[missing] = encoded
+            cache.put_many(model, [hashes[i] for i in missing], encoded)
+        return embeddings
+
+    def _encode_documents(self, documents: List[Document]) -> np.ndarray:
+        """Run the encoder over a batch of chunks"""
+        return self.encoder.encode(
+            [doc.page_content for doc in documents],
+            batch_size=len(documents),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).astype(np.float32, copy=False)
+
+    def embedding_cache_stats(self) -> Dict:
+        """Hit rate and size of the shared embedding cache (empty when disabled)"""
+        cache = get_embedding_cache()
+        return cache.stats() if cache is not None else {}
+
+    def refresh_manifest(self):
+        """Called by the ingestion pipeline before it reads the manifest.
+
+        In-process backends are the only writers to their namespace, so their
+        manifest is always current; shared backends reload it from the index,
+        since another replica may have synced or dropped the namespace since.
+        """
+
+    def begin_writes(self):
+        """Called by the ingestion pipeline before the first batch is written"""
+
+    @abstractmethod
+    def write_embeddings(self, documents: List[Document], doc_ids: List[str], embeddings: np.ndarray):
+        """Store one embedded batch (may be called from several writer threads)"""
+
+    def update_metadata(self, documents: List[Document], doc_ids: List[str]):
+        """Rewrite the stored position of chunks that are indexed already (may be called from several writer threads).
+
+        In-process backends read metadata from the document store, which
+        remember_document has already refreshed.
+        """
+
+    def finish_writes(self, new_vectors: int):
+        """Called by the ingestion pipeline once every batch is written"""
+
+    def remember_document(self, doc_id: str, doc: Document):
+        """Keep a chunk available for building search results"""
+        self.documents[doc_id] = doc
+
+    def update_corpus_version(self, checksums: Iterable[str], replace: bool = False):
+        """Fold document checksums into the version used to key answer caches"""
+        if replace:
+            self.checksums = set()
+        self.checksums.update(checksums)
+        self.corpus_version = hashlib.md5("".join(sorted(self.checksums)).encode()).hexdigest()[:12]
+
+    def _generate_doc_id(self, doc: Document) -> str:
+        """Generate a content-addressed chunk ID (stable across uploads of the same text)"""
+        return self._doc_id_for_key(chunk_key(doc))
+
+    def _doc_id_for_key(self, key: str) -> str:
+        """Vector ID of the chunk with this chunk key (source:content hash) in this namespace"""
+        return f"{self.namespace}_{hashlib.md5(key.encode()).hexdigest()[:16]}"
+
+
+def create_vector_store(backend: Optional[str] = None, **kwargs) -> VectorStore:
+    """Create the configured vector store backend"""
+    backend = (backend or DEFAULT_VECTOR_BACKEND).lower()
+
+    if backend == 'pinecone':
+        from pinecone_vector import PineconeVectorStore
+        return PineconeVectorStore(**kwargs)
+    elif backend == 'local':
+        from local_vector import LocalVectorStore
+        return LocalVectorStore(**kwargs)
+
+    raise ValueError(f"Unknown vector store backend: {backend}")